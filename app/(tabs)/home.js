@@ -55,7 +55,12 @@ const Home = () => {
   const { user, token } = useContext(AuthContext);
   const [refreshing, setRefreshing] = useState(false);
   const [exploreItems, setExploreItems] = useState([]);
+  // Link to the next page of explore items, null on the last page
+  const [exploreNext, setExploreNext] = useState(null);
   const [loading, setLoading] = useState(false);
+  // onEndReached can fire again before a state update lands; the ref
+  // keeps a second request for the same page from starting.
+  const loadingMoreRef = useRef(false);
   const [notificationCount, setNotificationCount] = useState(0);
   // NEW STATE: A counter to trigger Recommended component refresh
   const [recommendationsRefreshKey, setRecommendationsRefreshKey] = useState(0);
@@ -76,22 +81,29 @@ const Home = () => {
     }
   };
 
-  const fetchExploreItems = async () => {
+  const fetchExploreItems = async (nextUrl = null) => {
     if (!token) return;
+    if (nextUrl) {
+      if (loadingMoreRef.current) return;
+      loadingMoreRef.current = true;
+    }
 
     setLoading(true);
     try {
-      const response = await axios.get(`${API_URL}/api/items/excludemyitems/`, {
+      const response = await axios.get(nextUrl || `${API_URL}/api/items/excludemyitems/`, {
         headers: { Authorization: `Bearer ${token}` },
       });
 
       if (response?.data) {
-        setExploreItems(response.data);
+        const results = response.data.results || [];
+        setExploreItems(prevItems => (nextUrl ? [...prevItems, ...results] : results));
+        setExploreNext(response.data.next);
       }
     } catch (error) {
       console.error('Explore items fetch error:', error.message);
     } finally {
       setLoading(false);
+      if (nextUrl) loadingMoreRef.current = false;
     }
   };
 
@@ -187,6 +199,10 @@ const Home = () => {
         ListHeaderComponent={ListHeader}
         ListEmptyComponent={!loading ? () => <EmptyState title="No Items Found" /> : null}
         refreshControl={<RefreshControl refreshing={refreshing} onRefresh={onRefresh} />}
+        onEndReached={() => {
+          if (exploreNext && !loading) fetchExploreItems(exploreNext);
+        }}
+        onEndReachedThreshold={0.5}
         ListFooterComponent={loading ? () => (
           <ActivityIndicator size="large" color="#ffffff" style={{ marginTop: 20 }} />
         ) : null}
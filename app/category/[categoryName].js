@@ -9,7 +9,7 @@ import {
     Alert,
     RefreshControl,
   } from "react-native";
-  import React, { useState, useEffect, useContext } from "react";
+  import React, { useState, useEffect, useContext, useRef } from "react";
   import { useLocalSearchParams, useRouter } from "expo-router";
   import { Ionicons } from "@expo/vector-icons";
   import axios from "axios";
@@ -26,34 +26,47 @@ import {
     const router = useRouter();
     const { token } = useContext(AuthContext);
     const [items, setItems] = useState([]);
+    const [nextPage, setNextPage] = useState(null);
     const [loading, setLoading] = useState(true);
     const [refreshing, setRefreshing] = useState(false);
+    const [loadingMore, setLoadingMore] = useState(false);
+    // onEndReached can fire again before a state update lands; the ref
+    // keeps a second request for the same page from starting.
+    const loadingMoreRef = useRef(false);
   
-    const fetchCategoryItems = async () => {
+    const fetchCategoryItems = async (nextUrl = null) => {
       if (!token) {
         console.warn("No token available!");
         return;
       }
+      if (nextUrl) {
+        if (loadingMoreRef.current) return;
+        loadingMoreRef.current = true;
+        setLoadingMore(true);
+      }
   
       try {
-        // Use the correct endpoint for getting all items
-        const response = await axios.get(`${API_URL}/api/items/getallitems/`, {
+        // The server filters by category and returns one page at a time
+        const response = await axios.get(nextUrl || `${API_URL}/api/items/getallitems/`, {
           headers: {
             Authorization: `Bearer ${token}`,
           },
+          params: nextUrl ? undefined : { category: categoryName },
         });
   
         if (response?.data) {
-          // Filter items by category client-side
-          const filteredItems = response.data.filter(
-            (item) => item.category && item.category.includes(categoryName)
-          );
-          setItems(filteredItems);
+          const results = response.data.results || [];
+          setItems(prevItems => (nextUrl ? [...prevItems, ...results] : results));
+          setNextPage(response.data.next);
         }
       } catch (error) {
         console.error("Error fetching category items:", error.response?.data || error.message);
       } finally {
         setLoading(false);
+        if (nextUrl) {
+          loadingMoreRef.current = false;
+          setLoadingMore(false);
+        }
       }
     };
   
@@ -118,6 +131,13 @@ import {
               </View>
             }
             refreshControl={<RefreshControl refreshing={refreshing} onRefresh={onRefresh} />}
+            onEndReached={() => {
+              if (nextPage && !loadingMore) fetchCategoryItems(nextPage);
+            }}
+            onEndReachedThreshold={0.5}
+            ListFooterComponent={loadingMore ? () => (
+              <ActivityIndicator size="large" color="#ffffff" style={{ marginTop: 20 }} />
+            ) : null}
           />
         )}
       </SafeAreaView>
@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
 application = get_asgi_application()
+
+# Load the models listed in ML_MODELS['WARMUP'] before the first request.
+from utils.model_registry import warmup_from_settings  # noqa: E402
+
+warmup_from_settings()
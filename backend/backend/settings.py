@@ -137,4 +137,19 @@ EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER', '')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD', '')
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 
-OTP_EXPIRE_TIME = 300 
\ No newline at end of file
+OTP_EXPIRE_TIME = 300 
+
+# ML models are loaded lazily on first use (see utils/model_registry.py).
+# Set SHARED_ENCODER to run recommendations and disputes on one encoder.
+ML_MODELS = {
+    'SHARED_ENCODER': None,
+    'RECOMMENDATION_ENCODER': 'paraphrase-MiniLM-L6-v2',
+    'DISPUTE_ENCODER': 'all-MiniLM-L6-v2',
+    'WARMUP': [],
+}
+
+# Recommendation engine tuning. Anything left out falls back to the defaults
+# in recommendations/conf.py.
+RECOMMENDATIONS = {
+    'STORE_DIR': os.path.join(BASE_DIR, 'recommendation_store'),
+}
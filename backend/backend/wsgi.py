@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
 application = get_wsgi_application()
+
+# Load the models listed in ML_MODELS['WARMUP'] before the first request.
+from utils.model_registry import warmup_from_settings  # noqa: E402
+
+warmup_from_settings()
@@ -247,18 +247,11 @@ class BookingDeliveryDetailsView(APIView):
                     {"message": "Completed payment for this booking not found."},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            item_location = booking.item.location
             origin_address = booking.item.address or 'Sender Location'  
 
-            try:
-                if item_location and ',' in item_location:
-                    origin_latitude, origin_longitude = map(float, item_location.split(','))
-                else:
-                    origin_latitude, origin_longitude = None, None
-                    print(f"Warning: Item location format incorrect for item {booking.item.id}: {item_location}")
-            except (ValueError, Exception) as e:
-                print(f"Error parsing item location coordinates: {e}")
-                origin_latitude, origin_longitude = None, None
+            origin_latitude, origin_longitude = booking.item.latitude, booking.item.longitude
+            if origin_latitude is None or origin_longitude is None:
+                print(f"Warning: Item location format incorrect for item {booking.item.id}: {booking.item.location}")
 
             data = {
                 "booking_id": booking.id,
@@ -314,16 +307,11 @@ class PendingDeliveriesView(APIView):
                     delivery_status = getattr(booking, 'delivery_status', 'pending')
                     return_status = getattr(booking, 'return_status', 'not_started')
                     if (return_status in ['pending', 'in_return']) or (delivery_status not in ['in_delivery', 'delivered'] and return_status == 'not_started'):
-                        item_location = booking.item.location
                         origin_address = booking.item.address or "Item Location"
                         
-                        try:
-                            if item_location and ',' in item_location:
-                                lat, lng = map(float, item_location.split(','))
-                                location_data = {"latitude": lat, "longitude": lng}
-                            else:
-                                location_data = None
-                        except Exception:
+                        if booking.item.latitude is not None and booking.item.longitude is not None:
+                            location_data = {"latitude": booking.item.latitude, "longitude": booking.item.longitude}
+                        else:
                             location_data = None
                         
                         bookings_with_payments.append({
@@ -1,18 +1,17 @@
-from nltk.sentiment import SentimentIntensityAnalyzer
-from sentence_transformers import SentenceTransformer, util
+import numpy as np
 
-sentence_model = SentenceTransformer('all-MiniLM-L6-v2')
-sia = SentimentIntensityAnalyzer()
+from utils.encode_batcher import encode
+from utils.model_registry import get_model
 
 def analyze_sentiment(text):
-    scores = sia.polarity_scores(text)
+    scores = get_model('dispute_sentiment').polarity_scores(text)
     return scores['compound'] 
 
 def contextual_difference_score(text1, text2):
     """Compute context difference score using sentence embeddings."""
-    embedding1 = sentence_model.encode(text1, convert_to_tensor=True)
-    embedding2 = sentence_model.encode(text2, convert_to_tensor=True)
-    similarity = util.cos_sim(embedding1, embedding2).item() 
+    embedding1, embedding2 = encode('dispute_encoder', [text1, text2])
+    norms = np.linalg.norm(embedding1) * np.linalg.norm(embedding2)
+    similarity = float(embedding1 @ embedding2 / norms) if norms else 0.0
     difference = 1 - similarity 
     return difference
 
@@ -0,0 +1,48 @@
+# Generated by Django 5.1.6 on 2026-10-17 21:47
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def parse_locations(apps, schema_editor):
+    Item = apps.get_model('items', 'Item')
+    batch = []
+    for item in Item.objects.only('id', 'location').iterator(chunk_size=2000):
+        try:
+            latitude, longitude = (float(part) for part in item.location.split(','))
+        except (AttributeError, ValueError):
+            continue
+        if -90 <= latitude <= 90 and -180 <= longitude <= 180:
+            item.latitude, item.longitude = latitude, longitude
+            batch.append(item)
+        if len(batch) >= 2000:
+            Item.objects.bulk_update(batch, ['latitude', 'longitude'])
+            batch = []
+    if batch:
+        Item.objects.bulk_update(batch, ['latitude', 'longitude'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0016_saveditem'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['latitude', 'longitude'], name='item_lat_lng'),
+        ),
+        migrations.RunPython(parse_locations, migrations.RunPython.noop),
+    ]
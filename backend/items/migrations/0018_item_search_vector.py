@@ -0,0 +1,57 @@
+# Generated by Django 5.1.6 on 2026-10-17 21:52
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+SEARCH_VECTOR_SQL = """
+    setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce(NEW.category, '') || ' ' || coalesce(NEW.sub_category, '')), 'B') ||
+    setweight(to_tsvector('english', coalesce(NEW.description, '')), 'C')
+"""
+
+
+def create_search_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f"""
+        CREATE OR REPLACE FUNCTION items_item_search_vector_update() RETURNS trigger AS $$
+        BEGIN
+            NEW.search_vector := {SEARCH_VECTOR_SQL};
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql;
+    """)
+    schema_editor.execute("""
+        CREATE TRIGGER items_item_search_vector_trigger
+        BEFORE INSERT OR UPDATE OF title, category, sub_category, description ON items_item
+        FOR EACH ROW EXECUTE FUNCTION items_item_search_vector_update();
+    """)
+    # Fire the trigger once for the existing rows.
+    schema_editor.execute("UPDATE items_item SET title = title;")
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS items_item_search_gin ON items_item USING GIN (search_vector);"
+    )
+
+
+def drop_search_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS items_item_search_gin;")
+    schema_editor.execute("DROP TRIGGER IF EXISTS items_item_search_vector_trigger ON items_item;")
+    schema_editor.execute("DROP FUNCTION IF EXISTS items_item_search_vector_update();")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0017_item_latitude_longitude'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_trigger, drop_search_trigger),
+    ]
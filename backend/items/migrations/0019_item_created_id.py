@@ -0,0 +1,19 @@
+# Generated by Django 5.1.6 on 2026-10-17 21:58
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0018_item_search_vector'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['-created_at', '-id'], name='item_created_id'),
+        ),
+    ]
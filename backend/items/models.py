@@ -1,12 +1,27 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.conf import settings
 from users.models import User
 
+def parse_location(location):
+    """``(latitude, longitude)`` from a "lat,lng" string, or ``(None, None)`` when it does not parse."""
+    try:
+        latitude, longitude = (float(part) for part in location.split(','))
+    except (AttributeError, ValueError):
+        return None, None
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return None, None
+    return latitude, longitude
+
+
 class Item(models.Model):
     rentee = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
     title = models.CharField(max_length=255)
     price = models.IntegerField() 
     location = models.CharField(max_length=255) 
+    # Parsed from ``location`` on save.
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
     address = models.CharField(max_length=255,default='') 
     category = models.CharField(max_length=255)
     sub_category = models.CharField(max_length=255)
@@ -14,6 +29,22 @@ class Item(models.Model):
     description = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     temporary_field1 = models.BooleanField(default=True)
+    # Maintained by a database trigger on PostgreSQL (see items/search.py).
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['latitude', 'longitude'], name='item_lat_lng'),
+            # Keyset pagination of the listings (see items/pagination.py).
+            models.Index(fields=['-created_at', '-id'], name='item_created_id'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.latitude, self.longitude = parse_location(self.location)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'location' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'latitude', 'longitude'}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.title
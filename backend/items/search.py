@@ -0,0 +1,61 @@
+"""
+Ranked item search.
+
+On PostgreSQL, items carry a ``search_vector`` kept current by a trigger
+(title weighted A, category and sub-category B, description C) and
+indexed with GIN; a query matches every term as a prefix and is ranked
+with ``ts_rank``. Other databases fall back to case-insensitive substring
+matches, ranked with the same weights.
+"""
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import Case, F, FloatField, Q, Value, When
+
+from .models import Item
+
+# ts_rank's default weights for the A, B and C labels the trigger assigns,
+# reused by the fallback so both backends order results alike.
+FIELD_WEIGHTS = {'title': 1.0, 'category': 0.4, 'sub_category': 0.4, 'description': 0.2}
+
+MAX_TERMS = 8
+
+SEARCH_PAGE_SIZE = 20
+MAX_SEARCH_PAGE_SIZE = 100
+
+
+def query_terms(query):
+    """Lower-cased word terms of ``query`` (at most MAX_TERMS)."""
+    return re.findall(r'\w+', query.lower())[:MAX_TERMS]
+
+
+def search_items(query, queryset=None):
+    """
+    Items matching every term of ``query``, best first, annotated with
+    ``rank``. Returns an empty queryset when the query has no terms.
+    """
+    queryset = Item.objects.all() if queryset is None else queryset
+    terms = query_terms(query)
+    if not terms:
+        return queryset.none()
+    if connection.vendor == 'postgresql':
+        # Only \w terms reach the raw tsquery, so it cannot be malformed.
+        ts_query = SearchQuery(' & '.join(f'{term}:*' for term in terms), search_type='raw', config='english')
+        return (
+            queryset
+            .filter(search_vector=ts_query)
+            .annotate(rank=SearchRank(F('search_vector'), ts_query))
+            .order_by('-rank', '-id')
+        )
+
+    matches = Q()
+    rank = Value(0.0)
+    for term in terms:
+        term_match = Q()
+        for field, weight in FIELD_WEIGHTS.items():
+            field_match = Q(**{f'{field}__icontains': term})
+            term_match |= field_match
+            rank = rank + Case(When(field_match, then=Value(weight)), default=Value(0.0), output_field=FloatField())
+        matches &= term_match
+    return queryset.filter(matches).annotate(rank=rank).order_by('-rank', '-id')
@@ -12,13 +12,26 @@ class ItemSerializer(serializers.ModelSerializer):
             "title",
             "price",
             "location",
+            "latitude",
+            "longitude",
             "category",
             "sub_category",
             "image",  
             "description",
             "created_at",
         ]
-        read_only_fields = ["id", "created_at"]
+        read_only_fields = ["id", "created_at", "latitude", "longitude"]
+
+    def __init__(self, *args, fields=None, **kwargs):
+        """``fields`` limits the output to those of Meta.fields."""
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+# What the catalog listings return unless the client asks for ``fields``.
+ITEM_LIST_FIELDS = [name for name in ItemSerializer.Meta.fields if name != "description"]
 
 
 class SearchHistorySerializer(serializers.ModelSerializer):
@@ -1,3 +1,135 @@
+import datetime
+
+from unittest import mock
+
 from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from recommendations import geo
+from users.models import User
+
+from .models import Item, SearchHistory
+from .search import search_items
+
+
+class KeysetPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='renter', email='renter@example.com', password='x')
+        created_at = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+        for number in range(7):
+            Item.objects.create(
+                rentee=cls.user, title=f'Item {number}', price=10, location='Lahore',
+                category='Tents' if number % 2 else 'Bikes', sub_category='Other',
+                image='items/item.jpg', description='',
+            )
+        # Rows sharing a timestamp must still page by id without gaps or repeats.
+        ids = list(Item.objects.order_by('id').values_list('id', flat=True))
+        Item.objects.filter(id__in=ids[:4]).update(created_at=created_at)
+        Item.objects.filter(id__in=ids[4:]).update(created_at=created_at + datetime.timedelta(days=1))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def walk(self, **params):
+        seen, cursor = [], None
+        while True:
+            query = dict(params, page_size=2, **({'cursor': cursor} if cursor else {}))
+            response = self.client.get(reverse('item-list'), query)
+            self.assertEqual(response.status_code, 200)
+            seen += [item['id'] for item in response.data['results']]
+            cursor = response.data['next_cursor']
+            if cursor is None:
+                return seen
+
+    def test_cursor_walks_every_item_once_newest_first(self):
+        expected = list(Item.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(self.walk(), expected)
+
+    def test_cursor_keeps_the_category_filter(self):
+        expected = list(Item.objects.filter(category='Tents').order_by('-created_at', '-id')
+                        .values_list('id', flat=True))
+        self.assertEqual(self.walk(category='tents'), expected)
+
+    def test_projected_fields(self):
+        response = self.client.get(reverse('item-list'), {'fields': 'id,title'})
+        self.assertEqual(set(response.data['results'][0]), {'id', 'title'})
+        self.assertEqual(self.client.get(reverse('item-list'), {'fields': 'id,nope'}).status_code, 400)
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get(reverse('item-list'), {'cursor': 'not-a-cursor'}).status_code, 404)
+
+
+class SearchRankingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='searcher', email='searcher@example.com', password='x')
+
+        def item(title, category='Other', sub_category='Other', description=''):
+            return Item.objects.create(
+                rentee=cls.user, title=title, price=10, location='Lahore', category=category,
+                sub_category=sub_category, image='items/item.jpg', description=description,
+            ).pk
+
+        cls.in_description = item('Folding chair', description='Fits in any camping tent')
+        cls.in_title = item('Camping tent for four')
+        cls.in_category = item('Dome shelter', category='Camping', sub_category='Tents')
+        cls.one_term = item('Camping stove')
+        for number in range(5):
+            item(f'Tent peg set {number}')
+
+    def ids(self, query):
+        return list(search_items(query).values_list('id', flat=True))
+
+    def test_every_term_must_match_and_title_ranks_first(self):
+        self.assertEqual(self.ids('camping tent'), [self.in_title, self.in_category, self.in_description])
+
+    def test_terms_match_as_prefixes(self):
+        self.assertIn(self.in_title, self.ids('camp ten'))
+
+    def test_query_without_terms(self):
+        self.assertEqual(self.ids('  !! '), [])
+
+    def test_view_pages_and_logs_only_the_first_page(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = reverse('search_items')
+        first = client.get(url, {'q': 'tent', 'page_size': 3}).data
+        second = client.get(url, {'q': 'tent', 'page_size': 3, 'page': 2}).data
+        third = client.get(url, {'q': 'tent', 'page_size': 3, 'page': 3}).data
+        self.assertTrue(first['has_next'] and second['has_next'])
+        self.assertFalse(third['has_next'])
+        seen = [item['id'] for page in (first, second, third) for item in page['search_results']]
+        self.assertEqual(seen, self.ids('tent'))
+        self.assertEqual(len(seen), 8)
+        history = SearchHistory.objects.get(user=self.user)
+        self.assertEqual((history.search_query, history.item_id), ('tent', seen[0]))
+        self.assertEqual(client.get(url, {'q': ''}).status_code, 400)
+
+
+class NearbyTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='renter', email='renter@example.com', password='x')
+        for number in range(5):
+            Item.objects.create(
+                rentee=cls.user, title=f'Item {number}', price=10, location=f'31.5{number},74.35',
+                category='Tents', sub_category='Other', image='items/item.jpg', description='',
+            )
 
+    def nearby(self, **params):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with mock.patch.object(geo, '_grid', None):
+            return client.get(reverse('nearby-items'), dict(params, lat=31.5, lng=74.35))
 
+    def test_limit_and_k_are_clamped_to_at_least_one(self):
+        self.assertEqual(len(self.nearby(radius_km=50, limit=-2).data), 1)
+        self.assertEqual(len(self.nearby(radius_km=50, limit=0).data), 1)
+        self.assertEqual(len(self.nearby(k=-3).data), 1)
+        self.assertEqual(len(self.nearby(radius_km=50).data), 5)
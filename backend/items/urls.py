@@ -10,6 +10,8 @@ urlpatterns = [
     path('excludemyitems/', ItemViewSet.as_view({'get': 'exclude_my_items'}), name='exclude-my-items'),
     path('myitems/', ItemViewSet.as_view({'get': 'my_items'}), name='my-items'),  
     path('search/', ItemViewSet.as_view({'get': 'search_items'}), name='search_items'),
+    path('autocomplete/', ItemViewSet.as_view({'get': 'autocomplete'}), name='autocomplete'),
+    path('nearby/', ItemViewSet.as_view({'get': 'nearby'}), name='nearby-items'),
     
     path('saved-items/', SavedItemViewSet.as_view({'get': 'list', 'post': 'create'}), name='saved-items'),
     path('saved-items/<int:pk>/', SavedItemViewSet.as_view({'delete': 'destroy'}), name='saved-item-detail'),
@@ -3,8 +3,9 @@ from rest_framework.response import Response
 from rest_framework.exceptions import NotAuthenticated
 from rest_framework.decorators import action
 from .models import Item,SearchHistory, SavedItem
-from .serializers import ItemSerializer,SearchHistorySerializer, SavedItemSerializer
-from django.db.models import Q
+from .pagination import KeysetPagination
+from .serializers import ITEM_LIST_FIELDS, ItemSerializer,SearchHistorySerializer, SavedItemSerializer
+from .search import MAX_SEARCH_PAGE_SIZE, SEARCH_PAGE_SIZE, search_items as ranked_search
 from bookings.models import Booking
 from django.db.models import Exists, OuterRef, Prefetch
 
@@ -16,14 +17,37 @@ class ItemViewSet(viewsets.ModelViewSet):
     serializer_class = ItemSerializer
     queryset = Item.objects.all()
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+
+    def _listing(self, request, queryset):
+        """
+        One keyset page of ``queryset``, newest first, with the fields named
+        in ``fields`` (by default everything but the description).
+        """
+        if 'fields' in request.query_params:
+            fields = [name for name in request.query_params['fields'].split(',') if name]
+            unknown = set(fields) - set(ItemSerializer.Meta.fields)
+            if unknown or not fields:
+                return Response(
+                    {"detail": f"Unknown fields: {', '.join(sorted(unknown))}." if unknown else "fields is empty."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+        else:
+            fields = ITEM_LIST_FIELDS
+        category = request.query_params.get('category')
+        if category:
+            queryset = queryset.filter(category__icontains=category)
+        # Only load the columns being returned (plus the keyset).
+        queryset = queryset.only(*{'id', 'created_at', *fields})
+        page = self.paginate_queryset(queryset)
+        serializer = ItemSerializer(page, many=True, fields=fields, context=self.get_serializer_context())
+        return self.get_paginated_response(serializer.data)
 
     def list(self, request, *args, **kwargs):
         """
-        Handles GET requests to list all items.
+        Handles GET requests to list all items, a page at a time.
         """
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return self._listing(request, self.get_queryset())
 
     @action(detail=False, methods=['get'], url_path='exclude-my-items')
     def exclude_my_items(self, request):
@@ -33,9 +57,7 @@ class ItemViewSet(viewsets.ModelViewSet):
         if not request.user.is_authenticated:
             raise NotAuthenticated("User must be authenticated.")
         
-        queryset = self.get_queryset().exclude(rentee_id=request.user.id)
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return self._listing(request, self.get_queryset().exclude(rentee_id=request.user.id))
 
     @action(detail=False, methods=['get'], url_path='myitems')
     def my_items(self, request):
@@ -135,33 +157,118 @@ class ItemViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'], url_path='search')
     def search_items(self, request):
         """
-        Search for items and log the search query along with the logged-in user's ID.
+        Ranked search over title, category, sub-category and description,
+        paginated with ``page`` and ``page_size``. ``mode=semantic`` ranks by
+        embedding similarity instead (blended with the keyword rank unless
+        ``blend=0``). The first page's query is logged with its top result
+        for the logged-in user.
         """
         query = request.query_params.get('q', '').strip()  
         if not query:
             return Response({"detail": "Search query is required."}, status=status.HTTP_400_BAD_REQUEST)
-    
-        items = Item.objects.filter(
-            Q(title__icontains=query) |
-            Q(description__icontains=query)
-        )
-    
+        mode = request.query_params.get('mode', 'keyword')
+        if mode not in ('keyword', 'semantic'):
+            return Response({"detail": "mode must be 'keyword' or 'semantic'."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            page = int(request.query_params.get('page', 1))
+            page_size = int(request.query_params.get('page_size', SEARCH_PAGE_SIZE))
+        except ValueError:
+            return Response({"detail": "page and page_size must be integers."}, status=status.HTTP_400_BAD_REQUEST)
+        page = max(page, 1)
+        page_size = min(max(page_size, 1), MAX_SEARCH_PAGE_SIZE)
+
+        # One extra row tells whether another page follows, without a COUNT.
+        offset = (page - 1) * page_size
+        if mode == 'semantic':
+            from recommendations.conf import rec_setting
+            from recommendations.semantic import semantic_search
+
+            # Semantic results stop at SEMANTIC_CANDIDATES items.
+            limit = min(offset + page_size + 1, rec_setting('SEMANTIC_CANDIDATES'))
+            ranked, semantic = semantic_search(query, limit, blend=request.query_params.get('blend') != '0')
+            mode = 'semantic' if semantic else 'keyword'
+            item_ids = [item_id for item_id, _ in ranked[offset:offset + page_size + 1]]
+            found = Item.objects.defer('search_vector').in_bulk(item_ids)
+            items = [found[item_id] for item_id in item_ids if item_id in found]
+        else:
+            items = list(ranked_search(query).defer('search_vector')[offset:offset + page_size + 1])
+        has_next = len(items) > page_size
+        items = items[:page_size]
+
+        if page == 1:
+            SearchHistory.objects.create(
+                user=request.user,
+                item=items[0] if items else None,
+                search_query=query,
+            )
+
         serializer = ItemSerializer(items, many=True)
-  
-        relevant_item = items.first() if items.exists() else None
-  
-        search_entry = SearchHistory.objects.create(
-            user=request.user,
-            item=relevant_item,  
-            search_query=query  
-        )
-        search_entry.save()
-  
         return Response({
             "search_results": serializer.data,
+            "page": page,
+            "page_size": page_size,
+            "has_next": has_next,
+            "mode": mode,
             "message": f"Search for '{query}' logged successfully."
         }, status=status.HTTP_200_OK)
 
+    @action(detail=False, methods=['get'], url_path='autocomplete')
+    def autocomplete(self, request):
+        """
+        Up to ``limit`` completions of the prefix ``q`` from item titles,
+        categories and popular searches, served from memory. Unlike
+        ``search/``, nothing is logged.
+        """
+        from recommendations.autocomplete import get_completion_index
+        from recommendations.conf import rec_setting
+
+        try:
+            limit = min(int(request.query_params.get('limit', rec_setting('AUTOCOMPLETE_LIMIT'))),
+                        rec_setting('AUTOCOMPLETE_LIMIT'))
+        except ValueError:
+            return Response({"detail": "limit must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+
+        index = get_completion_index()
+        # Empty until the index's first background build finishes.
+        suggestions = index.complete(request.query_params.get('q', ''), max(limit, 1)) if index is not None else []
+        return Response({"suggestions": suggestions}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'], url_path='nearby')
+    def nearby(self, request):
+        """
+        Items within ``radius_km`` of ``lat``/``lng``, or with ``k`` the k
+        nearest (up to the maximum radius), nearest first with their
+        distance in km.
+        """
+        from recommendations.conf import rec_setting
+        from recommendations.geo import get_item_grid, parse_near
+
+        try:
+            near = parse_near(request.query_params)
+            k = max(int(request.query_params['k']), 1) if 'k' in request.query_params else None
+            limit = max(min(int(request.query_params.get('limit', 50)), 200), 1)
+        except ValueError as e:
+            return Response({"detail": f"Invalid location query: {e}"}, status=status.HTTP_400_BAD_REQUEST)
+        if near is None:
+            return Response({"detail": "lat and lng are required."}, status=status.HTTP_400_BAD_REQUEST)
+
+        latitude, longitude, radius_km = near
+        grid = get_item_grid()
+        if k is not None:
+            item_ids, distances = grid.nearest(latitude, longitude, min(k, limit), rec_setting('NEARBY_MAX_RADIUS_KM'))
+        else:
+            item_ids, distances = grid.within(latitude, longitude, radius_km)
+            item_ids, distances = item_ids[:limit], distances[:limit]
+
+        items = Item.objects.in_bulk(item_ids.tolist())
+        data = []
+        for item_id, distance in zip(item_ids.tolist(), distances.tolist()):
+            if item_id in items:
+                row = ItemSerializer(items[item_id]).data
+                row['distance_km'] = round(distance, 3)
+                data.append(row)
+        return Response(data, status=status.HTTP_200_OK)
+
 class SavedItemViewSet(viewsets.ModelViewSet):
     """
     ViewSet for handling CRUD operations for saved items.
@@ -0,0 +1,273 @@
+"""
+Implicit-feedback matrix factorisation (ALS).
+
+Trained offline from searches, saves and bookings, each weighted by how
+strong a signal it is (EVENT_WEIGHTS). Preferences are binary and the summed event weight
+becomes a confidence ``1 + alpha * weight`` (Hu, Koren & Volinsky). The
+factor matrices are stored as raw float32 files and memory-mapped, so
+serving a user is one matrix-vector product against the item factors.
+Users who arrived after training are folded in with a single
+least-squares solve against the fixed item factors.
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+import scipy.sparse as sp
+
+from .conf import rec_setting
+from .embeddings import FileLock, file_stamp
+from .interactions import load_events
+from .scoring import top_k
+
+logger = logging.getLogger(__name__)
+
+# Non-zeros handled per conjugate-gradient chunk; bounds the gathered
+# (nnz, factors) block of fixed-side vectors.
+CHUNK_NNZ = 1 << 20
+
+
+def confidence_matrix(rows, cols, weights, shape, alpha):
+    """CSR of ``1 + alpha * summed weight`` for every observed (row, col)."""
+    matrix = sp.coo_matrix((np.asarray(weights, dtype=np.float32), (rows, cols)), shape=shape).tocsr()
+    matrix.sum_duplicates()
+    matrix.data = 1 + alpha * matrix.data
+    return matrix
+
+
+def least_squares(confidence, solved, fixed, regularization, cg_steps=3):
+    """
+    Update every row of ``solved`` against the ``fixed`` factors, i.e.
+    approximately solve ``(F'F + F'(C - I)F + reg*I) x = F'C p`` per row,
+    with a few conjugate-gradient steps warm-started from the current
+    ``solved``. Each step costs O(nnz * factors) instead of the
+    O(nnz * factors^2) of forming the normal equations.
+    """
+    n_rows, n_factors = solved.shape
+    fixed = np.asarray(fixed, dtype=np.float64)
+    gram = fixed.T @ fixed + regularization * np.eye(n_factors)
+    indptr = confidence.indptr
+
+    start = 0
+    while start < n_rows:
+        stop = int(np.searchsorted(indptr, indptr[start] + CHUNK_NNZ, side='right')) - 1
+        stop = min(n_rows, max(start + 1, stop))
+        chunk = confidence[start:stop]
+        rows = np.repeat(np.arange(stop - start), np.diff(chunk.indptr))
+        conf = chunk.data.astype(np.float64)
+        vectors = fixed[chunk.indices]
+
+        def product(p):
+            # (F'F + reg*I) p + F'(C - I)F p, the last term as a sparse
+            # product so the per-row sums never loop in Python.
+            weighted = (conf - 1) * np.einsum('ij,ij->i', vectors, p[rows])
+            return p @ gram + sp.csr_matrix((weighted, chunk.indices, chunk.indptr), shape=chunk.shape) @ fixed
+
+        x = solved[start:stop].astype(np.float64)
+        residual = chunk @ fixed - product(x)
+        direction = residual.copy()
+        rs_old = np.einsum('ij,ij->i', residual, residual)
+        for _ in range(cg_steps):
+            a_direction = product(direction)
+            denominator = np.einsum('ij,ij->i', direction, a_direction)
+            step = np.divide(rs_old, denominator, out=np.zeros_like(rs_old), where=denominator > 0)
+            x += step[:, None] * direction
+            residual -= step[:, None] * a_direction
+            rs_new = np.einsum('ij,ij->i', residual, residual)
+            beta = np.divide(rs_new, rs_old, out=np.zeros_like(rs_new), where=rs_old > 0)
+            direction = residual + beta[:, None] * direction
+            rs_old = rs_new
+        solved[start:stop] = x
+        start = stop
+    return solved
+
+
+def fit(confidence, factors=32, regularization=0.05, iterations=15, seed=0):
+    """Alternate user and item solves; returns ``(user_factors, item_factors)``."""
+    rng = np.random.default_rng(seed)
+    item_confidence = confidence.T.tocsr()
+    user_factors = (rng.standard_normal((confidence.shape[0], factors)) * 0.01).astype(np.float32)
+    item_factors = (rng.standard_normal((confidence.shape[1], factors)) * 0.01).astype(np.float32)
+    for _ in range(iterations):
+        least_squares(confidence, user_factors, item_factors, regularization)
+        least_squares(item_confidence, item_factors, user_factors, regularization)
+    return user_factors, item_factors
+
+
+class ALSModel:
+    """
+    Trained factors plus the id mappings and the items each training user
+    interacted with (excluded when recommending).
+    """
+
+    def __init__(self, user_ids, item_ids, user_factors, item_factors, seen, regularization, alpha,
+                 trained_at=None):
+        self.user_ids = np.asarray(user_ids, dtype=np.int64)
+        self.item_ids = np.asarray(item_ids, dtype=np.int64)
+        self.user_factors = user_factors
+        self.item_factors = item_factors
+        self.seen = seen
+        self.regularization = regularization
+        self.alpha = alpha
+        self.trained_at = trained_at
+        self.user_index = {user_id: row for row, user_id in enumerate(self.user_ids.tolist())}
+        self.item_index = {item_id: col for col, item_id in enumerate(self.item_ids.tolist())}
+        self._gram = None
+
+    @property
+    def factors(self):
+        return self.item_factors.shape[1]
+
+    @classmethod
+    def train(cls, user_ids, item_ids, weights, factors=32, regularization=0.05, alpha=10.0,
+              iterations=15, seed=0):
+        """Fit on parallel arrays of event user ids, item ids and weights."""
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        item_ids = np.asarray(item_ids, dtype=np.int64)
+        unique_users, rows = np.unique(user_ids, return_inverse=True)
+        unique_items, cols = np.unique(item_ids, return_inverse=True)
+        confidence = confidence_matrix(rows, cols, weights, (len(unique_users), len(unique_items)), alpha)
+        user_factors, item_factors = fit(confidence, factors, regularization, iterations, seed)
+        seen = sp.csr_matrix((np.ones(confidence.nnz, dtype=np.int8), confidence.indices, confidence.indptr),
+                             shape=confidence.shape)
+        return cls(unique_users, unique_items, user_factors, item_factors, seen, regularization, alpha,
+                   trained_at=time.time())
+
+    # -- serving -------------------------------------------------------------
+
+    def user_vector(self, user_id):
+        """``(vector, seen_cols)`` for a user seen in training, else None."""
+        row = self.user_index.get(user_id)
+        if row is None:
+            return None
+        start, stop = self.seen.indptr[row], self.seen.indptr[row + 1]
+        return np.asarray(self.user_factors[row]), self.seen.indices[start:stop]
+
+    def fold_in(self, item_ids, weights):
+        """
+        Solve a user vector for events on known items against the fixed item
+        factors. Returns ``(vector, seen_cols)``, or None without usable events.
+        """
+        pairs = [(self.item_index[item_id], weight)
+                 for item_id, weight in zip(item_ids, weights) if item_id in self.item_index]
+        if not pairs:
+            return None
+        cols, weights = zip(*pairs)
+        confidence = confidence_matrix(np.zeros(len(cols), dtype=np.int64), cols, weights,
+                                       (1, len(self.item_ids)), self.alpha)
+        item_factors = np.asarray(self.item_factors, dtype=np.float64)
+        if self._gram is None:
+            self._gram = item_factors.T @ item_factors
+        vectors = item_factors[confidence.indices]
+        conf = confidence.data.astype(np.float64)
+        lhs = self._gram + vectors.T @ ((conf - 1)[:, None] * vectors) + self.regularization * np.eye(self.factors)
+        rhs = vectors.T @ conf
+        return np.linalg.solve(lhs, rhs).astype(np.float32), confidence.indices
+
+    def recommend(self, user_vector, exclude_cols=(), k=50, item_ids=None):
+        """
+        Best ``k`` ``(item_ids, scores)`` by dot product, skipping
+        ``exclude_cols``. Only ``item_ids`` are scored when given.
+        """
+        if item_ids is not None:
+            item_ids = np.asarray(item_ids, dtype=np.int64)
+            cols = np.minimum(np.searchsorted(self.item_ids, item_ids), max(len(self.item_ids) - 1, 0))
+            cols = np.setdiff1d(cols[self.item_ids[cols] == item_ids], exclude_cols)
+            scores = np.asarray(self.item_factors[cols]) @ user_vector
+            best = top_k(scores, k)
+            return self.item_ids[cols[best]], scores[best]
+        scores = np.asarray(self.item_factors) @ user_vector
+        scores[np.asarray(exclude_cols, dtype=np.int64)] = -np.inf
+        best = top_k(scores, k)
+        best = best[np.isfinite(scores[best])]
+        return self.item_ids[best], scores[best]
+
+    # -- persistence ---------------------------------------------------------
+
+    def save(self, directory, name='als'):
+        os.makedirs(directory, exist_ok=True)
+        paths = _paths(directory, name)
+        with FileLock(paths['lock']):
+            for key, matrix in (('user_factors', self.user_factors), ('item_factors', self.item_factors)):
+                tmp_path = f'{paths[key]}.tmp'
+                np.ascontiguousarray(matrix, dtype=np.float32).tofile(tmp_path)
+                os.replace(tmp_path, paths[key])
+            tmp_path = f'{paths["seen"]}.tmp.npz'
+            np.savez(tmp_path, indptr=self.seen.indptr, indices=self.seen.indices)
+            os.replace(tmp_path, paths['seen'])
+            # The metadata file is written last; readers reload when it changes.
+            tmp_path = f'{paths["meta"]}.tmp'
+            with open(tmp_path, 'w') as fh:
+                json.dump({
+                    'factors': self.factors,
+                    'regularization': self.regularization,
+                    'alpha': self.alpha,
+                    'trained_at': self.trained_at,
+                    'user_ids': self.user_ids.tolist(),
+                    'item_ids': self.item_ids.tolist(),
+                }, fh)
+            os.replace(tmp_path, paths['meta'])
+
+    @classmethod
+    def load(cls, directory, name='als'):
+        paths = _paths(directory, name)
+        with FileLock(paths['lock']):
+            with open(paths['meta']) as fh:
+                meta = json.load(fh)
+            n_users, n_items, factors = len(meta['user_ids']), len(meta['item_ids']), meta['factors']
+            user_factors = np.memmap(paths['user_factors'], dtype=np.float32, mode='r', shape=(n_users, factors))
+            item_factors = np.memmap(paths['item_factors'], dtype=np.float32, mode='r', shape=(n_items, factors))
+            with np.load(paths['seen']) as arrays:
+                indptr, indices = arrays['indptr'], arrays['indices']
+        seen = sp.csr_matrix((np.ones(len(indices), dtype=np.int8), indices, indptr), shape=(n_users, n_items))
+        return cls(meta['user_ids'], meta['item_ids'], user_factors, item_factors, seen,
+                   meta['regularization'], meta['alpha'], meta.get('trained_at'))
+
+
+def _paths(directory, name):
+    return {
+        'meta': os.path.join(directory, f'{name}.json'),
+        'user_factors': os.path.join(directory, f'{name}_users.f32'),
+        'item_factors': os.path.join(directory, f'{name}_items.f32'),
+        'seen': os.path.join(directory, f'{name}_seen.npz'),
+        'lock': os.path.join(directory, f'{name}.lock'),
+    }
+
+
+def train_als_model(factors=None, iterations=None, regularization=None, alpha=None):
+    """Train on the current events and save to STORE_DIR; returns the model or None."""
+    user_ids, item_ids, weights, _ = load_events()
+    if not len(user_ids):
+        return None
+    model = ALSModel.train(
+        user_ids, item_ids, weights,
+        factors=factors or rec_setting('ALS_FACTORS'),
+        regularization=rec_setting('ALS_REGULARIZATION') if regularization is None else regularization,
+        alpha=rec_setting('ALS_ALPHA') if alpha is None else alpha,
+        iterations=iterations or rec_setting('ALS_ITERATIONS'),
+    )
+    model.save(rec_setting('STORE_DIR'))
+    return model
+
+
+_model = None
+_model_stamp = None
+_model_lock = threading.Lock()
+
+
+def get_als_model():
+    """The last trained model, reloaded when the training job rewrites it."""
+    global _model, _model_stamp
+    path = _paths(rec_setting('STORE_DIR'), 'als')['meta']
+    with _model_lock:
+        if not os.path.exists(path):
+            return None
+        stamp = file_stamp(path)
+        if _model is None or stamp != _model_stamp:
+            _model = ALSModel.load(rec_setting('STORE_DIR'))
+            _model_stamp = stamp
+            logger.info(f"Loaded ALS factors for {len(_model.user_ids)} users and {len(_model.item_ids)} items.")
+        return _model
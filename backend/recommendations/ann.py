@@ -0,0 +1,334 @@
+"""
+Nearest-neighbour indexes over L2-normalised item vectors.
+
+Every backend exposes the same ``add`` / ``remove`` / ``search`` API and
+scores by inner product (cosine for normalised vectors):
+
+* ``exact`` - brute-force scan, the reference for recall checks.
+* ``ivf``   - inverted file over spherical k-means cells; ``nprobe`` cells
+  are scanned per query, trading recall for latency.
+* ``hnsw``  - HNSW graph via the optional ``hnswlib`` package; ``ef``
+  controls the recall/latency trade-off.
+"""
+import logging
+import threading
+
+import numpy as np
+
+from .conf import rec_setting
+from .scoring import top_k as _top_k
+
+logger = logging.getLogger(__name__)
+
+
+class ExactIndex:
+    """Brute-force inner-product search."""
+
+    def __init__(self, dim):
+        self.dim = dim
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._vectors = np.zeros((0, dim), dtype=np.float32)
+        self._count = 0
+        self._positions = {}
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, item_id):
+        return item_id in self._positions
+
+    def _grow(self, needed):
+        if needed <= len(self._ids):
+            return
+        capacity = max(needed, 2 * len(self._ids), 64)
+        ids = np.zeros(capacity, dtype=np.int64)
+        vectors = np.zeros((capacity, self.dim), dtype=np.float32)
+        ids[:self._count] = self._ids[:self._count]
+        vectors[:self._count] = self._vectors[:self._count]
+        self._ids, self._vectors = ids, vectors
+
+    def add(self, ids, vectors):
+        """Add or replace vectors; an id repeated within ``ids`` keeps its last vector."""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        last = {int(item_id): row for row, item_id in enumerate(ids)}
+        if len(last) < len(vectors):
+            rows = sorted(last.values())
+            ids, vectors = [ids[row] for row in rows], vectors[rows]
+        self.remove([item_id for item_id in ids if item_id in self._positions])
+        self._grow(self._count + len(vectors))
+        for item_id, vector in zip(ids, vectors):
+            self._ids[self._count] = item_id
+            self._vectors[self._count] = vector
+            self._positions[int(item_id)] = self._count
+            self._count += 1
+        return list(ids)
+
+    def remove(self, ids):
+        for item_id in ids:
+            pos = self._positions.pop(int(item_id), None)
+            if pos is None:
+                continue
+            last = self._count - 1
+            if pos != last:
+                moved = int(self._ids[last])
+                self._ids[pos] = moved
+                self._vectors[pos] = self._vectors[last]
+                self._positions[moved] = pos
+            self._count -= 1
+
+    def search(self, query, k):
+        """Return ``(ids, scores)`` of the ``k`` best matches for one query vector."""
+        if not self._count:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        scores = self._vectors[:self._count] @ np.asarray(query, dtype=np.float32)
+        order = _top_k(scores, k)
+        return self._ids[order], scores[order]
+
+
+class IVFIndex(ExactIndex):
+    """
+    Inverted-file index. Vectors are bucketed by their nearest k-means
+    centroid and a query only scans the ``nprobe`` best buckets. Until enough
+    vectors exist to train the centroids it behaves like ``ExactIndex``.
+    """
+
+    def __init__(self, dim, nlist=None, nprobe=8, min_train_size=1000, train_iterations=10, seed=0):
+        super().__init__(dim)
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_train_size = min_train_size
+        self.train_iterations = train_iterations
+        self.seed = seed
+        self.centroids = None
+        self._trained_count = 0
+        self._assign = np.zeros(0, dtype=np.int32)
+        self._lists = None
+
+    def _target_nlist(self):
+        return self.nlist or max(1, int(np.sqrt(self._count)))
+
+    def _grow(self, needed):
+        old = self._assign
+        super()._grow(needed)
+        if len(self._assign) < len(self._ids):
+            self._assign = np.zeros(len(self._ids), dtype=np.int32)
+            self._assign[:len(old)] = old
+
+    def train(self):
+        """Fit the centroids on the current vectors and re-bucket everything."""
+        nlist = self._target_nlist()
+        self._trained_count = self._count
+        if self._count < max(self.min_train_size, nlist * 4):
+            self.centroids = None
+            return
+        rng = np.random.default_rng(self.seed)
+        vectors = self._vectors[:self._count]
+        sample_size = min(self._count, nlist * 256)
+        sample = vectors[rng.choice(self._count, size=sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, size=nlist, replace=False)].copy()
+        for _ in range(self.train_iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            for cell in range(nlist):
+                members = sample[labels == cell]
+                if len(members):
+                    centroid = members.sum(axis=0)
+                    norm = np.linalg.norm(centroid)
+                    centroids[cell] = centroid / norm if norm else centroid
+        self.centroids = centroids
+        self._assign[:self._count] = self._nearest_cells(vectors)
+        self._lists = None
+
+    def _nearest_cells(self, vectors):
+        assign = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), 4096):
+            chunk = vectors[start:start + 4096]
+            assign[start:start + len(chunk)] = np.argmax(chunk @ self.centroids.T, axis=1)
+        return assign
+
+    def add(self, ids, vectors):
+        added = super().add(ids, vectors)
+        # Re-added ids were removed first, swapping other rows around; the
+        # new rows are always the last ones.
+        start = self._count - len(added)
+        self._lists = None
+        if self._count >= self.min_train_size and self._count > 2 * self._trained_count:
+            # The catalog has doubled since the centroids were fitted.
+            self.train()
+        elif self.centroids is not None and self._count > start:
+            self._assign[start:self._count] = self._nearest_cells(self._vectors[start:self._count])
+        return added
+
+    def remove(self, ids):
+        for item_id in ids:
+            pos = self._positions.get(int(item_id))
+            if pos is not None:
+                self._assign[pos] = self._assign[self._count - 1]
+            super().remove([item_id])
+        self._lists = None
+
+    def _build_lists(self):
+        order = np.argsort(self._assign[:self._count], kind='stable')
+        bounds = np.searchsorted(self._assign[:self._count][order], np.arange(len(self.centroids) + 1))
+        self._lists = (order, bounds)
+
+    def search(self, query, k, nprobe=None):
+        if self.centroids is None:
+            return super().search(query, k)
+        if self._lists is None:
+            self._build_lists()
+        query = np.asarray(query, dtype=np.float32)
+        order, bounds = self._lists
+        cells = _top_k(self.centroids @ query, nprobe or self.nprobe)
+        positions = np.concatenate([order[bounds[c]:bounds[c + 1]] for c in cells])
+        if not len(positions):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        scores = self._vectors[positions] @ query
+        best = _top_k(scores, k)
+        return self._ids[positions[best]], scores[best]
+
+
+class HNSWIndex:
+    """HNSW graph backed by ``hnswlib``; ``ef`` is the search beam width."""
+
+    def __init__(self, dim, m=16, ef_construction=200, ef=64, max_elements=1024):
+        import hnswlib
+
+        self.dim = dim
+        self.ef = ef
+        self._index = hnswlib.Index(space='ip', dim=dim)
+        self._index.init_index(max_elements=max_elements, ef_construction=ef_construction,
+                               M=m, allow_replace_deleted=True)
+        self._index.set_ef(ef)
+        self._live = set()
+
+    def __len__(self):
+        return len(self._live)
+
+    def __contains__(self, item_id):
+        return item_id in self._live
+
+    def add(self, ids, vectors):
+        ids = [int(item_id) for item_id in ids]
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        needed = self._index.element_count + len(ids)
+        if needed > self._index.get_max_elements():
+            self._index.resize_index(max(needed, 2 * self._index.get_max_elements()))
+        self._index.add_items(vectors, np.asarray(ids, dtype=np.int64), replace_deleted=True)
+        self._live.update(ids)
+        return ids
+
+    def remove(self, ids):
+        for item_id in ids:
+            if int(item_id) in self._live:
+                self._index.mark_deleted(int(item_id))
+                self._live.discard(int(item_id))
+
+    def search(self, query, k, ef=None):
+        k = min(k, len(self._live))
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        if ef:
+            self._index.set_ef(max(ef, k))
+        elif self.ef < k:
+            self._index.set_ef(k)
+        labels, distances = self._index.knn_query(np.asarray(query, dtype=np.float32), k=k)
+        # hnswlib's 'ip' space reports 1 - dot as the distance.
+        return labels[0].astype(np.int64), (1 - distances[0]).astype(np.float32)
+
+
+BACKENDS = {
+    'exact': ExactIndex,
+    'ivf': IVFIndex,
+    'hnsw': HNSWIndex,
+}
+
+
+def backend_params(backend):
+    """The ANN_PARAMS configured for ``backend``."""
+    return dict(rec_setting('ANN_PARAMS').get(backend, {}))
+
+
+def create_index(dim, backend=None, **params):
+    backend = backend or rec_setting('ANN_BACKEND')
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown ANN backend '{backend}'. Choose from {', '.join(BACKENDS)}.")
+    if not params:
+        params = backend_params(backend)
+    return BACKENDS[backend](dim, **params)
+
+
+def build_index(ids, vectors, backend=None, **params):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    index = create_index(vectors.shape[1], backend=backend, **params)
+    if isinstance(index, HNSWIndex) and len(ids):
+        index._index.resize_index(max(len(ids), 1024))
+    index.add(ids, vectors)
+    return index
+
+
+def recall_at_k(index, reference, queries, k=10):
+    """
+    Mean fraction of the reference index's top-k that ``index`` also returns.
+    ``reference`` is normally an ``ExactIndex`` over the same vectors.
+    """
+    if not len(queries):
+        return 1.0
+    hits = 0
+    total = 0
+    for query in queries:
+        expected, _ = reference.search(query, k)
+        found, _ = index.search(query, k)
+        hits += len(set(expected.tolist()) & set(found.tolist()))
+        total += len(expected)
+    return hits / total if total else 1.0
+
+
+class ItemIndexCache:
+    """
+    Keeps one index per process in step with the item embedding store,
+    applying journalled changes incrementally and rebuilding only when the
+    journal no longer covers the gap.
+    """
+
+    def __init__(self):
+        self.index = None
+        self.version = None
+        self._lock = threading.Lock()
+
+    def get(self, store):
+        with self._lock:
+            if self.index is None or self.version is None:
+                self._rebuild(store)
+            elif store.version != self.version:
+                changed = store.changes_since(self.version)
+                if changed is None:
+                    self._rebuild(store)
+                else:
+                    self._apply(store, changed)
+            return self.index
+
+    def _rebuild(self, store):
+        self.index = build_index(list(store.ids), np.asarray(store.vectors()))
+        self.version = store.version
+        logger.info(f"Built {type(self.index).__name__} over {len(store)} item vectors.")
+
+    def _apply(self, store, changed):
+        self.index.remove(changed)
+        present, vectors = store.get(list(changed))
+        if present:
+            self.index.add(present, vectors)
+        self.version = store.version
+
+    def reset(self):
+        with self._lock:
+            self.index = None
+            self.version = None
+
+
+_item_index_cache = ItemIndexCache()
+
+
+def get_item_index(store=None):
+    from .embeddings import get_item_store
+
+    return _item_index_cache.get(get_item_store() if store is None else store)
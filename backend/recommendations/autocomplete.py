@@ -0,0 +1,273 @@
+"""
+Prefix completions for the search box.
+
+Phrases are item titles, categories and sub-categories, and queries
+searched at least AUTOCOMPLETE_MIN_QUERY_COUNT times, each weighted by how
+often it occurs (see AUTOCOMPLETE_WEIGHTS). Every phrase is indexed under
+each of its first few word-start suffixes, so "cam" completes "tent
+camera", in one sorted array of ``(key, phrase)`` pairs: a prefix is a
+contiguous range found by bisection. Ranges too long to scan per request
+keep their best phrases cached, patched in place as weights grow.
+
+The process-wide index is built in a background thread, never on the
+request path, and rebuilt every AUTOCOMPLETE_REFRESH_SECONDS; in between,
+the Item and SearchHistory signals in this process update it.
+"""
+import bisect
+import heapq
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.db import close_old_connections
+from django.db.models import Count
+
+from .conf import rec_setting
+
+logger = logging.getLogger(__name__)
+
+# Word-start suffixes a phrase is indexed under ("red tent camera" is
+# found by "red", "tent" and "camera").
+MAX_KEY_WORDS = 3
+# Prefix ranges up to this long are scanned; longer ones are cached.
+SCAN_LIMIT = 256
+# Prefixes this short are cached for every key when the index is built.
+PRECOMPUTED_PREFIX_LENGTH = 3
+
+
+def normalise(text):
+    """Lower-cased ``text`` with runs of whitespace collapsed to one space."""
+    return ' '.join((text or '').lower().split())
+
+
+def phrase_keys(phrase):
+    words = phrase.split(' ')
+    return {' '.join(words[i:]) for i in range(min(len(words), MAX_KEY_WORDS))}
+
+
+class CompletionIndex:
+
+    def __init__(self, limit=10):
+        self.limit = limit
+        self.weights = {}
+        # None while the index is being filled; see finish().
+        self.entries = None
+        self.item_phrases = {}
+        self.query_counts = defaultdict(int)
+        self._top = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.weights)
+
+    def _rank(self, phrases):
+        return heapq.nsmallest(self.limit, phrases, key=lambda phrase: (-self.weights[phrase], phrase))
+
+    def _range(self, prefix):
+        lo = bisect.bisect_left(self.entries, (prefix,))
+        hi = bisect.bisect_left(self.entries, (prefix + '\uffff',), lo)
+        return lo, hi
+
+    def _top_for(self, prefix):
+        top = self._top.get(prefix)
+        if top is not None:
+            return top
+        lo, hi = self._range(prefix)
+        top = self._rank({phrase for _, phrase in self.entries[lo:hi]})
+        if hi - lo > SCAN_LIMIT:
+            self._top[prefix] = top
+        return top
+
+    def add(self, phrase, delta):
+        """Change ``phrase``'s weight by ``delta``, dropping it once it reaches zero."""
+        if not phrase or not delta:
+            return
+        with self._lock:
+            previous = self.weights.get(phrase, 0.0)
+            weight = previous + delta
+            if self.entries is None:
+                if weight <= 1e-9:
+                    self.weights.pop(phrase, None)
+                else:
+                    self.weights[phrase] = weight
+                return
+            keys = phrase_keys(phrase)
+            prefixes = {key[:length] for key in keys for length in range(1, len(key) + 1)}
+            if weight <= 1e-9:
+                self.weights.pop(phrase, None)
+                for key in keys:
+                    index = bisect.bisect_left(self.entries, (key, phrase))
+                    if index < len(self.entries) and self.entries[index] == (key, phrase):
+                        del self.entries[index]
+            else:
+                self.weights[phrase] = weight
+                if not previous:
+                    for key in keys:
+                        bisect.insort(self.entries, (key, phrase))
+            for prefix in prefixes & self._top.keys():
+                top = self._top[prefix]
+                if delta < 0:
+                    # The phrase below the cut is unknown; rescan on the next lookup.
+                    if phrase in top:
+                        del self._top[prefix]
+                elif phrase in top or len(top) < self.limit or (-weight, phrase) < (-self.weights[top[-1]], top[-1]):
+                    self._top[prefix] = self._rank(set(top) | {phrase})
+
+    def set_item(self, item_id, title, category, sub_category):
+        """Replace the title and category phrases ``item_id`` contributes."""
+        weights = rec_setting('AUTOCOMPLETE_WEIGHTS')
+        phrases = (normalise(title), normalise(category), normalise(sub_category))
+        with self._lock:
+            previous = self.item_phrases.get(item_id)
+            if previous == phrases:
+                return
+            self.remove_item(item_id)
+            self.item_phrases[item_id] = phrases
+            self.add(phrases[0], weights['title'])
+            for phrase in set(phrases[1:]):
+                self.add(phrase, weights['category'])
+
+    def remove_item(self, item_id):
+        weights = rec_setting('AUTOCOMPLETE_WEIGHTS')
+        with self._lock:
+            phrases = self.item_phrases.pop(item_id, None)
+            if phrases is None:
+                return
+            self.add(phrases[0], -weights['title'])
+            for phrase in set(phrases[1:]):
+                self.add(phrase, -weights['category'])
+
+    def record_query(self, query, count=1):
+        """Count ``count`` searches for ``query``; it is suggested once frequent enough."""
+        query = normalise(query)
+        if not query:
+            return
+        minimum = rec_setting('AUTOCOMPLETE_MIN_QUERY_COUNT')
+        with self._lock:
+            previous = self.query_counts[query]
+            total = self.query_counts[query] = previous + count
+            if total < minimum:
+                return
+            # Searches made before the query qualified count too.
+            counted = total if previous < minimum else count
+            self.add(query, counted * rec_setting('AUTOCOMPLETE_WEIGHTS')['query'])
+
+    def finish(self, max_length=PRECOMPUTED_PREFIX_LENGTH):
+        """
+        Sort the filled index's keys (inserting them one by one is
+        quadratic) and cache the best phrases of every key prefix up to
+        ``max_length`` characters.
+        """
+        with self._lock:
+            self.entries = sorted((key, phrase) for phrase in self.weights for key in phrase_keys(phrase))
+            groups = defaultdict(set)
+            for key, phrase in self.entries:
+                for length in range(1, min(len(key), max_length) + 1):
+                    groups[key[:length]].add(phrase)
+            self._top = {prefix: self._rank(phrases) for prefix, phrases in groups.items()}
+
+    def complete(self, prefix, limit=None):
+        """The best phrases with a word starting with ``prefix``, best first."""
+        trailing_space = bool(prefix) and prefix[-1].isspace()
+        prefix = normalise(prefix)
+        if not prefix:
+            return []
+        if trailing_space:
+            prefix += ' '
+        with self._lock:
+            return list(self._top_for(prefix)[:limit or self.limit])
+
+
+def build_completion_index():
+    from items.models import Item, SearchHistory
+
+    index = CompletionIndex(rec_setting('AUTOCOMPLETE_LIMIT'))
+    items = Item.objects.values_list('id', 'title', 'category', 'sub_category')
+    for item_id, title, category, sub_category in items.iterator(chunk_size=5000):
+        index.set_item(item_id, title, category, sub_category)
+    queries = (
+        SearchHistory.objects.values('search_query')
+        .annotate(searches=Count('id'))
+        .filter(searches__gte=rec_setting('AUTOCOMPLETE_MIN_QUERY_COUNT'))
+        .order_by('-searches')
+        .values_list('search_query', 'searches')[:rec_setting('AUTOCOMPLETE_MAX_QUERIES')]
+    )
+    for query, searches in queries:
+        index.record_query(query, searches)
+    index.finish()
+    return index
+
+
+_index = None
+_index_built_at = 0.0
+_index_lock = threading.Lock()
+_rebuild_thread = None
+# Item updates made while a rebuild reads the database, replayed onto its
+# result. Replaying them is idempotent; query counts are not (the rebuild
+# may already have counted a search), so those are not replayed.
+_pending = []
+
+
+def _rebuild():
+    global _index, _index_built_at
+    try:
+        started = time.perf_counter()
+        index = build_completion_index()
+        with _index_lock:
+            for method, args in _pending:
+                getattr(index, method)(*args)
+            _pending.clear()
+            _index = index
+            _index_built_at = time.monotonic()
+        logger.info(f"Built completion index of {len(index)} phrases in {time.perf_counter() - started:.2f}s.")
+    except Exception as e:
+        logger.error(f"Completion index build failed: {e}")
+    finally:
+        close_old_connections()
+
+
+def schedule_rebuild():
+    """Start a background rebuild in this process unless one is running."""
+    global _rebuild_thread
+    with _index_lock:
+        if _rebuild_thread is not None and _rebuild_thread.is_alive():
+            return False
+        _pending.clear()
+        _rebuild_thread = threading.Thread(target=_rebuild, name='completion-index-build', daemon=True)
+        _rebuild_thread.start()
+        return True
+
+
+def get_completion_index():
+    """
+    Process-wide index, or None until the first build finishes. A missing
+    or stale index is rebuilt in the background while the current one
+    keeps serving.
+    """
+    index = _index
+    if index is None or time.monotonic() - _index_built_at >= rec_setting('AUTOCOMPLETE_REFRESH_SECONDS'):
+        schedule_rebuild()
+    return index
+
+
+def _apply(method, *args, replay=True):
+    with _index_lock:
+        index = _index
+        if replay and _rebuild_thread is not None and _rebuild_thread.is_alive():
+            _pending.append((method, args))
+    if index is not None:
+        getattr(index, method)(*args)
+
+
+def update_item_completions(item_id, title, category, sub_category):
+    """Apply one item's title and categories to this process's index, if built."""
+    _apply('set_item', item_id, title, category, sub_category)
+
+
+def remove_item_completions(item_id):
+    _apply('remove_item', item_id)
+
+
+def record_search_query(query):
+    _apply('record_query', query, replay=False)
@@ -0,0 +1,240 @@
+"""
+Per-item availability bitmaps.
+
+Bit ``d`` of an item's row is set when an approved or pending booking
+covers day ``origin + d``, for the next AVAILABILITY_HORIZON_DAYS days. An
+item counts as unavailable when every day of the coming
+AVAILABILITY_WINDOW_DAYS is booked, so excluding unavailable (and the
+user's own) items is a few vectorised word operations over all rows
+rather than an overlap query per item.
+
+The process-wide bitmaps are built from the Booking table, patched by the
+Booking and Item signals in this process, and rebuilt in a background
+thread when the day rolls over or AVAILABILITY_REFRESH_SECONDS have passed
+(picking up other processes' writes and bulk status updates, e.g. expired
+bookings); the current bitmaps keep serving meanwhile.
+"""
+import datetime
+import logging
+import threading
+import time
+
+import numpy as np
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .conf import rec_setting
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ('approved', 'pending')
+
+
+def day_mask(first, last, words):
+    """``(words,)`` uint64 mask with bits ``first`` to ``last`` (inclusive) set."""
+    mask = np.zeros(words, dtype=np.uint64)
+    for word in range(words):
+        lo, hi = max(first, word * 64), min(last, word * 64 + 63)
+        if lo <= hi:
+            mask[word] = ((1 << (hi - lo + 1)) - 1) << (lo - word * 64)
+    return mask
+
+
+class AvailabilityBitmaps:
+
+    def __init__(self, origin, horizon_days, item_ids, owner_ids):
+        self.origin = origin
+        self.horizon_days = horizon_days
+        self.words = (horizon_days + 63) // 64
+        order = np.argsort(np.asarray(item_ids, dtype=np.int64), kind='stable')
+        self.item_ids = np.asarray(item_ids, dtype=np.int64)[order]
+        self.owner_ids = np.asarray(owner_ids, dtype=np.int64)[order]
+        self.booked = np.zeros((len(self.item_ids), self.words), dtype=np.uint64)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.item_ids)
+
+    def _row(self, item_id):
+        row = int(np.searchsorted(self.item_ids, item_id))
+        if row < len(self.item_ids) and self.item_ids[row] == item_id:
+            return row
+        return None
+
+    def _days(self, start_date, end_date):
+        return (start_date - self.origin).days, (end_date - self.origin).days
+
+    def mark(self, item_id, start_date, end_date):
+        """Set the booked bits of ``[start_date, end_date]`` for ``item_id``."""
+        first, last = self._days(start_date, end_date)
+        if last < 0 or first >= self.horizon_days:
+            return
+        with self._lock:
+            row = self._row(item_id)
+            if row is not None:
+                self.booked[row] |= day_mask(first, min(last, self.horizon_days - 1), self.words)
+
+    def set_item(self, item_id, owner_id, bookings):
+        """Replace ``item_id``'s row (adding it if new) from its ``(start_date, end_date)`` bookings."""
+        with self._lock:
+            row = self._row(item_id)
+            if row is None:
+                row = int(np.searchsorted(self.item_ids, item_id))
+                self.item_ids = np.insert(self.item_ids, row, item_id)
+                self.owner_ids = np.insert(self.owner_ids, row, -1)
+                self.booked = np.insert(self.booked, row, np.zeros(self.words, dtype=np.uint64), axis=0)
+            self.owner_ids[row] = -1 if owner_id is None else owner_id
+            bits = np.zeros(self.words, dtype=np.uint64)
+            for start_date, end_date in bookings:
+                first, last = self._days(start_date, end_date)
+                if last >= 0 and first < self.horizon_days:
+                    bits |= day_mask(first, min(last, self.horizon_days - 1), self.words)
+            self.booked[row] = bits
+
+    def remove_item(self, item_id):
+        with self._lock:
+            row = self._row(item_id)
+            if row is not None:
+                self.item_ids = np.delete(self.item_ids, row)
+                self.owner_ids = np.delete(self.owner_ids, row)
+                self.booked = np.delete(self.booked, row, axis=0)
+
+    def unavailable(self, window_days, today=None):
+        """
+        Boolean row mask of items booked on every one of the ``window_days``
+        days from ``today`` (the origin by default; later while bitmaps
+        built on an earlier day keep serving).
+        """
+        first = 0 if today is None else max((today - self.origin).days, 0)
+        last = min(first + window_days, self.horizon_days) - 1
+        if last < first:
+            return np.zeros(len(self.item_ids), dtype=bool)
+        window = day_mask(first, last, self.words)
+        with self._lock:
+            free = ~self.booked & window
+        return ~free.any(axis=1)
+
+    def excluded(self, user_id, window_days, today=None):
+        """Sorted ids of items that are unavailable or owned by ``user_id``."""
+        unavailable = self.unavailable(window_days, today)
+        with self._lock:
+            return self.item_ids[unavailable | (self.owner_ids == user_id)]
+
+
+def build_availability(origin=None, horizon_days=None):
+    from bookings.models import Booking
+    from items.models import Item
+
+    origin = origin or timezone.localdate()
+    horizon_days = horizon_days or rec_setting('AVAILABILITY_HORIZON_DAYS')
+    items = list(Item.objects.values_list('id', 'rentee_id'))
+    bitmaps = AvailabilityBitmaps(
+        origin, horizon_days,
+        [item_id for item_id, _ in items],
+        [-1 if owner_id is None else owner_id for _, owner_id in items],
+    )
+    bookings = Booking.objects.filter(
+        status__in=ACTIVE_STATUSES,
+        end_date__gte=origin,
+        start_date__lt=origin + datetime.timedelta(days=horizon_days),
+    ).values_list('item_id', 'start_date', 'end_date')
+    for item_id, start_date, end_date in bookings.iterator(chunk_size=5000):
+        bitmaps.mark(item_id, start_date, end_date)
+    return bitmaps
+
+
+_bitmaps = None
+_bitmaps_built_at = 0.0
+_bitmaps_lock = threading.Lock()
+# Serialises the first, blocking build.
+_first_build_lock = threading.Lock()
+_rebuild_thread = None
+# Items refreshed or forgotten while a rebuild reads the database, replayed
+# onto its result.
+_pending = []
+
+
+def _build():
+    global _bitmaps, _bitmaps_built_at
+    started = time.perf_counter()
+    bitmaps = build_availability()
+    with _bitmaps_lock:
+        for item_id in dict.fromkeys(_pending):
+            _refresh_row(bitmaps, item_id)
+        _pending.clear()
+        _bitmaps = bitmaps
+        _bitmaps_built_at = time.monotonic()
+    logger.info(f"Built availability bitmaps for {len(bitmaps)} items in {time.perf_counter() - started:.2f}s.")
+    return bitmaps
+
+
+def _rebuild():
+    try:
+        _build()
+    except Exception as e:
+        logger.error(f"Availability bitmap build failed: {e}")
+    finally:
+        close_old_connections()
+
+
+def schedule_rebuild():
+    """Start a background rebuild in this process unless one is running."""
+    global _rebuild_thread
+    with _bitmaps_lock:
+        if _rebuild_thread is not None and _rebuild_thread.is_alive():
+            return False
+        _pending.clear()
+        _rebuild_thread = threading.Thread(target=_rebuild, name='availability-build', daemon=True)
+        _rebuild_thread.start()
+        return True
+
+
+def get_availability():
+    """
+    Process-wide bitmaps. Only the first call waits for a build; bitmaps
+    from an earlier day or older than AVAILABILITY_REFRESH_SECONDS keep
+    serving while they are rebuilt in the background.
+    """
+    bitmaps = _bitmaps
+    if bitmaps is None:
+        with _first_build_lock:
+            return _bitmaps if _bitmaps is not None else _build()
+    if (bitmaps.origin != timezone.localdate()
+            or time.monotonic() - _bitmaps_built_at >= rec_setting('AVAILABILITY_REFRESH_SECONDS')):
+        schedule_rebuild()
+    return bitmaps
+
+
+def _track(item_id):
+    """This process's bitmaps, queueing ``item_id`` for replay if a rebuild is running."""
+    with _bitmaps_lock:
+        if _rebuild_thread is not None and _rebuild_thread.is_alive():
+            _pending.append(item_id)
+        return _bitmaps
+
+
+def refresh_item(item_id):
+    """Recompute ``item_id``'s row in this process's bitmaps, if built."""
+    bitmaps = _track(item_id)
+    if bitmaps is not None:
+        _refresh_row(bitmaps, item_id)
+
+
+def _refresh_row(bitmaps, item_id):
+    from bookings.models import Booking
+    from items.models import Item
+
+    item = Item.objects.filter(pk=item_id).values_list('rentee_id').first()
+    if item is None:
+        bitmaps.remove_item(item_id)
+        return
+    bookings = Booking.objects.filter(
+        item_id=item_id, status__in=ACTIVE_STATUSES, end_date__gte=bitmaps.origin,
+    ).values_list('start_date', 'end_date')
+    bitmaps.set_item(item_id, item[0], list(bookings))
+
+
+def forget_item(item_id):
+    bitmaps = _track(item_id)
+    if bitmaps is not None:
+        bitmaps.remove_item(item_id)
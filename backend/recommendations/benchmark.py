@@ -0,0 +1,414 @@
+"""
+Offline benchmark and evaluation harness for the recommenders.
+
+Generates a synthetic catalog (topic-clustered item vectors) and an
+interaction log at a configurable scale, holds out each evaluated user's
+most recent item, then runs the same array-level cores the views use
+(ANN retrieval, scoring, user-kNN, item-item, ALS and the hybrid blend) stage by
+stage. Every stage records wall time, per-user latency and peak traced
+memory; the recommenders are scored on recall@k against the held-out items
+and on catalog coverage. The compressed content scan is also compared with
+the same scan at full precision, to show the recall lost to compression.
+
+Nothing here touches the database or the encoder, so results are
+comparable across machines and commits. Run it through the
+``benchmark_recommendations`` management command.
+"""
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+import numpy as np
+import scipy.sparse as sp
+
+from .als import ALSModel
+from .ann import build_index
+from .collaborative import squash_scores, user_knn_scores
+from .compression import Codec
+from .embeddings import normalize_rows
+from .interactions import _dedupe_max
+from .item_similarity import ItemNeighbourTable, user_history
+from .scoring import TopK, align, combine, recency
+
+DAY_SECONDS = 86400
+
+SCALES = {
+    'small': {'users': 2000, 'items': 1000, 'interactions': 50000},
+    'medium': {'users': 50000, 'items': 100000, 'interactions': 1000000},
+    'large': {'users': 500000, 'items': 1000000, 'interactions': 10000000},
+}
+
+
+@dataclass
+class SyntheticData:
+    item_ids: np.ndarray        # int64, 1..n_items
+    item_vectors: np.ndarray    # float32, L2-normalised
+    item_topics: np.ndarray
+    users: np.ndarray           # interaction log, one entry per event
+    items: np.ndarray
+    timestamps: np.ndarray
+    now_ts: float
+
+
+def generate(n_users, n_items, n_interactions, dim=64, n_topics=None, days=180, seed=0):
+    """
+    Users mostly interact with items from one to three preferred topics,
+    with a skew towards each topic's popular items, plus some globally
+    popular picks; items of a topic share a noisy centroid so content
+    similarity and co-interaction agree.
+    """
+    rng = np.random.default_rng(seed)
+    n_topics = n_topics or max(2, int(np.sqrt(n_items) / 2))
+
+    centroids = normalize_rows(rng.standard_normal((n_topics, dim)))
+    item_topics = np.sort(rng.integers(0, n_topics, n_items))
+    item_vectors = np.empty((n_items, dim), dtype=np.float32)
+    for start in range(0, n_items, 65536):
+        stop = min(start + 65536, n_items)
+        noise = rng.standard_normal((stop - start, dim)).astype(np.float32) / np.sqrt(dim)
+        item_vectors[start:stop] = normalize_rows(centroids[item_topics[start:stop]] + noise)
+    topic_offsets = np.searchsorted(item_topics, np.arange(n_topics + 1))
+    topic_sizes = np.diff(topic_offsets)
+
+    user_topics = rng.integers(0, n_topics, (n_users, 3))
+    # Activity follows a long tail: a few users account for most events.
+    users = np.minimum((n_users * rng.random(n_interactions) ** 2).astype(np.int64), n_users - 1)
+    topics = user_topics[users, rng.integers(0, 3, n_interactions)]
+    empty = topic_sizes[topics] == 0
+    topics[empty] = item_topics[0]
+    ranks = (topic_sizes[topics] * rng.random(n_interactions) ** 2).astype(np.int64)
+    items = topic_offsets[topics] + ranks
+    global_pick = rng.random(n_interactions) < 0.2
+    items[global_pick] = (n_items * rng.random(int(global_pick.sum())) ** 3).astype(np.int64)
+
+    now_ts = time.time()
+    timestamps = now_ts - rng.random(n_interactions) * days * DAY_SECONDS
+    return SyntheticData(
+        item_ids=np.arange(1, n_items + 1, dtype=np.int64),
+        item_vectors=item_vectors,
+        item_topics=item_topics,
+        users=users,
+        items=items,
+        timestamps=timestamps,
+        now_ts=now_ts,
+    )
+
+
+def split_holdout(data, n_eval_users, min_items=3, seed=0):
+    """
+    Pick up to ``n_eval_users`` users with at least ``min_items`` distinct
+    items and hold out the item of each one's latest event. Returns
+    ``(eval_rows, heldout_cols, train_mask)`` where ``train_mask`` selects
+    the interaction log without the held-out (user, item) pairs.
+    """
+    rng = np.random.default_rng(seed)
+    rows, cols, _ = _dedupe_max(data.users, data.items, data.timestamps)
+    distinct = np.bincount(rows, minlength=data.users.max() + 1 if len(data.users) else 0)
+    eligible = np.flatnonzero(distinct >= min_items)
+    eval_rows = np.sort(rng.choice(eligible, size=min(n_eval_users, len(eligible)), replace=False))
+
+    order = np.lexsort((data.timestamps, data.users))
+    last_event = order[np.r_[np.flatnonzero(np.diff(data.users[order])), len(order) - 1]] if len(order) else order
+    latest_item = np.full(distinct.shape[0], -1, dtype=np.int64)
+    latest_item[data.users[last_event]] = data.items[last_event]
+    heldout_cols = latest_item[eval_rows]
+
+    is_eval = np.zeros(distinct.shape[0], dtype=bool)
+    is_eval[eval_rows] = True
+    train_mask = ~(is_eval[data.users] & (data.items == latest_item[data.users]))
+    return eval_rows, heldout_cols, train_mask
+
+
+def interaction_matrices(users, items, timestamps, shape):
+    """``(counts, last_seen)`` CSR matrices in the InteractionMatrix layout."""
+    counts = sp.coo_matrix((np.ones(len(users), dtype=np.float32), (users, items)), shape=shape).tocsr()
+    counts.sum_duplicates()
+    rows, cols, seen = _dedupe_max(users, items, timestamps)
+    last_seen = sp.csr_matrix((seen, (rows, cols)), shape=shape)
+    return counts, last_seen
+
+
+@dataclass
+class StageResult:
+    name: str
+    seconds: float = 0.0
+    peak_mb: float = None
+    latencies_ms: list = field(default_factory=list)
+
+    def as_dict(self):
+        row = {'seconds': round(self.seconds, 4), 'peak_mb': None if self.peak_mb is None else round(self.peak_mb, 2)}
+        if self.latencies_ms:
+            row['p50_ms'] = round(float(np.percentile(self.latencies_ms, 50)), 3)
+            row['p95_ms'] = round(float(np.percentile(self.latencies_ms, 95)), 3)
+        return row
+
+
+class Benchmark:
+
+    def __init__(self, data, k=10, n_eval_users=200, backend='ivf', ann_params=None,
+                 candidates=50, neighbours=3, item_neighbours=20, history_length=20,
+                 content_weights=None, als_params=None, codec_params=None, trace_memory=True, seed=0):
+        self.data = data
+        self.k = k
+        self.n_eval_users = n_eval_users
+        self.backend = backend
+        self.ann_params = ann_params or {}
+        self.candidates = candidates
+        self.neighbours = neighbours
+        self.item_neighbours = item_neighbours
+        self.history_length = history_length
+        self.content_weights = content_weights or {'similarity': 0.6, 'recency': 0.4}
+        self.als_params = als_params or {}
+        self.codec_params = codec_params or {'method': 'pca', 'dim': 128, 'dtype': 'int8'}
+        self.trace_memory = trace_memory
+        self.seed = seed
+        self.stages = {}
+        self.recommendations = {}
+
+    @contextmanager
+    def stage(self, name):
+        result = StageResult(name)
+        if self.trace_memory:
+            tracemalloc.start()
+        started = time.perf_counter()
+        try:
+            yield result
+        finally:
+            result.seconds = time.perf_counter() - started
+            if self.trace_memory:
+                result.peak_mb = tracemalloc.get_traced_memory()[1] / 2 ** 20
+                tracemalloc.stop()
+            self.stages[name] = result
+
+    def _per_user(self, result, rows, recommend):
+        recommended = {}
+        for row in rows:
+            started = time.perf_counter()
+            recommended[row] = recommend(row)
+            result.latencies_ms.append((time.perf_counter() - started) * 1000)
+        return recommended
+
+    def run(self):
+        data = self.data
+        n_users, n_items = int(data.users.max()) + 1, len(data.item_ids)
+
+        with self.stage('split'):
+            self.eval_rows, heldout_cols, train_mask = split_holdout(data, self.n_eval_users, seed=self.seed)
+            self.heldout = dict(zip(self.eval_rows.tolist(), data.item_ids[heldout_cols].tolist()))
+
+        with self.stage('interaction_matrix'):
+            counts, last_seen = interaction_matrices(
+                data.users[train_mask], data.items[train_mask], data.timestamps[train_mask], (n_users, n_items)
+            )
+
+        with self.stage('ann_build'):
+            index = build_index(data.item_ids, data.item_vectors, backend=self.backend, **self.ann_params)
+
+        with self.stage('content') as result:
+            self.recommendations['content'] = self._per_user(
+                result, self.eval_rows, lambda row: self._content(index, last_seen, row)
+            )
+
+        with self.stage('compress'):
+            codec = Codec.fit(data.item_vectors, **self.codec_params)
+            records = codec.compress(data.item_vectors)
+
+        with self.stage('content_exact') as result:
+            self.recommendations['content_exact'] = self._per_user(
+                result, self.eval_rows,
+                lambda row: self._content_scan(lambda profile: data.item_vectors @ profile, last_seen, row)
+            )
+
+        with self.stage('content_compressed') as result:
+            self.recommendations['content_compressed'] = self._per_user(
+                result, self.eval_rows,
+                lambda row: self._content_scan(lambda profile: codec.scores(codec.prepare(profile), records),
+                                               last_seen, row)
+            )
+        self.codec = codec
+
+        with self.stage('user_knn') as result:
+            self.recommendations['user_knn'] = self._per_user(
+                result, self.eval_rows, lambda row: self._user_knn(counts, last_seen, row)
+            )
+
+        with self.stage('item_neighbours_build'):
+            table = ItemNeighbourTable.build(counts, data.item_ids, top_n=self.item_neighbours)
+
+        with self.stage('item_item') as result:
+            self.recommendations['item_item'] = self._per_user(
+                result, self.eval_rows, lambda row: self._item_item(table, last_seen, row)
+            )
+
+        with self.stage('als_train'):
+            train_rows = data.users[train_mask]
+            als = ALSModel.train(train_rows, data.item_ids[data.items[train_mask]],
+                                 np.ones(len(train_rows), dtype=np.float32), **self.als_params)
+
+        with self.stage('als') as result:
+            self.recommendations['als'] = self._per_user(result, self.eval_rows, lambda row: self._als(als, row))
+
+        with self.stage('hybrid') as result:
+            self.recommendations['hybrid'] = self._per_user(
+                result, self.eval_rows,
+                lambda row: self._hybrid(self._content(index, last_seen, row), self._user_knn(counts, last_seen, row))
+            )
+        return self.report()
+
+    # -- recommenders --------------------------------------------------------
+    # Each returns ``(item_ids, scores)`` best first, mirroring hybrid.py.
+
+    def _profile(self, history):
+        recent = history.indices[np.argsort(-history.data, kind='stable')[:self.history_length]]
+        return normalize_rows(self.data.item_vectors[recent].mean(axis=0))[0]
+
+    def _content(self, index, last_seen, row):
+        data = self.data
+        history = last_seen[row]
+        if not history.nnz:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        profile = self._profile(history)
+
+        candidate_ids, similarity = index.search(profile, self.candidates)
+        searched_ids = data.item_ids[history.indices]
+        extra = np.setdiff1d(searched_ids, candidate_ids)
+        if len(extra):
+            candidate_ids = np.concatenate([candidate_ids, extra])
+            similarity = np.concatenate([similarity, data.item_vectors[extra - 1] @ profile])
+
+        features = {
+            'similarity': similarity,
+            'recency': recency(align(candidate_ids, searched_ids, history.data, fill=np.nan), data.now_ts),
+        }
+        best = TopK(self.k)
+        best.push(candidate_ids, combine(features, self.content_weights))
+        return best.result()
+
+    def _content_scan(self, similarity, last_seen, row):
+        """Content scoring over the whole catalog, as the 'stream' and 'compressed' scorers do."""
+        data = self.data
+        history = last_seen[row]
+        if not history.nnz:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        features = {
+            'similarity': similarity(self._profile(history)),
+            'recency': recency(align(data.item_ids, data.item_ids[history.indices], history.data, fill=np.nan),
+                               data.now_ts),
+        }
+        best = TopK(self.k)
+        best.push(data.item_ids, combine(features, self.content_weights))
+        return best.result()
+
+    def _user_knn(self, counts, last_seen, row):
+        cols, raw = user_knn_scores(counts, last_seen, row, self.neighbours, self.data.now_ts)
+        best = TopK(self.k)
+        best.push(self.data.item_ids[cols], raw)
+        ids, raw = best.result()
+        return ids, squash_scores(raw)
+
+    def _item_item(self, table, last_seen, row):
+        seen_cols, recent_cols, weights = user_history(last_seen, row, self.data.now_ts, self.history_length)
+        ids, scores = table.score(self.data.item_ids[recent_cols], weights,
+                                  exclude_item_ids=self.data.item_ids[seen_cols], k=self.k)
+        return ids, squash_scores(scores)
+
+    def _als(self, model, row):
+        vector, seen_cols = model.user_vector(row)
+        ids, scores = model.recommend(vector, seen_cols, k=self.k)
+        return ids, squash_scores(scores)
+
+    def _hybrid(self, content, collaborative):
+        """The hybrid blend: missing scores default to 0.4, then a 50/50 mix."""
+        content_scores = dict(zip(content[0].tolist(), content[1].tolist()))
+        collab_scores = dict(zip(collaborative[0].tolist(), collaborative[1].tolist()))
+        if not content_scores or not collab_scores:
+            return content if content_scores else collaborative
+        ids = np.asarray(list(content_scores.keys() | collab_scores.keys()), dtype=np.int64)
+        scores = np.array([0.5 * content_scores.get(i, 0.4) + 0.5 * collab_scores.get(i, 0.4) for i in ids.tolist()])
+        best = TopK(self.k)
+        best.push(ids, scores)
+        return best.result()
+
+    # -- metrics -------------------------------------------------------------
+
+    def recall_at_k(self, name):
+        recommended = self.recommendations[name]
+        hits = sum(self.heldout[row] in set(ids.tolist()) for row, (ids, _) in recommended.items())
+        return hits / len(recommended) if recommended else 0.0
+
+    def overlap(self, name, reference):
+        """Mean fraction of ``reference``'s top-k that ``name`` also returns."""
+        found = self.recommendations[name]
+        expected = self.recommendations[reference]
+        shared = total = 0
+        for row, (ids, _) in expected.items():
+            shared += len(set(ids.tolist()) & set(found[row][0].tolist()))
+            total += len(ids)
+        return shared / total if total else 1.0
+
+    def coverage(self, name):
+        """Fraction of the catalog recommended to at least one evaluated user."""
+        distinct = set()
+        for ids, _ in self.recommendations[name].values():
+            distinct.update(ids.tolist())
+        return len(distinct) / len(self.data.item_ids) if len(self.data.item_ids) else 0.0
+
+    def report(self):
+        data = self.data
+        return {
+            'dataset': {
+                'users': int(data.users.max()) + 1,
+                'items': len(data.item_ids),
+                'interactions': len(data.users),
+                'dim': data.item_vectors.shape[1],
+                'eval_users': len(self.eval_rows),
+            },
+            'params': {
+                'k': self.k,
+                'backend': self.backend,
+                'ann_params': self.ann_params,
+                'candidates': self.candidates,
+                'neighbours': self.neighbours,
+                'item_neighbours': self.item_neighbours,
+                'als': self.als_params,
+                'codec': self.codec_params,
+            },
+            'stages': {name: result.as_dict() for name, result in self.stages.items()},
+            'quality': {
+                name: {'recall_at_k': round(self.recall_at_k(name), 4), 'coverage': round(self.coverage(name), 4)}
+                for name in self.recommendations
+            },
+            'compression': {
+                'bytes_per_vector': self.codec.bytes_per_vector(),
+                'float32_bytes_per_vector': data.item_vectors.shape[1] * 4,
+                'recall_vs_float32': round(self.overlap('content_compressed', 'content_exact'), 4),
+            },
+        }
+
+
+def compare(report, baseline, latency_tolerance=0.2, recall_tolerance=0.01):
+    """
+    Regressions of ``report`` against an earlier ``baseline`` report, as
+    human-readable strings: stages slower by more than ``latency_tolerance``
+    (relative) and recommenders losing more than ``recall_tolerance`` recall.
+    """
+    regressions = []
+    for name, stage in report['stages'].items():
+        before = baseline.get('stages', {}).get(name)
+        if not before:
+            continue
+        for metric in ('p95_ms', 'seconds'):
+            if metric in stage and before.get(metric):
+                if stage[metric] > before[metric] * (1 + latency_tolerance):
+                    regressions.append(f'{name} {metric}: {before[metric]} -> {stage[metric]}')
+                break
+    for name, quality in report['quality'].items():
+        before = baseline.get('quality', {}).get(name)
+        if before and quality['recall_at_k'] < before['recall_at_k'] - recall_tolerance:
+            regressions.append(f'{name} recall@k: {before["recall_at_k"]} -> {quality["recall_at_k"]}')
+    before = baseline.get('compression', {}).get('recall_vs_float32')
+    after = report.get('compression', {}).get('recall_vs_float32')
+    if before is not None and after is not None and after < before - recall_tolerance:
+        regressions.append(f'compressed recall vs float32: {before} -> {after}')
+    return regressions
@@ -0,0 +1,36 @@
+"""
+Per-request candidate restrictions, applied before the recommenders score.
+"""
+import numpy as np
+
+
+class CandidateFilter:
+    """
+    The items one request may recommend: only ``allowed`` ids when it is set
+    (e.g. the nearby stage's output), and never ``excluded`` ones (e.g.
+    unavailable or the user's own listings). Both are kept as sorted
+    int64 arrays.
+    """
+    __slots__ = ('allowed', 'excluded')
+
+    def __init__(self, allowed=None, excluded=None):
+        excluded = np.unique(np.asarray([] if excluded is None else excluded, dtype=np.int64))
+        if allowed is not None:
+            allowed = np.setdiff1d(np.asarray(allowed, dtype=np.int64), excluded)
+            excluded = np.zeros(0, dtype=np.int64)
+        self.allowed = allowed
+        self.excluded = excluded
+
+    @property
+    def empty(self):
+        """True when nothing can be recommended."""
+        return self.allowed is not None and not len(self.allowed)
+
+    def mask(self, ids):
+        """Boolean mask of the ``ids`` that may be recommended."""
+        ids = np.asarray(ids, dtype=np.int64)
+        if self.allowed is not None:
+            return np.isin(ids, self.allowed)
+        if len(self.excluded):
+            return ~np.isin(ids, self.excluded)
+        return np.ones(len(ids), dtype=bool)
@@ -0,0 +1,101 @@
+"""
+Array-level collaborative filtering cores, kept free of the ORM so they can
+be benchmarked on synthetic matrices.
+"""
+import numpy as np
+
+from .scoring import popularity_boost, squash as squash_scores, time_decay
+
+
+def binarize(counts):
+    binary = counts.copy()
+    binary.data = np.ones_like(binary.data)
+    return binary
+
+
+def top_cosine_neighbours(binary, top_n=20, chunk_size=1024):
+    """
+    For every column of the binary matrix, its ``top_n`` most similar other
+    columns by cosine similarity. Returns ``(neighbours, scores)``, both
+    ``(n_columns, top_n)``, best first; columns with fewer positive
+    similarities are padded with ``-1`` and zero.
+    """
+    binary = binary.tocsr().astype(np.float32)
+    n_columns = binary.shape[1]
+    norms = np.sqrt(np.asarray(binary.sum(axis=0)).ravel())
+    norms[norms == 0] = 1.0
+    inverse_norms = (1 / norms).astype(np.float32)
+    columns = binary.T.tocsr()
+
+    neighbours = np.full((n_columns, top_n), -1, dtype=np.int32)
+    scores = np.zeros((n_columns, top_n), dtype=np.float32)
+    for start in range(0, n_columns, chunk_size):
+        stop = min(start + chunk_size, n_columns)
+        co_counts = (columns[start:stop] @ binary).tocsr()
+        for offset in range(stop - start):
+            column = start + offset
+            lo, hi = co_counts.indptr[offset], co_counts.indptr[offset + 1]
+            cols = co_counts.indices[lo:hi]
+            sims = co_counts.data[lo:hi] * inverse_norms[cols] * inverse_norms[column]
+            not_self = cols != column
+            cols, sims = cols[not_self], sims[not_self]
+            if not len(cols):
+                continue
+            if len(cols) > top_n:
+                best = np.argpartition(-sims, top_n - 1)[:top_n]
+                cols, sims = cols[best], sims[best]
+            order = np.argsort(-sims, kind='stable')
+            neighbours[column, :len(order)] = cols[order]
+            scores[column, :len(order)] = sims[order]
+    return neighbours, scores
+
+
+def user_knn_scores(counts, last_seen, user_row, n_neighbours, now_ts, popularity_weight=0.1):
+    """
+    Score the items a user's nearest neighbours interacted with.
+
+    Neighbours are the ``n_neighbours`` rows with the highest cosine
+    similarity to ``user_row`` on the binarised matrix. Returns
+    ``(item_cols, raw_scores)`` for items the user has not interacted with.
+    """
+    empty = np.zeros(0, dtype=np.int64), np.zeros(0)
+    n_users, n_items = counts.shape
+    n_neighbours = min(n_neighbours, n_users - 1)
+    if n_neighbours < 1:
+        return empty
+
+    binary = binarize(counts)
+    row_norms = np.sqrt(np.asarray(binary.sum(axis=1)).ravel())
+    row_norms[row_norms == 0] = 1.0
+    user_vector = binary[user_row]
+    similarities = np.asarray((binary @ user_vector.T).todense()).ravel() / (row_norms * row_norms[user_row])
+    similarities[user_row] = -np.inf
+
+    neighbour_rows = np.argpartition(-similarities, n_neighbours - 1)[:n_neighbours]
+    return neighbour_item_scores(counts, last_seen, neighbour_rows, similarities[neighbour_rows],
+                                 user_vector.indices, now_ts, popularity_weight)
+
+
+def neighbour_item_scores(counts, last_seen, neighbour_rows, neighbour_sims, seen_cols, now_ts,
+                          popularity_weight=0.1):
+    """
+    Sum ``similarity * time_decay * count`` over the neighbours' items,
+    skipping ``seen_cols``, then apply the log popularity boost.
+    """
+    n_items = counts.shape[1]
+    neighbour_counts = counts[neighbour_rows]
+    neighbour_seen = last_seen[neighbour_rows].tocoo()
+    candidate_cols = np.setdiff1d(neighbour_seen.col, seen_cols)
+    if not len(candidate_cols):
+        return np.zeros(0, dtype=np.int64), np.zeros(0)
+
+    keep = np.isin(neighbour_seen.col, candidate_cols)
+    rows, cols = neighbour_seen.row[keep], neighbour_seen.col[keep]
+    pair_counts = np.asarray(neighbour_counts[rows, cols]).ravel()
+
+    contributions = np.asarray(neighbour_sims)[rows] * time_decay(neighbour_seen.data[keep], now_ts) * pair_counts
+    item_scores = np.bincount(cols, weights=contributions, minlength=n_items)[candidate_cols]
+    interaction_count = np.bincount(cols, weights=pair_counts, minlength=n_items)[candidate_cols]
+    item_scores *= popularity_boost(interaction_count, popularity_weight)
+    return candidate_cols, item_scores
+
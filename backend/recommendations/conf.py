@@ -0,0 +1,119 @@
+from django.conf import settings
+
+DEFAULTS = {
+    # Directory holding the memory-mapped vector stores and model artefacts.
+    'STORE_DIR': None,
+    # Items encoded per batch when (re)building the item embedding store.
+    'EMBEDDING_BATCH_SIZE': 64,
+    # Nearest-neighbour backend for item retrieval: 'exact', 'ivf' or 'hnsw',
+    # and the keyword arguments passed to each backend (nprobe for ivf, ef
+    # for hnsw), keyed by backend name.
+    'ANN_BACKEND': 'ivf',
+    'ANN_PARAMS': {'exact': {}, 'ivf': {'nprobe': 8}, 'hnsw': {'ef': 64}},
+    # How content-based candidates are found: 'ann' re-scores the
+    # CONTENT_CANDIDATES nearest items from the index, 'stream' scores the
+    # whole store exactly, SCORING_CHUNK_SIZE rows at a time, and
+    # 'compressed' scans the whole catalog on compressed vectors.
+    'CONTENT_SCORER': 'ann',
+    'CONTENT_CANDIDATES': 50,
+    'SCORING_CHUNK_SIZE': 8192,
+    # Compressed vectors (see compression.py): a 'pca' or 'random'
+    # projection to EMBEDDING_CODEC_DIM dimensions, stored as 'int8' with a
+    # per-vector scale or as 'float16'.
+    'EMBEDDING_CODEC': 'pca',
+    'EMBEDDING_CODEC_DIM': 128,
+    'EMBEDDING_CODEC_DTYPE': 'int8',
+    # Weights of the content-based features (see scoring.py), and the
+    # window over which a past search's recency bonus fades to zero.
+    'CONTENT_WEIGHTS': {'similarity': 0.6, 'recency': 0.4},
+    'RECENCY_DAYS': 30,
+    # Delta-log rows replayed before they are folded into the interaction
+    # matrix snapshot.
+    'INTERACTION_COMPACT_THRESHOLD': 5000,
+    # New interactions are buffered and merged into the CSR matrices once
+    # this many are waiting, or when a read finds the oldest this old.
+    'INTERACTION_MERGE_EVENTS': 1000,
+    'INTERACTION_MERGE_SECONDS': 30,
+    # Similar users consulted by user-kNN collaborative filtering.
+    'COLLABORATIVE_NEIGHBOURS': 3,
+    # Persisted user-kNN model (see user_neighbours.py): neighbours kept per
+    # user (at least COLLABORATIVE_NEIGHBOURS), and the model age or count
+    # of new interactions that triggers a background refit.
+    'USER_NEIGHBOURS': 20,
+    'USER_KNN_REFIT_SECONDS': 3600,
+    'USER_KNN_REFIT_INTERACTIONS': 1000,
+    # Strength of the log(interactions) popularity boost on collaborative scores.
+    'COLLABORATIVE_POPULARITY_WEIGHT': 0.1,
+    # Collaborative engine blended into hybrid results: 'user_knn',
+    # 'item_item' (needs the build_item_neighbours job) or 'als' (needs the
+    # train_als job).
+    'COLLABORATIVE_ENGINE': 'user_knn',
+    # Neighbours kept per item in the item-item table, and how many of a
+    # user's most recent items are merged when serving from it.
+    'ITEM_NEIGHBOURS': 20,
+    'ITEM_HISTORY_LENGTH': 20,
+    # How much each kind of interaction event counts, for ALS confidence and
+    # user profile vectors. A review's weight is scaled by its rating / 5.
+    # Stored on each event when it is written; backfill_interaction_events
+    # --rebuild reweights the log.
+    'EVENT_WEIGHTS': {'search': 1.0, 'save': 3.0, 'booking': 5.0, 'review': 4.0},
+    # User profile vectors: the half-life of an event's influence, and the
+    # weight (in events) of the interests embedding a profile starts from.
+    'PROFILE_HALF_LIFE_DAYS': 30,
+    'PROFILE_INTEREST_WEIGHT': 2.0,
+    # Implicit ALS: latent factors, training sweeps, L2 regularisation and
+    # confidence scaling.
+    'ALS_FACTORS': 32,
+    'ALS_ITERATIONS': 15,
+    'ALS_REGULARIZATION': 0.05,
+    'ALS_ALPHA': 10.0,
+    # Item grid index (see geo.py): cell size, and how often each process
+    # rebuilds it to see items saved by other processes.
+    'GEO_CELL_KM': 5.0,
+    'GEO_INDEX_REFRESH_SECONDS': 300,
+    # Default search radius of the nearby stage and item query, and the
+    # largest radius a request may ask for.
+    'NEARBY_RADIUS_KM': 25.0,
+    'NEARBY_MAX_RADIUS_KM': 200.0,
+    # Availability bitmaps (see availability.py): days of bookings tracked,
+    # the coming days an item must have at least one free day in to be
+    # recommended (at most the horizon), and how often each process
+    # rebuilds the bitmaps to see other processes' bookings.
+    'AVAILABILITY_HORIZON_DAYS': 56,
+    'AVAILABILITY_WINDOW_DAYS': 14,
+    'AVAILABILITY_REFRESH_SECONDS': 300,
+    # Search box completions (see autocomplete.py): weight per item title,
+    # per item in a category or sub-category and per search of a query;
+    # searches before a query is suggested and how many queries are loaded;
+    # suggestions returned; and how often the index is rebuilt.
+    'AUTOCOMPLETE_WEIGHTS': {'title': 1.0, 'category': 0.25, 'query': 2.0},
+    'AUTOCOMPLETE_MIN_QUERY_COUNT': 2,
+    'AUTOCOMPLETE_MAX_QUERIES': 20000,
+    'AUTOCOMPLETE_LIMIT': 10,
+    'AUTOCOMPLETE_REFRESH_SECONDS': 900,
+    # Semantic item search (see semantic.py): the deepest result it
+    # serves, the keyword rank's share of a blended score, query embeddings
+    # cached per process, and the time budget after which it stops
+    # waiting for the encoder (serving keyword results) or skips blending.
+    'SEMANTIC_CANDIDATES': 200,
+    'SEMANTIC_KEYWORD_WEIGHT': 0.3,
+    'SEMANTIC_QUERY_CACHE_SIZE': 4096,
+    'SEMANTIC_BUDGET_MS': 250,
+    # Trace each recommender stage's peak allocation with tracemalloc.
+    # Slows Python-heavy stages down noticeably; meant for profiling runs.
+    'INSTRUMENT_MEMORY': False,
+    # 'stale_while_revalidate' serves the cached recommendation at once and
+    # refreshes it in the background; 'sync' recomputes inline when stale.
+    'SERVE_MODE': 'stale_while_revalidate',
+    # Background refresh threads, and refreshes allowed to queue at once.
+    'REFRESH_WORKERS': 2,
+    'REFRESH_QUEUE_SIZE': 100,
+}
+
+
+def rec_setting(name):
+    """Return a recommendation setting, falling back to DEFAULTS."""
+    value = getattr(settings, 'RECOMMENDATIONS', {}).get(name, DEFAULTS[name])
+    if name == 'STORE_DIR' and value is None:
+        value = str(settings.BASE_DIR / 'recommendation_store')
+    return value
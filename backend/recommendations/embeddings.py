@@ -0,0 +1,427 @@
+"""
+Persistent item embedding store.
+
+Vectors live in a raw float32 file that is memory-mapped on load, one row per
+item, with a JSON snapshot mapping item ids to rows. Writes append a line
+to a delta log instead of rewriting the snapshot; every process replays the
+log on refresh, and it is folded into the snapshot once it lists
+JOURNAL_LENGTH ids or the matrix file grows. Rows are L2-normalised on
+write so cosine similarity is a plain dot product.
+"""
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+
+from utils.model_registry import registry
+
+from .conf import rec_setting
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+INITIAL_CAPACITY = 1024
+# Recent (version, id) writes kept so readers can sync incrementally; also
+# how many ids the delta log holds before it is compacted.
+JOURNAL_LENGTH = 10000
+
+
+def item_text(title, category, description):
+    """Text that represents an item for the encoder."""
+    return f"{title or ''} {category or ''} {description or ''}".strip()
+
+
+def normalize_rows(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors.reshape(1, -1)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class VectorStore:
+    """
+    Memory-mapped id -> vector store.
+
+    Writes update only the affected rows. Deleting an id moves the last row
+    into the freed slot so the live rows stay contiguous in ``[0, count)``.
+    """
+
+    def __init__(self, directory, name, dim=None):
+        self.directory = directory
+        self.name = name
+        self.matrix_path = os.path.join(directory, f'{name}.f32')
+        self.index_path = os.path.join(directory, f'{name}.json')
+        self.delta_path = os.path.join(directory, f'{name}.delta')
+        self.lock_path = os.path.join(directory, f'{name}.lock')
+        self.dim = dim
+        self.capacity = 0
+        self.ids = []
+        self.id_to_row = {}
+        self.version = 0
+        self.journal = []
+        self.journal_start = 0
+        self.matrix = None
+        self._index_stamp = None
+        self._delta_offset = 0
+        self._delta_ids = 0
+        self._lock = threading.RLock()
+        self.load()
+
+    # -- persistence -------------------------------------------------------
+
+    def load(self):
+        with self._lock:
+            if not os.path.exists(self.index_path):
+                return
+            with open(self.index_path) as fh:
+                meta = json.load(fh)
+            self.dim = meta['dim']
+            self.capacity = meta['capacity']
+            self.ids = meta['ids']
+            self.version = meta.get('version', 0)
+            self.journal = meta.get('journal', [])
+            self.journal_start = meta.get('journal_start', self.version)
+            self.id_to_row = {item_id: row for row, item_id in enumerate(self.ids)}
+            self.matrix = np.memmap(self.matrix_path, dtype=np.float32, mode='r+',
+                                    shape=(self.capacity, self.dim))
+            self._index_stamp = file_stamp(self.index_path)
+            self._delta_offset = 0
+            self._delta_ids = 0
+            self._replay_delta()
+
+    def refresh(self):
+        """Pick up writes and compactions made by other processes since we loaded."""
+        with self._lock:
+            if not os.path.exists(self.index_path):
+                return False
+            if file_stamp(self.index_path) != self._index_stamp:
+                self.load()
+                return True
+            return self._replay_delta()
+
+    def _replay_delta(self):
+        """Apply delta lines appended since the last read. Returns whether any were new."""
+        if not os.path.exists(self.delta_path):
+            return False
+        size = os.path.getsize(self.delta_path)
+        if size < self._delta_offset:
+            # Truncated by a compaction we have not seen the snapshot of yet.
+            self.load()
+            return True
+        if size == self._delta_offset:
+            return False
+        with open(self.delta_path) as fh:
+            fh.seek(self._delta_offset)
+            chunk = fh.read()
+        complete, _, _ = chunk.rpartition('\n')
+        if not complete:
+            return False
+        self._delta_offset += len(complete) + 1
+        changed = False
+        for line in complete.split('\n'):
+            version, op, *ids = line.split(',')
+            version, ids = int(version), [int(item_id) for item_id in ids]
+            self._delta_ids += len(ids)
+            # Lines a snapshot already covers, left by an unfinished compaction.
+            if version <= self.version:
+                continue
+            if op == '+':
+                self._add_ids(ids)
+            else:
+                # The writer already moved the rows in the shared matrix file.
+                self._remove_ids(ids, move_rows=False)
+            self.version = version
+            self._record(ids)
+            changed = True
+        return changed
+
+    def _record(self, changed_ids):
+        self.journal.extend([self.version, item_id] for item_id in changed_ids)
+        if len(self.journal) > JOURNAL_LENGTH:
+            # Readers at the last dropped entry's version have seen all of
+            # it; the cut may split a version, so nothing earlier is covered.
+            self.journal_start = self.journal[-JOURNAL_LENGTH - 1][0]
+            self.journal = self.journal[-JOURNAL_LENGTH:]
+
+    def _commit(self, op, changed_ids, snapshot=False):
+        """
+        Publish a write as a new version: one appended delta line, or a new
+        snapshot when ``snapshot`` is set or the delta log is long enough.
+        """
+        self.version += 1
+        self._record(changed_ids)
+        if self.matrix is not None:
+            self.matrix.flush()
+        if snapshot or self._delta_ids + len(changed_ids) > JOURNAL_LENGTH:
+            self._save()
+            return
+        with open(self.delta_path, 'a') as fh:
+            fh.write(f"{self.version},{op},{','.join(str(item_id) for item_id in changed_ids)}\n")
+        self._delta_offset = os.path.getsize(self.delta_path)
+        self._delta_ids += len(changed_ids)
+
+    def _save(self):
+        """Write the full snapshot and clear the delta log it now covers."""
+        tmp_path = f'{self.index_path}.tmp'
+        with open(tmp_path, 'w') as fh:
+            json.dump({
+                'dim': self.dim,
+                'capacity': self.capacity,
+                'ids': self.ids,
+                'version': self.version,
+                'journal': self.journal,
+                'journal_start': self.journal_start,
+            }, fh)
+        os.replace(tmp_path, self.index_path)
+        open(self.delta_path, 'w').close()
+        self._delta_offset = 0
+        self._delta_ids = 0
+        self._index_stamp = file_stamp(self.index_path)
+
+    def _file_lock(self):
+        return FileLock(self.lock_path)
+
+    def _ensure_capacity(self, needed):
+        if self.matrix is not None and needed <= self.capacity:
+            return
+        new_capacity = max(INITIAL_CAPACITY, self.capacity or 0)
+        while new_capacity < needed:
+            new_capacity *= 2
+
+        count = len(self.ids)
+        old_rows = np.array(self.matrix[:count]) if self.matrix is not None else None
+        self.matrix = None
+        tmp_path = f'{self.matrix_path}.tmp'
+        grown = np.memmap(tmp_path, dtype=np.float32, mode='w+', shape=(new_capacity, self.dim))
+        if old_rows is not None and count:
+            grown[:count] = old_rows
+        grown.flush()
+        del grown
+        os.replace(tmp_path, self.matrix_path)
+        self.capacity = new_capacity
+        self.matrix = np.memmap(self.matrix_path, dtype=np.float32, mode='r+',
+                                shape=(self.capacity, self.dim))
+
+    # -- reads ---------------------------------------------------------------
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, item_id):
+        return item_id in self.id_to_row
+
+    def vectors(self):
+        """View of all live rows, aligned with ``self.ids``."""
+        if self.matrix is None:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+        return self.matrix[:len(self.ids)]
+
+    def get(self, ids):
+        """Return ``(found_ids, vectors)`` for the ids present in the store."""
+        found = [item_id for item_id in ids if item_id in self.id_to_row]
+        if not found:
+            return [], np.zeros((0, self.dim or 0), dtype=np.float32)
+        rows = [self.id_to_row[item_id] for item_id in found]
+        return found, np.asarray(self.matrix[rows])
+
+    def missing(self, ids):
+        return [item_id for item_id in ids if item_id not in self.id_to_row]
+
+    def changes_since(self, version):
+        """
+        Ids written or removed after ``version``, or None when the journal no
+        longer reaches back that far and the caller has to reload everything.
+        """
+        if version < self.journal_start:
+            return None
+        return {item_id for entry_version, item_id in self.journal if entry_version > version}
+
+    # -- writes --------------------------------------------------------------
+
+    def upsert(self, ids, vectors):
+        ids = [int(item_id) for item_id in ids]
+        if not ids:
+            return
+        vectors = normalize_rows(vectors)
+        with self._lock, self._file_lock():
+            self.refresh()
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            if vectors.shape[1] != self.dim:
+                raise ValueError(f"Expected {self.dim}-d vectors for {self.name}, got {vectors.shape[1]}-d.")
+
+            changed_ids = list(dict.fromkeys(ids))
+            capacity = self.capacity
+            self._ensure_capacity(len(self.ids) + len(self.missing(changed_ids)))
+            self._add_ids(changed_ids)
+
+            for item_id, vector in zip(ids, vectors):
+                self.matrix[self.id_to_row[item_id]] = vector
+            # A grown matrix file has a new shape, which only the snapshot records.
+            self._commit('+', changed_ids, snapshot=self.capacity != capacity)
+
+    def remove(self, ids):
+        with self._lock, self._file_lock():
+            self.refresh()
+            removed = self._remove_ids(dict.fromkeys(int(item_id) for item_id in ids))
+            if removed:
+                self._commit('-', removed)
+
+    def clear(self):
+        with self._lock, self._file_lock():
+            self.ids = []
+            self.id_to_row = {}
+            self.journal = []
+            self.journal_start = self.version + 1
+            if self.matrix is not None:
+                self.version += 1
+                self._save()
+
+    def _add_ids(self, ids):
+        for item_id in ids:
+            if item_id not in self.id_to_row:
+                self.id_to_row[item_id] = len(self.ids)
+                self.ids.append(item_id)
+
+    def _remove_ids(self, ids, move_rows=True):
+        """Drop ``ids``, moving the last row into each freed slot. Returns the ids that were present."""
+        removed = []
+        for item_id in ids:
+            row = self.id_to_row.pop(item_id, None)
+            if row is None:
+                continue
+            last_row = len(self.ids) - 1
+            if row != last_row:
+                moved_id = self.ids[last_row]
+                if move_rows:
+                    self.matrix[row] = self.matrix[last_row]
+                self.ids[row] = moved_id
+                self.id_to_row[moved_id] = row
+            self.ids.pop()
+            removed.append(item_id)
+        return removed
+
+
+def file_stamp(path):
+    stat = os.stat(path)
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+class FileLock:
+    """
+    Advisory cross-process lock; a no-op where fcntl is unavailable. With
+    ``blocking=False`` it does not wait: ``acquired`` tells whether it was taken.
+    """
+
+    def __init__(self, path, blocking=True):
+        self.path = path
+        self.blocking = blocking
+        self.acquired = False
+        self.fh = None
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        if fcntl is not None:
+            self.fh = open(self.path, 'a')
+            try:
+                fcntl.flock(self.fh, fcntl.LOCK_EX if self.blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                self.fh.close()
+                self.fh = None
+                return self
+        self.acquired = True
+        return self
+
+    def __exit__(self, *exc):
+        if self.fh is not None:
+            fcntl.flock(self.fh, fcntl.LOCK_UN)
+            self.fh.close()
+            self.fh = None
+
+
+_item_store = None
+_item_store_lock = threading.Lock()
+
+
+def get_item_store():
+    """Process-wide item embedding store, picking up writes from other processes."""
+    global _item_store
+    with _item_store_lock:
+        if _item_store is None:
+            _item_store = VectorStore(rec_setting('STORE_DIR'), 'item_embeddings')
+        else:
+            _item_store.refresh()
+        return _item_store
+
+
+def get_encoder():
+    """The shared recommendation encoder, or None if it cannot be loaded."""
+    return registry.get_or_none('recommendation_encoder')
+
+
+def encode_texts(texts, model=None):
+    model = model or get_encoder()
+    if model is None:
+        return None
+    return model.encode(list(texts), batch_size=rec_setting('EMBEDDING_BATCH_SIZE'), show_progress_bar=False)
+
+
+def embed_items(items, store=None, model=None):
+    """
+    Encode ``items`` (dicts with id/title/category/description) into the store.
+    Returns the number of rows written, or 0 when no encoder is available.
+    """
+    items = list(items)
+    if not items:
+        return 0
+    if store is None:
+        store = get_item_store()
+    batch_size = rec_setting('EMBEDDING_BATCH_SIZE')
+    written = 0
+    for start in range(0, len(items), batch_size):
+        batch = items[start:start + batch_size]
+        texts = [item_text(i['title'], i['category'], i['description']) for i in batch]
+        vectors = encode_texts(texts, model=model)
+        if vectors is None:
+            logger.warning("No sentence encoder available; item embeddings not updated.")
+            return written
+        store.upsert([i['id'] for i in batch], vectors)
+        written += len(batch)
+    return written
+
+
+def sync_item_embeddings(item_ids=None, rebuild=False, store=None, model=None):
+    """
+    Bring the store in line with the Item table: encode items that are
+    missing (or all of them when ``rebuild``) and drop rows for deleted items.
+    """
+    from items.models import Item
+
+    if store is None:
+        store = get_item_store()
+    if rebuild:
+        store.clear()
+
+    queryset = Item.objects.all()
+    if item_ids is not None:
+        queryset = queryset.filter(id__in=item_ids)
+    live_ids = list(queryset.values_list('id', flat=True))
+
+    if item_ids is None:
+        stale = set(store.ids) - set(live_ids)
+        if stale:
+            store.remove(stale)
+
+    missing = store.missing(live_ids)
+    if not missing:
+        return 0
+    items = Item.objects.filter(id__in=missing).values('id', 'title', 'category', 'description')
+    return embed_items(items, store=store, model=model)
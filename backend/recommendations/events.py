@@ -0,0 +1,87 @@
+"""
+Writers for the interaction event log (``InteractionEvent``).
+
+Signals turn every new item search, save, booking and review into one
+event as it happens; ``backfill`` bulk-writes events for rows that predate
+the log (or were written while the signals were not connected).
+"""
+from .conf import rec_setting
+from .models import InteractionEvent
+
+KIND_NAMES = dict(InteractionEvent.KIND_CHOICES)
+
+# Field of each source model holding the time of the interaction.
+TIME_FIELDS = {
+    InteractionEvent.SEARCH: 'timestamp',
+    InteractionEvent.SAVE: 'saved_at',
+    InteractionEvent.BOOKING: 'created_at',
+    InteractionEvent.REVIEW: 'created_at',
+}
+
+
+def event_weight(kind, rating=None):
+    """EVENT_WEIGHTS for ``kind``; reviews are scaled by ``rating`` / 5."""
+    weight = rec_setting('EVENT_WEIGHTS')[KIND_NAMES[kind]]
+    if kind == InteractionEvent.REVIEW and rating is not None:
+        weight *= rating / 5
+    return weight
+
+
+def event_for(kind, source):
+    """Unsaved event for a SearchHistory, SavedItem, Booking or Review row."""
+    return InteractionEvent(
+        user_id=source.user_id,
+        item_id=source.item_id,
+        kind=kind,
+        weight=event_weight(kind, getattr(source, 'rating', None)),
+        timestamp=getattr(source, TIME_FIELDS[kind]),
+        source_id=source.pk,
+    )
+
+
+def _sources():
+    from bookings.models import Booking
+    from items.models import SavedItem, SearchHistory
+    from reviews.models import Review
+
+    return {
+        InteractionEvent.SEARCH: SearchHistory.objects.filter(item__isnull=False),
+        InteractionEvent.SAVE: SavedItem.objects.all(),
+        InteractionEvent.BOOKING: Booking.objects.all(),
+        InteractionEvent.REVIEW: Review.objects.all(),
+    }
+
+
+def backfill(kinds=None, batch_size=5000):
+    """
+    Write an event for every source row of ``kinds`` (default: all). Rows
+    that already have one are skipped by the unique (kind, source_id)
+    constraint, so this is safe to rerun. Returns rows read per kind name.
+    """
+    read = {}
+    for kind, queryset in _sources().items():
+        if kinds and kind not in kinds:
+            continue
+        fields = ['pk', 'user_id', 'item_id', TIME_FIELDS[kind]]
+        if kind == InteractionEvent.REVIEW:
+            fields.append('rating')
+        batch = []
+        count = 0
+        for row in queryset.order_by('pk').values_list(*fields).iterator(chunk_size=batch_size):
+            batch.append(InteractionEvent(
+                user_id=row[1],
+                item_id=row[2],
+                kind=kind,
+                weight=event_weight(kind, row[4] if len(row) > 4 else None),
+                timestamp=row[3],
+                source_id=row[0],
+            ))
+            if len(batch) >= batch_size:
+                InteractionEvent.objects.bulk_create(batch, ignore_conflicts=True)
+                count += len(batch)
+                batch = []
+        if batch:
+            InteractionEvent.objects.bulk_create(batch, ignore_conflicts=True)
+            count += len(batch)
+        read[KIND_NAMES[kind]] = count
+    return read
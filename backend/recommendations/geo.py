@@ -0,0 +1,211 @@
+"""
+Uniform-grid spatial index over item coordinates.
+
+Items are bucketed into cells GEO_CELL_KM high (and as many degrees wide),
+so a radius query only visits the cells overlapping the circle's bounding
+box and measures exact great-circle distances for the items in them. The
+process-wide index is built from the Item table on first use, kept current
+by the Item signals in this process and rebuilt in a background thread
+every GEO_INDEX_REFRESH_SECONDS to pick up other processes' writes, the
+old grid serving meanwhile. Queries do not wrap around the antimeridian.
+"""
+import logging
+import math
+import threading
+import time
+
+import numpy as np
+from django.db import close_old_connections
+
+from .conf import rec_setting
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def haversine_km(latitude, longitude, latitudes, longitudes):
+    """Great-circle distances in km from one point to arrays of points."""
+    lat1, lng1 = math.radians(latitude), math.radians(longitude)
+    lat2, lng2 = np.radians(latitudes), np.radians(longitudes)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def parse_near(query_params):
+    """
+    ``(latitude, longitude, radius_km)`` from ``lat``, ``lng`` and optional
+    ``radius_km`` query parameters, or None without ``lat``/``lng``. Raises
+    ValueError for malformed or out-of-range values.
+    """
+    if 'lat' not in query_params and 'lng' not in query_params:
+        return None
+    if 'lat' not in query_params or 'lng' not in query_params:
+        raise ValueError('lat and lng must be given together')
+    latitude, longitude = float(query_params['lat']), float(query_params['lng'])
+    radius_km = float(query_params.get('radius_km', rec_setting('NEARBY_RADIUS_KM')))
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValueError('lat/lng out of range')
+    if not (0 < radius_km <= rec_setting('NEARBY_MAX_RADIUS_KM')):
+        raise ValueError(f"radius_km must be between 0 and {rec_setting('NEARBY_MAX_RADIUS_KM')}")
+    return latitude, longitude, radius_km
+
+
+class GridIndex:
+
+    def __init__(self, cell_km=5.0):
+        self.cell_km = cell_km
+        self.cell_degrees = cell_km / KM_PER_DEGREE
+        self.cells = {}
+        self.positions = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.positions)
+
+    def _cell(self, latitude, longitude):
+        return math.floor(latitude / self.cell_degrees), math.floor(longitude / self.cell_degrees)
+
+    def add(self, item_id, latitude, longitude):
+        with self._lock:
+            self.remove(item_id)
+            cell = self._cell(latitude, longitude)
+            self.cells.setdefault(cell, []).append(item_id)
+            self.positions[item_id] = (latitude, longitude, cell)
+
+    def remove(self, item_id):
+        with self._lock:
+            position = self.positions.pop(item_id, None)
+            if position is None:
+                return
+            members = self.cells[position[2]]
+            members.remove(item_id)
+            if not members:
+                del self.cells[position[2]]
+
+    def _cells_around(self, latitude, longitude, radius_km):
+        lat_span = radius_km / KM_PER_DEGREE
+        # Longitude degrees shrink with latitude; widen to the circle's
+        # widest parallel, and take whole rings near the poles.
+        widest = min(90.0, abs(latitude) + lat_span)
+        cos_widest = math.cos(math.radians(widest))
+        lng_span = 180.0 if cos_widest < 1e-6 else min(180.0, lat_span / cos_widest)
+        lo_row, lo_col = self._cell(latitude - lat_span, longitude - lng_span)
+        hi_row, hi_col = self._cell(latitude + lat_span, longitude + lng_span)
+        if (hi_row - lo_row + 1) * (hi_col - lo_col + 1) > len(self.cells):
+            # Cheaper to walk the occupied cells than the bounding box.
+            return [cell for cell in self.cells if lo_row <= cell[0] <= hi_row and lo_col <= cell[1] <= hi_col]
+        return [(row, col) for row in range(lo_row, hi_row + 1) for col in range(lo_col, hi_col + 1)]
+
+    def within(self, latitude, longitude, radius_km):
+        """``(item_ids, distances_km)`` of items within ``radius_km``, nearest first."""
+        with self._lock:
+            ids = [item_id for cell in self._cells_around(latitude, longitude, radius_km)
+                   for item_id in self.cells.get(cell, ())]
+            points = np.array([self.positions[item_id][:2] for item_id in ids])
+        if not ids:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        distances = haversine_km(latitude, longitude, points[:, 0], points[:, 1])
+        keep = distances <= radius_km
+        ids, distances = np.asarray(ids, dtype=np.int64)[keep], distances[keep]
+        order = np.argsort(distances, kind='stable')
+        return ids[order], distances[order]
+
+    def nearest(self, latitude, longitude, k, max_radius_km):
+        """The ``k`` nearest items within ``max_radius_km``, growing the search radius as needed."""
+        radius = self.cell_km
+        while True:
+            radius = min(radius, max_radius_km)
+            ids, distances = self.within(latitude, longitude, radius)
+            if len(ids) >= k or radius >= max_radius_km:
+                return ids[:k], distances[:k]
+            radius *= 2
+
+
+def build_item_grid():
+    from items.models import Item
+
+    grid = GridIndex(rec_setting('GEO_CELL_KM'))
+    rows = Item.objects.filter(latitude__isnull=False, longitude__isnull=False).values_list('id', 'latitude', 'longitude')
+    for item_id, latitude, longitude in rows.iterator(chunk_size=5000):
+        grid.add(item_id, latitude, longitude)
+    return grid
+
+
+_grid = None
+_grid_built_at = 0.0
+_grid_lock = threading.Lock()
+# Serialises the first, blocking build.
+_first_build_lock = threading.Lock()
+_rebuild_thread = None
+# Location updates made while a rebuild reads the database, replayed onto
+# its result.
+_pending = []
+
+
+def _build():
+    global _grid, _grid_built_at
+    started = time.perf_counter()
+    grid = build_item_grid()
+    with _grid_lock:
+        for item_id, latitude, longitude in _pending:
+            _move(grid, item_id, latitude, longitude)
+        _pending.clear()
+        _grid = grid
+        _grid_built_at = time.monotonic()
+    logger.info(f"Built item grid for {len(grid)} items in {time.perf_counter() - started:.2f}s.")
+    return grid
+
+
+def _rebuild():
+    try:
+        _build()
+    except Exception as e:
+        logger.error(f"Item grid build failed: {e}")
+    finally:
+        close_old_connections()
+
+
+def schedule_rebuild():
+    """Start a background rebuild in this process unless one is running."""
+    global _rebuild_thread
+    with _grid_lock:
+        if _rebuild_thread is not None and _rebuild_thread.is_alive():
+            return False
+        _pending.clear()
+        _rebuild_thread = threading.Thread(target=_rebuild, name='item-grid-build', daemon=True)
+        _rebuild_thread.start()
+        return True
+
+
+def get_item_grid():
+    """
+    Process-wide item grid. Only the first call waits for a build; a grid
+    older than GEO_INDEX_REFRESH_SECONDS keeps serving while it is rebuilt
+    in the background.
+    """
+    grid = _grid
+    if grid is None:
+        with _first_build_lock:
+            return _grid if _grid is not None else _build()
+    if time.monotonic() - _grid_built_at >= rec_setting('GEO_INDEX_REFRESH_SECONDS'):
+        schedule_rebuild()
+    return grid
+
+
+def _move(grid, item_id, latitude, longitude):
+    if latitude is None or longitude is None:
+        grid.remove(item_id)
+    else:
+        grid.add(item_id, latitude, longitude)
+
+
+def update_item_location(item_id, latitude, longitude):
+    """Apply one item's new coordinates (None to drop it) to this process's grid, if built."""
+    with _grid_lock:
+        grid = _grid
+        if _rebuild_thread is not None and _rebuild_thread.is_alive():
+            _pending.append((item_id, latitude, longitude))
+    if grid is not None:
+        _move(grid, item_id, latitude, longitude)
@@ -1,325 +1,390 @@
-import pandas as pd
 import numpy as np
-import math
-from datetime import datetime, timedelta
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.neighbors import NearestNeighbors
-from sentence_transformers import SentenceTransformer
-from django.conf import settings
-from django.db.models import F 
 from django.utils import timezone
 
 from users.models import User
 from items.models import Item, SearchHistory
-
-try:
-    GLOBAL_SENTENCE_MODEL = SentenceTransformer('paraphrase-MiniLM-L6-v2')
-    print("SentenceTransformer model loaded successfully.")
-except Exception as e:
-    GLOBAL_SENTENCE_MODEL = None
-    print(f"Failed to load SentenceTransformer model: {e}. Content-based recommendations will be disabled.")
-
-
-def content_based_recommendations(user_id):
-    if GLOBAL_SENTENCE_MODEL is None:
-        print("SentenceTransformer model is not available. Skipping content-based recommendations.")
-        return pd.DataFrame()
-
+from .als import get_als_model
+from .ann import get_item_index
+from .availability import get_availability
+from .candidates import CandidateFilter
+from .collaborative import neighbour_item_scores, squash_scores, user_knn_scores
+from .compression import get_compressed_items
+from .conf import rec_setting
+from .embeddings import get_item_store, sync_item_embeddings
+from .geo import get_item_grid
+from .instrumentation import instrumented, stage
+from .interactions import get_interaction_matrix, load_events
+from .item_similarity import get_neighbour_table, user_history
+from .profiles import get_profile_vector
+from .results import RecommendedItem, blend
+from .scoring import TopK, align, combine, last_interactions, recency, stream_top_k
+from .user_neighbours import get_user_neighbour_model, refit_due, schedule_refit
+
+
+@instrumented('content')
+def content_based_recommendations(user_id, candidates=None):
+    """
+    ``candidates``, a CandidateFilter, restricts the items scored: only its
+    allowed items are scanned when it has them, and excluded items never
+    rank.
+    """
     try:
-        user_profile = User.objects.get(id=user_id)
-        user_interests = ' '.join(user_profile.interests or [])
-
-        search_history_items_titles = SearchHistory.objects.filter(
-            user=user_profile,
-            item__isnull=False 
-        ).values_list('item__title', flat=True).distinct() 
-
-        search_history_text = ' '.join(filter(None, search_history_items_titles)) 
-        user_text = user_interests + ' ' + search_history_text
-        user_text = user_text.strip()
-
-        if not user_text:
+        store = get_item_store()
+        if not len(store):
+            # Normally kept current by the Item signals; this only runs before
+            # the store has been built for the first time.
+            with stage('content.store_sync'):
+                sync_item_embeddings(store=store)
+        if not len(store):
+            print("No item embeddings available for content-based recommendations.")
+            return []
+
+        # Kept current by signals; only built (and the interests encoded)
+        # on a user's first request.
+        with stage('content.profile'):
+            user_embedding = get_profile_vector(user_id)
+        if user_embedding is None:
             print(f"No user interests or search history for user {user_id} for content-based recommendations.")
-            return pd.DataFrame()
-
-        items_data = list(Item.objects.all().values('id', 'title', 'category', 'description', 'price', 'image'))
-
-        for item in items_data:
-            item['title'] = item.get('title') or ""
-            item['category'] = item.get('category') or ""
-            item['description'] = item.get('description') or ""
-            item['price'] = item.get('price') or 0
-            item['image'] = f"{settings.MEDIA_URL}{item['image']}" if item.get('image') else ""
-
-        items_data_df = pd.DataFrame(items_data)
-
-        if items_data_df.empty:
+            return []
+
+        with stage('content.history') as s:
+            searched_ids, searched_at = last_interactions(user_id)
+            s.rows = len(searched_ids)
+        now_ts = timezone.now().timestamp()
+
+        def score(ids, similarity):
+            features = {
+                'similarity': similarity,
+                'recency': recency(
+                    align(ids, searched_ids, searched_at, fill=np.nan),
+                    now_ts, rec_setting('RECENCY_DAYS')
+                ),
+            }
+            scores = combine(features, rec_setting('CONTENT_WEIGHTS'))
+            if candidates is not None:
+                scores = np.where(candidates.mask(ids), scores, -np.inf)
+            return scores
+
+        # Only the head of the ranking is hydrated; a few spares cover items
+        # that were deleted since they were embedded.
+        with stage('content.score') as s:
+            if candidates is not None and candidates.allowed is not None:
+                # Score just the allowed items, exactly, a chunk at a time.
+                allowed = candidates.allowed
+                best = TopK(10)
+                chunk_size = rec_setting('SCORING_CHUNK_SIZE')
+                for start in range(0, len(allowed), chunk_size):
+                    chunk_ids, chunk_vectors = store.get(allowed[start:start + chunk_size].tolist())
+                    if chunk_ids:
+                        chunk_ids = np.asarray(chunk_ids, dtype=np.int64)
+                        best.push(chunk_ids, score(chunk_ids, chunk_vectors @ user_embedding))
+                head_ids, head_scores = best.result()
+                s.rows = len(allowed)
+            elif rec_setting('CONTENT_SCORER') == 'stream':
+                head_ids, head_scores = stream_top_k(
+                    np.asarray(store.ids, dtype=np.int64), store.vectors(),
+                    lambda ids, vectors: score(ids, vectors @ user_embedding),
+                    k=10, chunk_size=rec_setting('SCORING_CHUNK_SIZE')
+                )
+                s.rows = len(store)
+            elif rec_setting('CONTENT_SCORER') == 'compressed':
+                compressed = get_compressed_items(store)
+                query = compressed.codec.prepare(user_embedding)
+                head_ids, head_scores = stream_top_k(
+                    compressed.ids, compressed.records,
+                    lambda ids, records: score(ids, compressed.codec.scores(query, records)),
+                    k=10, chunk_size=rec_setting('SCORING_CHUNK_SIZE')
+                )
+                s.rows = len(compressed)
+            else:
+                candidate_ids, candidate_scores = get_item_index(store).search(user_embedding, rec_setting('CONTENT_CANDIDATES'))
+
+                # Searched items can still win on recency even when they are not among
+                # the nearest neighbours, so score them exactly as well.
+                extra_ids, extra_vectors = store.get(np.setdiff1d(searched_ids, candidate_ids).tolist())
+                if extra_ids:
+                    candidate_ids = np.concatenate([candidate_ids, np.asarray(extra_ids, dtype=np.int64)])
+                    candidate_scores = np.concatenate([candidate_scores, extra_vectors @ user_embedding])
+
+                best = TopK(10)
+                best.push(candidate_ids, score(candidate_ids, candidate_scores))
+                head_ids, head_scores = best.result()
+                s.rows = len(candidate_ids)
+
+        ranked = np.isfinite(head_scores)
+        head_ids, head_scores = head_ids[ranked].tolist(), head_scores[ranked]
+        score_by_id = dict(zip(head_ids, head_scores.tolist()))
+        with stage('content.hydrate') as s:
+            details = {
+                item['id']: item
+                for item in Item.objects.filter(id__in=head_ids).values('id', 'title', 'category', 'description', 'price', 'image')
+            }
+            s.rows = len(details)
+
+        recommended = [
+            RecommendedItem.from_values(details[item_id], score_by_id[item_id])
+            for item_id in head_ids if item_id in details
+        ]
+        if not recommended:
             print("No items found in the database for content-based recommendations.")
-            return pd.DataFrame()
-
-        items_data_df['combined_text'] = (
-            items_data_df['title'] + ' ' + items_data_df['category'] + ' ' + items_data_df['description']
-        ).fillna('') 
-
-        if items_data_df['combined_text'].empty or all(s == '' for s in items_data_df['combined_text']):
-             print("All items have empty combined_text for content-based recommendations.")
-             return pd.DataFrame()
-
-        items_embeddings = GLOBAL_SENTENCE_MODEL.encode(items_data_df['combined_text'].tolist(), show_progress_bar=False)
-        user_embedding = GLOBAL_SENTENCE_MODEL.encode([user_text], show_progress_bar=False)[0]
-
-        user_embedding_reshaped = user_embedding.reshape(1, -1)
-
-        scores = cosine_similarity(user_embedding_reshaped, items_embeddings).flatten()
-        items_data_df['similarity'] = scores
-
-        now = timezone.now() 
-        recency_scores = []
-
-        recent_searches_map = {}
-        for s in SearchHistory.objects.filter(user=user_profile, item__isnull=False).order_by('item', '-timestamp'):
-            recent_searches_map[s.item_id] = s.timestamp 
-
-        for item_id_val in items_data_df['id'].tolist():
-            recency_score = 0
-            if item_id_val in recent_searches_map:
-                recent_timestamp = recent_searches_map[item_id_val]
-
-                if settings.USE_TZ and recent_timestamp.tzinfo is None:
-                    recent_timestamp = timezone.make_aware(recent_timestamp)
-                if settings.USE_TZ and now.tzinfo is None:
-                    now = timezone.make_aware(now)
-
-                time_diff = now - recent_timestamp
-                recency_score = max(0, 1 - (time_diff.total_seconds() / (3600 * 24 * 30)))
-
-            recency_scores.append(recency_score)
-
-        items_data_df['recency'] = recency_scores
-
-        items_data_df['similarity'] = pd.to_numeric(items_data_df['similarity'], errors='coerce').fillna(0)
-        items_data_df['recency'] = pd.to_numeric(items_data_df['recency'], errors='coerce').fillna(0)
-
-        items_data_df['final_score'] = items_data_df['similarity'] * 0.6 + items_data_df['recency'] * 0.4
-
-        items_data_df = items_data_df.replace({np.nan: None})
-
-        return items_data_df[['id', 'title', 'category', 'description', 'price', 'image', 'final_score']].sort_values(by='final_score', ascending=False).head(5)
+        return recommended[:5]
 
     except User.DoesNotExist:
         print(f"User with ID {user_id} not found for content-based recommendations.")
-        return pd.DataFrame()
+        return []
     except Exception as e:
         print(f"Error in content-based recommendations for user {user_id}: {e}")
         import traceback
         traceback.print_exc()
-        return pd.DataFrame()
-
-
-def collaborative_filtering(user_id):
+        return []
+
+
+def _collaborative_recommendations(user_id, ranked_item_ids, raw_scores, candidates=None):
+    """
+    Squash raw collaborative scores into the blending band and hydrate the
+    top five items. ``ranked_item_ids`` must be sorted best first; items
+    the ``candidates`` filter rejects are dropped first.
+    """
+    if candidates is not None:
+        keep = candidates.mask(ranked_item_ids)
+        ranked_item_ids = [item_id for item_id, kept in zip(ranked_item_ids, keep) if kept]
+        raw_scores = np.asarray(raw_scores)[keep]
+        if not ranked_item_ids:
+            print(f"No collaborative candidates for user {user_id} pass the candidate filter.")
+            return []
+    final_scores = squash_scores(raw_scores)
+    score_by_id = dict(zip(ranked_item_ids, zip(np.asarray(raw_scores).tolist(), final_scores.tolist())))
+
+    # Only hydrate the head of the ranking; a few spares cover items that
+    # were deleted since their interactions were recorded.
+    head_ids = list(ranked_item_ids[:10])
+    with stage('collaborative.hydrate') as s:
+        details = {
+            item['id']: item
+            for item in Item.objects.filter(id__in=head_ids).values('id', 'title', 'category', 'description', 'price', 'image')
+        }
+        s.rows = len(details)
+
+    recommended = []
+    for item_id in head_ids:
+        if item_id not in details:
+            continue
+        raw_score, final_score = score_by_id[item_id]
+        recommended.append(RecommendedItem.from_values(details[item_id], float(final_score), raw_score=float(raw_score)))
+
+    if not recommended:
+        print(f"No items to recommend from similar users for user {user_id}.")
+    return recommended[:5]
+
+
+def _user_knn_scores(matrix, counts, last_seen, user_row, user_id):
+    """
+    Score from the persisted neighbour model, folding in users it was not
+    fitted on. Until the first fit lands, scores against the whole matrix.
+    """
+    n_neighbours = rec_setting('COLLABORATIVE_NEIGHBOURS')
+    now_ts = timezone.now().timestamp()
+    popularity_weight = rec_setting('COLLABORATIVE_POPULARITY_WEIGHT')
+    model = get_user_neighbour_model()
+    if refit_due(model, matrix):
+        schedule_refit()
+    if model is None:
+        return user_knn_scores(counts, last_seen, user_row, n_neighbours, now_ts, popularity_weight)
+
+    seen_cols = counts[user_row].indices
+    found = model.neighbours_of(user_id, n_neighbours)
+    if found is None:
+        found = model.fold_in([matrix.item_ids[c] for c in seen_cols], n_neighbours)
+    neighbour_rows, neighbour_sims = [], []
+    for neighbour_id, similarity in zip(*found):
+        row = matrix.user_row(int(neighbour_id))
+        if row is not None and row < counts.shape[0]:
+            neighbour_rows.append(row)
+            neighbour_sims.append(similarity)
+    if not neighbour_rows:
+        return np.zeros(0, dtype=np.int64), np.zeros(0)
+    return neighbour_item_scores(counts, last_seen, np.array(neighbour_rows), np.array(neighbour_sims),
+                                 seen_cols, now_ts, popularity_weight)
+
+
+@instrumented('collaborative')
+def collaborative_filtering(user_id, candidates=None):
+    return _user_knn_recommendations(user_id, candidates)
+
+
+def _user_knn_fallback(user_id, candidates):
+    # Already inside the caller's 'collaborative' stage; a stage of its own
+    # keeps the fallback from being recorded as a second, nested one.
+    with stage('collaborative.user_knn_fallback'):
+        return _user_knn_recommendations(user_id, candidates)
+
+
+def _user_knn_recommendations(user_id, candidates=None):
     try:
-        interactions_qs = SearchHistory.objects.filter(item__isnull=False).values('user_id', 'item_id', 'timestamp')
-        interaction_df = pd.DataFrame(list(interactions_qs))
+        with stage('collaborative.matrix') as s:
+            matrix = get_interaction_matrix()
+            interaction_counts, interaction_last_seen = matrix.snapshot()
+            s.rows = interaction_counts.nnz
 
-        if interaction_df.empty:
+        if interaction_counts.nnz == 0:
             print("No interactions found for collaborative filtering.")
-            return pd.DataFrame()
-
-        interaction_matrix = pd.pivot_table(
-            interaction_df,
-            index='user_id',
-            columns='item_id',
-            values='user_id', 
-            aggfunc='count', 
-            fill_value=0
-        )
-        interaction_matrix = (interaction_matrix > 0).astype(int)
+            return []
 
-        if user_id not in interaction_matrix.index:
+        user_row = matrix.user_row(user_id)
+        if user_row is None or user_row >= interaction_counts.shape[0]:
             print(f"User {user_id} not found in interaction matrix. Cannot perform collaborative filtering.")
-            return pd.DataFrame()
+            return []
 
-        model = NearestNeighbors(metric='cosine')
-        if len(interaction_matrix) < 2:
+        if interaction_counts.shape[0] < 2:
             print("Not enough users for collaborative filtering (less than 2).")
-            return pd.DataFrame()
-
-        model.fit(interaction_matrix.values)
-
-        user_idx = list(interaction_matrix.index).index(user_id)
-        n_neighbors_val = min(3, len(interaction_matrix) - 1)
-        if n_neighbors_val < 1: 
-            print("Not enough similar users found for collaborative filtering.")
-            return pd.DataFrame()
-
-        distances, indices = model.kneighbors([interaction_matrix.iloc[user_idx]], n_neighbors=n_neighbors_val + 1) 
-        
-        similarities = 1 - distances.flatten()
-        
-        similar_users_with_scores = {
-            interaction_matrix.index[i]: similarities[idx]
-            for idx, i in enumerate(indices.flatten())
-            if interaction_matrix.index[i] != user_id
-        }
-        
-        similar_users_ids = list(similar_users_with_scores.keys())
-        
-        current_time = timezone.now() 
-        
-        similar_user_interactions_qs = SearchHistory.objects.filter(
-            user_id__in=similar_users_ids,
-            item__isnull=False
-        ).select_related('item').values('user_id', 'item_id', 'timestamp', 'item__title', 'item__category', 'item__description', 'item__price', 'item__image')
-        
-        user_items_searched_ids = set(SearchHistory.objects.filter(user_id=user_id, item__isnull=False).values_list('item_id', flat=True))
-        
-        item_scores = {}
-        item_interaction_count = {}
-        item_details_map = {} 
-
-        for interaction in similar_user_interactions_qs:
-            item_id = interaction['item_id']
-            if item_id not in user_items_searched_ids:
-                user_similarity = similar_users_with_scores.get(interaction['user_id'], 0)
-                
-                interaction_timestamp = interaction['timestamp']
-                if settings.USE_TZ and interaction_timestamp.tzinfo is None:
-                    interaction_timestamp = timezone.make_aware(interaction_timestamp)
-
-                days_old = (current_time - interaction_timestamp).days
-                time_decay = max(0.1, 1 - (days_old / 90)) 
-                
-                score_contribution = user_similarity * time_decay
-                
-                if item_id in item_scores:
-                    item_scores[item_id] += score_contribution
-                    item_interaction_count[item_id] += 1
-                else:
-                    item_scores[item_id] = score_contribution
-                    item_interaction_count[item_id] = 1
-                    item_details_map[item_id] = {
-                        'id': item_id,
-                        'title': interaction['item__title'] or "",
-                        'category': interaction['item__category'] or "",
-                        'description': interaction['item__description'] or "",
-                        'price': interaction['item__price'] or 0,
-                        'image': f"{settings.MEDIA_URL}{interaction['item__image']}" if interaction.get('item__image') else "",
-                    }
-        
-        if not item_scores:
+            return []
+
+        with stage('collaborative.user_knn') as s:
+            candidate_cols, item_scores = _user_knn_scores(
+                matrix, interaction_counts, interaction_last_seen, user_row, user_id
+            )
+            s.rows = len(candidate_cols)
+        if not len(candidate_cols):
             print(f"No items to recommend from similar users for user {user_id}.")
-            return pd.DataFrame()
-
-        for item_id in item_scores:
-            count = item_interaction_count[item_id]
-            popularity_boost = 1 + (0.1 * math.log(count + 1)) 
-            item_scores[item_id] *= popularity_boost
-        
-        sorted_items = sorted(item_scores.items(), key=lambda x: x[1], reverse=True)
-        
-        recommended_items_data = []
-        for item_id, score in sorted_items:
-            item_data = item_details_map.get(item_id)
-            if item_data:
-                recommended_items_data.append({
-                    **item_data,
-                    'raw_score': float(score),
-                    'final_score': float(score) 
-                })
-        
-        if recommended_items_data:
-            scores_list = [item['raw_score'] for item in recommended_items_data]
-            
-            if len(scores_list) > 0:
-                min_score, max_score = min(scores_list), max(scores_list)
-                score_range = max_score - min_score
-                
-                for item in recommended_items_data:
-                    if score_range > 0:
-                        normalized_score = (item['raw_score'] - min_score) / score_range
-                        adjusted_score = 1 / (1 + math.exp(-5 * (normalized_score - 0.5)))
-                        item['final_score'] = 0.4 + 0.5 * adjusted_score 
-                    else:
-                        item['final_score'] = 0.65 
-        
-        recommended_items_df = pd.DataFrame(recommended_items_data)
-        recommended_items_df = recommended_items_df.replace({np.nan: None})
-
-        return recommended_items_df.head(5) 
+            return []
+
+        order = np.argsort(-item_scores, kind='stable')
+        ranked_item_ids = [matrix.item_ids[c] for c in candidate_cols[order]]
+        return _collaborative_recommendations(user_id, ranked_item_ids, item_scores[order], candidates)
 
     except User.DoesNotExist:
         print(f"User with ID {user_id} not found for collaborative filtering.")
-        return pd.DataFrame()
+        return []
     except Exception as e:
         print(f"Error in collaborative filtering for user {user_id}: {e}")
         import traceback
         traceback.print_exc()
-        return pd.DataFrame()
+        return []
 
 
-def hybrid_recommendation_system(user_id):
+@instrumented('collaborative')
+def item_based_collaborative_filtering(user_id, candidates=None):
     try:
-        content_recs = content_based_recommendations(user_id)
-        collab_recs = collaborative_filtering(user_id)
+        table = get_neighbour_table()
+        if table is None:
+            print("Item neighbour table has not been built. Falling back to user-based collaborative filtering.")
+            return _user_knn_fallback(user_id, candidates)
+
+        matrix = get_interaction_matrix()
+        interaction_counts, interaction_last_seen = matrix.snapshot()
+        user_row = matrix.user_row(user_id)
+        if user_row is None or user_row >= interaction_counts.shape[0]:
+            print(f"User {user_id} not found in interaction matrix. Cannot perform collaborative filtering.")
+            return []
 
-        if content_recs.empty and collab_recs.empty:
-            print(f"No recommendations from either system for user {user_id}.")
-            return pd.DataFrame()
-        elif content_recs.empty:
-            print(f"Only collaborative recommendations available for user {user_id}.")
-            if 'final_score' not in collab_recs.columns:
-                collab_recs['final_score'] = 0.65 
-            return collab_recs.head(5).replace({np.nan: None})
-        elif collab_recs.empty:
-            print(f"Only content-based recommendations available for user {user_id}.")
-            if 'final_score' not in content_recs.columns:
-                content_recs['final_score'] = 0.65 
-            return content_recs.head(5).replace({np.nan: None})
-
-        common_cols = ['id', 'title', 'category', 'description', 'price', 'image']
-        
-        content_recs = content_recs.rename(columns={'final_score': 'content_score'})
-        collab_recs = collab_recs.rename(columns={'final_score': 'collab_score'})
-
-        
-        all_items = pd.merge(
-            content_recs,
-            collab_recs[['id', 'collab_score']], 
-            on='id',
-            how='outer',
-            suffixes=('_content', '_collab') 
+        seen_cols, recent_cols, recent_weights = user_history(
+            interaction_last_seen, user_row,
+            timezone.now().timestamp(), rec_setting('ITEM_HISTORY_LENGTH')
         )
+        with stage('collaborative.item_item') as s:
+            ranked_item_ids, item_scores = table.score(
+                [matrix.item_ids[c] for c in recent_cols], recent_weights,
+                exclude_item_ids=[matrix.item_ids[c] for c in seen_cols],
+                k=50 if candidates is None or candidates.allowed is None else None
+            )
+            s.rows = len(recent_cols)
+        if not len(ranked_item_ids):
+            print(f"No items to recommend from similar items for user {user_id}.")
+            return []
+
+        return _collaborative_recommendations(user_id, ranked_item_ids.tolist(), item_scores, candidates)
 
-        all_items['content_score'] = all_items['content_score'].fillna(0.4) 
-        all_items['collab_score'] = all_items['collab_score'].fillna(0.4) 
+    except Exception as e:
+        print(f"Error in item-based collaborative filtering for user {user_id}: {e}")
+        import traceback
+        traceback.print_exc()
+        return []
 
-        missing_item_details_ids = all_items[all_items['title'].isnull()]['id'].tolist()
-        if missing_item_details_ids:
-            missing_details_df = collab_recs[collab_recs['id'].isin(missing_item_details_ids)].drop(columns=['collab_score'])
-            
-            for col in ['title', 'category', 'description', 'price', 'image']:
-                all_items[col] = all_items[col].fillna(
-                    all_items['id'].map(missing_details_df.set_index('id')[col])
-                )
 
-        all_items['hybrid_score'] = 0.5 * all_items['content_score'] + 0.5 * all_items['collab_score']
-        
-        result = all_items.sort_values(by='hybrid_score', ascending=False).head(5)
-        
-        result = result.rename(columns={'hybrid_score': 'final_score'})
-        
-        final_cols = ['id', 'title', 'category', 'description', 'price', 'image', 'final_score']
-        
-        for col in final_cols:
-            if col not in result.columns:
-                result[col] = None
+@instrumented('collaborative')
+def als_collaborative_filtering(user_id, candidates=None):
+    try:
+        model = get_als_model()
+        if model is None:
+            print("ALS factors have not been trained. Falling back to user-based collaborative filtering.")
+            return _user_knn_fallback(user_id, candidates)
+
+        user_state = model.user_vector(user_id)
+        if user_state is None:
+            # Joined (or first interacted) after the last training run.
+            _, event_item_ids, event_weights, _ = load_events(user_id=user_id)
+            user_state = model.fold_in(event_item_ids.tolist(), event_weights.tolist())
+        if user_state is None:
+            print(f"No interactions on known items for user {user_id}. Cannot perform ALS recommendations.")
+            return []
+
+        user_vector, seen_cols = user_state
+        with stage('collaborative.als') as s:
+            allowed = None if candidates is None else candidates.allowed
+            ranked_item_ids, item_scores = model.recommend(user_vector, seen_cols, k=50, item_ids=allowed)
+            s.rows = len(model.item_ids) if allowed is None else len(allowed)
+        if not len(ranked_item_ids):
+            print(f"No items to recommend from ALS factors for user {user_id}.")
+            return []
+
+        return _collaborative_recommendations(user_id, ranked_item_ids.tolist(), item_scores, candidates)
+
+    except Exception as e:
+        print(f"Error in ALS collaborative filtering for user {user_id}: {e}")
+        import traceback
+        traceback.print_exc()
+        return []
+
 
-        final_result = result[final_cols].replace({np.nan: None})
+COLLABORATIVE_ENGINES = {
+    'user_knn': collaborative_filtering,
+    'item_item': item_based_collaborative_filtering,
+    'als': als_collaborative_filtering,
+}
+
+
+@instrumented('hybrid')
+def hybrid_recommendation_system(user_id, near=None):
+    """
+    ``near``, a ``(latitude, longitude, radius_km)`` triple, limits the
+    recommendations to items within the radius; the grid index cuts the
+    catalog to them before anything is scored. The user's own items and
+    items booked solid for the next AVAILABILITY_WINDOW_DAYS are dropped
+    the same way.
+    """
+    try:
+        allowed = None
+        if near is not None:
+            with stage('nearby') as s:
+                allowed = get_item_grid().within(*near)[0]
+                s.rows = len(allowed)
+        with stage('availability') as s:
+            excluded = get_availability().excluded(
+                user_id, rec_setting('AVAILABILITY_WINDOW_DAYS'), timezone.localdate())
+            s.rows = len(excluded)
+        candidates = CandidateFilter(allowed, excluded)
+        if candidates.empty:
+            print(f"No available items within {near[2]} km for user {user_id}.")
+            return []
+
+        content_recs = content_based_recommendations(user_id, candidates)
+        collab_recs = COLLABORATIVE_ENGINES[rec_setting('COLLABORATIVE_ENGINE')](user_id, candidates)
+
+        if not content_recs and not collab_recs:
+            print(f"No recommendations from either system for user {user_id}.")
+            return []
+        elif not content_recs:
+            print(f"Only collaborative recommendations available for user {user_id}.")
+            return collab_recs[:5]
+        elif not collab_recs:
+            print(f"Only content-based recommendations available for user {user_id}.")
+            return content_recs[:5]
 
-        return final_result
+        with stage('hybrid.merge'):
+            return blend(content_recs, collab_recs, limit=5)
 
     except Exception as e:
         print(f"Error in hybrid recommendation system for user {user_id}: {e}")
         import traceback
         traceback.print_exc()
-        return pd.DataFrame()
\ No newline at end of file
+        return []
\ No newline at end of file
@@ -0,0 +1,265 @@
+"""
+Per-stage instrumentation for the recommenders.
+
+Wrap a stage in ``stage(name)`` to record its wall time, CPU time (of the
+calling thread), database query count, the rows it reports loading and,
+with INSTRUMENT_MEMORY on, its peak traced allocation:
+
+    with stage('content.hydrate') as s:
+        items = list(queryset)
+        s.rows = len(items)
+
+Every stage feeds process-wide histograms (served by the metrics endpoint).
+Inside ``collect()`` the stages are also kept, in order, for the current
+request so a view can return them in a debug block. Stages may nest.
+"""
+import bisect
+import contextvars
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from functools import wraps
+
+from django.db import connection
+
+from .conf import rec_setting
+
+# Upper bounds of the histogram buckets for each metric.
+BUCKETS = {
+    'wall_ms': (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000),
+    'cpu_ms': (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000),
+    'queries': (0, 1, 2, 3, 5, 10, 20, 50, 100),
+    'rows': (0, 10, 100, 1000, 10000, 100000, 1000000),
+    'peak_kb': (64, 256, 1024, 4096, 16384, 65536, 262144),
+}
+
+_current = contextvars.ContextVar('recommendation_trace', default=None)
+
+
+class Histogram:
+    """Cumulative-bucket histogram with a running count and sum."""
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the ``q`` quantile (None past the last bound)."""
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return None
+
+    def as_dict(self):
+        cumulative, buckets = 0, []
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            buckets.append([bound, cumulative])
+        buckets.append(['+Inf', self.count])
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 3),
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'buckets': buckets,
+        }
+
+
+_histograms = {}
+_histograms_lock = threading.Lock()
+
+
+def _observe(record):
+    with _histograms_lock:
+        for metric, value in record.metrics().items():
+            if value is None:
+                continue
+            key = (record.name, metric)
+            if key not in _histograms:
+                _histograms[key] = Histogram(BUCKETS[metric])
+            _histograms[key].observe(value)
+
+
+def histograms():
+    """``{stage: {metric: histogram}}`` for every stage recorded in this process."""
+    with _histograms_lock:
+        rows = {}
+        for (name, metric), histogram in sorted(_histograms.items()):
+            rows.setdefault(name, {})[metric] = histogram.as_dict()
+        return rows
+
+
+def reset_histograms():
+    with _histograms_lock:
+        _histograms.clear()
+
+
+class StageRecord:
+    __slots__ = ('name', 'depth', 'wall_ms', 'cpu_ms', 'queries', 'rows', 'peak_kb', '_child_peak')
+
+    def __init__(self, name, depth):
+        self.name = name
+        self.depth = depth
+        self.wall_ms = 0.0
+        self.cpu_ms = 0.0
+        self.queries = 0
+        self.rows = None
+        self.peak_kb = None
+        self._child_peak = 0
+
+    def metrics(self):
+        return {'wall_ms': self.wall_ms, 'cpu_ms': self.cpu_ms, 'queries': self.queries,
+                'rows': self.rows, 'peak_kb': self.peak_kb}
+
+    def as_dict(self):
+        row = {'stage': self.name, 'depth': self.depth}
+        row.update({
+            metric: round(value, 3) if isinstance(value, float) else value
+            for metric, value in self.metrics().items()
+        })
+        return row
+
+
+class Trace:
+    """The stages recorded for one request, in the order they started."""
+
+    def __init__(self, memory):
+        self.memory = memory
+        self.stages = []
+        self.open = []
+
+    def as_list(self):
+        return [record.as_dict() for record in self.stages]
+
+
+# tracemalloc is process-wide; concurrent traces share one session, which
+# is stopped again only if we started it.
+_memory_users = 0
+_memory_started = False
+_memory_lock = threading.Lock()
+
+
+def _start_memory():
+    global _memory_users, _memory_started
+    with _memory_lock:
+        if _memory_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _memory_started = True
+        _memory_users += 1
+
+
+def _stop_memory():
+    global _memory_users, _memory_started
+    with _memory_lock:
+        _memory_users -= 1
+        if _memory_users == 0 and _memory_started:
+            tracemalloc.stop()
+            _memory_started = False
+
+
+@contextmanager
+def collect(memory=None):
+    """
+    Keep the stages run inside this block; yields the ``Trace``. Peak
+    allocations are traced when ``memory`` (default INSTRUMENT_MEMORY) is
+    set; they are process-wide, so concurrent requests inflate them.
+    """
+    memory = rec_setting('INSTRUMENT_MEMORY') if memory is None else memory
+    trace = Trace(memory)
+    if memory:
+        _start_memory()
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+        if memory:
+            _stop_memory()
+
+
+def current_trace():
+    return _current.get()
+
+
+@contextmanager
+def stage(name):
+    trace = _current.get()
+    record = StageRecord(name, len(trace.open) if trace else 0)
+    parent = trace.open[-1] if trace and trace.open else None
+    memory = trace is not None and trace.memory and tracemalloc.is_tracing()
+    if trace is not None:
+        trace.stages.append(record)
+        trace.open.append(record)
+
+    def count_queries(execute, sql, params, many, context):
+        record.queries += 1
+        return execute(sql, params, many, context)
+
+    if memory:
+        start_memory, peak_so_far = tracemalloc.get_traced_memory()
+        # reset_peak() below would lose the parent's peak up to this point.
+        if parent is not None:
+            parent._child_peak = max(parent._child_peak, peak_so_far)
+        tracemalloc.reset_peak()
+    wall = time.perf_counter()
+    cpu = time.thread_time()
+    try:
+        with connection.execute_wrapper(count_queries):
+            yield record
+    finally:
+        record.wall_ms = (time.perf_counter() - wall) * 1000
+        record.cpu_ms = (time.thread_time() - cpu) * 1000
+        if trace is not None:
+            trace.open.pop()
+        if memory:
+            # Nested stages reset the peak; they leave theirs in _child_peak.
+            peak = max(tracemalloc.get_traced_memory()[1], record._child_peak)
+            record.peak_kb = max(0, peak - start_memory) / 1024
+            if parent is not None:
+                parent._child_peak = max(parent._child_peak, peak)
+        _observe(record)
+
+
+def instrumented(name):
+    """Decorator running the whole function as one stage."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def instrument_view(view):
+    """
+    Collect a trace around a DRF view and time the response rendering as
+    ``view.render``. Apply it outside ``@api_view``. A response the view
+    marks with ``attach_trace`` gets the finished trace under 'debug' and
+    is rendered again; that second rendering is not part of the trace.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with collect() as trace:
+            response = view(request, *args, **kwargs)
+            if hasattr(response, 'render') and not getattr(response, 'is_rendered', True):
+                with stage('view.render'):
+                    response.render()
+                if getattr(response, 'attach_trace', False):
+                    response.data['debug'] = {'stages': trace.as_list()}
+                    response.content = response.rendered_content
+        return response
+    return wrapper
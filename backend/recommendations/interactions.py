@@ -0,0 +1,343 @@
+"""
+Persistent sparse user x item interaction matrix for collaborative filtering.
+
+The matrix is stored as two CSR matrices sharing one sparsity pattern:
+``counts`` (interactions per user/item pair) and ``last_seen`` (epoch
+seconds of the latest one), plus stable user and item index maps, built
+from the search events in the interaction event log. New search events are
+appended to a delta log by a signal; every process replays the log on read
+and the log is folded into the base snapshot once it grows past
+``INTERACTION_COMPACT_THRESHOLD`` rows. Applied events wait in a small
+per-pair buffer and are merged into the CSR matrices in batches (see
+INTERACTION_MERGE_EVENTS), since every merge rebuilds them.
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+from scipy import sparse
+
+from .conf import rec_setting
+from .embeddings import FileLock, file_stamp
+
+logger = logging.getLogger(__name__)
+
+
+def _dedupe_max(rows, cols, values):
+    """Collapse duplicate (row, col) pairs keeping the largest value."""
+    if not len(rows):
+        return rows, cols, values
+    order = np.lexsort((cols, rows))
+    rows, cols, values = rows[order], cols[order], values[order]
+    starts = np.flatnonzero(np.r_[True, (rows[1:] != rows[:-1]) | (cols[1:] != cols[:-1])])
+    return rows[starts], cols[starts], np.maximum.reduceat(values, starts)
+
+
+def _grown(matrix, shape):
+    """``matrix`` padded with empty rows and columns to ``shape``, as a new CSR matrix."""
+    indptr = np.concatenate([matrix.indptr, np.full(shape[0] - matrix.shape[0], matrix.indptr[-1])])
+    return sparse.csr_matrix((matrix.data, matrix.indices, indptr), shape=shape)
+
+
+class InteractionMatrix:
+
+    def __init__(self, directory, name='interaction_events'):
+        self.directory = directory
+        self.base_path = os.path.join(directory, f'{name}.npz')
+        self.index_path = os.path.join(directory, f'{name}.json')
+        self.delta_path = os.path.join(directory, f'{name}.delta')
+        self.lock_path = os.path.join(directory, f'{name}.lock')
+        self._lock = threading.RLock()
+        self._reset()
+        self.load()
+
+    def _reset(self):
+        self.user_ids = []
+        self.item_ids = []
+        self.user_index = {}
+        self.item_index = {}
+        self.counts = sparse.csr_matrix((0, 0), dtype=np.float32)
+        self.last_seen = sparse.csr_matrix((0, 0), dtype=np.float64)
+        # Highest event id folded into the base snapshot, and the ids
+        # applied from the delta log since then.
+        self.watermark = 0
+        self.applied_ids = set()
+        # Sum of ``counts`` and the pending buffer, kept up to date by _apply.
+        self.interaction_count = 0
+        # (row, col) -> [count, last_seen] of events not merged into the CSR
+        # matrices yet, how many events that is and when the first arrived.
+        self._pending = {}
+        self._pending_events = 0
+        self._pending_since = None
+        self._delta_offset = 0
+        self._base_stamp = None
+
+    # -- persistence -------------------------------------------------------
+
+    def load(self):
+        with self._lock:
+            self._reset()
+            if os.path.exists(self.index_path) and os.path.exists(self.base_path):
+                with open(self.index_path) as fh:
+                    meta = json.load(fh)
+                self.user_ids = meta['user_ids']
+                self.item_ids = meta['item_ids']
+                self.watermark = meta['watermark']
+                self.user_index = {u: i for i, u in enumerate(self.user_ids)}
+                self.item_index = {t: i for i, t in enumerate(self.item_ids)}
+                with np.load(self.base_path) as data:
+                    shape = tuple(data['shape'])
+                    indices, indptr = data['indices'], data['indptr']
+                    self.counts = sparse.csr_matrix((data['counts'], indices, indptr), shape=shape)
+                    self.last_seen = sparse.csr_matrix((data['last_seen'], indices, indptr), shape=shape)
+                self.interaction_count = int(self.counts.sum())
+                self._base_stamp = file_stamp(self.index_path)
+            self._replay_delta()
+
+    def refresh(self):
+        """Pick up deltas and compactions written by other processes."""
+        with self._lock:
+            stamp = file_stamp(self.index_path) if os.path.exists(self.index_path) else None
+            if stamp != self._base_stamp:
+                self.load()
+            else:
+                self._replay_delta()
+
+    def _replay_delta(self):
+        if not os.path.exists(self.delta_path):
+            return
+        size = os.path.getsize(self.delta_path)
+        if size < self._delta_offset:
+            # Truncated by a compaction we have not seen the snapshot of yet.
+            self.load()
+            return
+        if size == self._delta_offset:
+            return
+        with open(self.delta_path) as fh:
+            fh.seek(self._delta_offset)
+            chunk = fh.read()
+        complete, _, _ = chunk.rpartition('\n')
+        if not complete:
+            return
+        self._delta_offset += len(complete) + 1
+        events = []
+        for line in complete.split('\n'):
+            event_id, user_id, item_id, timestamp = line.split(',')
+            events.append((int(event_id), int(user_id), int(item_id), float(timestamp)))
+        self._apply(events)
+
+    def save(self, replay=True):
+        """
+        Write the current matrix as the new base snapshot and clear the delta
+        log. Other processes' deltas (and compactions) are picked up first,
+        unless ``replay`` is False because the matrix was rebuilt from scratch.
+        """
+        with self._lock, FileLock(self.lock_path):
+            if replay:
+                self.refresh()
+            self._merge()
+            counts = self.counts.tocsr()
+            counts.sort_indices()
+            last_seen = self.last_seen.tocsr()
+            last_seen.sort_indices()
+            tmp_base = f'{self.base_path}.tmp.npz'
+            np.savez(tmp_base, shape=np.array(counts.shape), indices=counts.indices, indptr=counts.indptr,
+                     counts=counts.data, last_seen=last_seen.data)
+            os.replace(tmp_base, self.base_path)
+
+            self.watermark = max([self.watermark, *self.applied_ids])
+            tmp_index = f'{self.index_path}.tmp'
+            with open(tmp_index, 'w') as fh:
+                json.dump({'user_ids': self.user_ids, 'item_ids': self.item_ids, 'watermark': self.watermark}, fh)
+            os.replace(tmp_index, self.index_path)
+
+            open(self.delta_path, 'w').close()
+            self.applied_ids = set()
+            self._delta_offset = 0
+            self._base_stamp = file_stamp(self.index_path)
+
+    # -- writes --------------------------------------------------------------
+
+    def append(self, events, compact=True):
+        """
+        Record ``(event_id, user_id, item_id, epoch_seconds)`` search events:
+        apply them locally and append them to the shared delta log, which is
+        compacted once long enough unless ``compact`` is False.
+        """
+        events = [e for e in events if e[0] > self.watermark and e[0] not in self.applied_ids]
+        if not events:
+            return
+        with self._lock, FileLock(self.lock_path):
+            self.refresh()
+            events = [e for e in events if e[0] > self.watermark and e[0] not in self.applied_ids]
+            with open(self.delta_path, 'a') as fh:
+                fh.write(''.join(f'{e[0]},{e[1]},{e[2]},{e[3]}\n' for e in events))
+            self._apply(events)
+            self._delta_offset = os.path.getsize(self.delta_path)
+        if compact and len(self.applied_ids) >= rec_setting('INTERACTION_COMPACT_THRESHOLD'):
+            self.save()
+
+    def _apply(self, events):
+        """Buffer new events for the next merge."""
+        events = [e for e in events if e[0] > self.watermark and e[0] not in self.applied_ids]
+        if not events:
+            return
+        for event in events:
+            event_id, user_id, item_id, timestamp = event
+            self.applied_ids.add(event_id)
+            if user_id not in self.user_index:
+                self.user_index[user_id] = len(self.user_ids)
+                self.user_ids.append(user_id)
+            if item_id not in self.item_index:
+                self.item_index[item_id] = len(self.item_ids)
+                self.item_ids.append(item_id)
+            pending = self._pending.setdefault((self.user_index[user_id], self.item_index[item_id]), [0, 0.0])
+            pending[0] += 1
+            pending[1] = max(pending[1], timestamp)
+        self.interaction_count += len(events)
+        self._pending_events += len(events)
+        if self._pending_since is None:
+            self._pending_since = time.monotonic()
+        if self._pending_events >= rec_setting('INTERACTION_MERGE_EVENTS'):
+            self._merge()
+
+    def _merge(self):
+        """Fold the pending buffer into the CSR matrices."""
+        shape = (len(self.user_ids), len(self.item_ids))
+        if shape != self.counts.shape:
+            # Not resize(): snapshot() callers may still hold the old matrices.
+            self.counts = _grown(self.counts, shape)
+            self.last_seen = _grown(self.last_seen, shape)
+        if self._pending:
+            rows, cols = np.array(list(self._pending), dtype=np.int32).T
+            values = np.array(list(self._pending.values()), dtype=np.float64)
+            delta_counts = sparse.csr_matrix((values[:, 0].astype(np.float32), (rows, cols)), shape=shape)
+            delta_seen = sparse.csr_matrix((values[:, 1], (rows, cols)), shape=shape)
+            self.counts = (self.counts + delta_counts).tocsr()
+            self.last_seen = self.last_seen.maximum(delta_seen).tocsr()
+        self._pending = {}
+        self._pending_events = 0
+        self._pending_since = None
+
+    # -- reads ---------------------------------------------------------------
+
+    @property
+    def shape(self):
+        return self.counts.shape
+
+    def snapshot(self):
+        """
+        Consistent ``(counts, last_seen)`` pair, safe against concurrent
+        appends. Events are merged in first once the oldest pending one is
+        INTERACTION_MERGE_SECONDS old, so rows may lag that far behind.
+        """
+        with self._lock:
+            if (self._pending_since is not None
+                    and time.monotonic() - self._pending_since >= rec_setting('INTERACTION_MERGE_SECONDS')):
+                self._merge()
+            return self.counts, self.last_seen
+
+    def labelled_snapshot(self):
+        """
+        ``(counts, last_seen, user_ids, item_ids, interaction_count)`` taken
+        together, with every pending event merged in: the ids label the
+        matrices' rows and columns, and the count covers exactly their events.
+        """
+        with self._lock:
+            self._merge()
+            return (self.counts, self.last_seen, list(self.user_ids), list(self.item_ids),
+                    self.interaction_count)
+
+    def user_row(self, user_id):
+        return self.user_index.get(user_id)
+
+
+def rebuild_interaction_matrix(matrix=None):
+    """Rebuild the matrix from every search event."""
+    if matrix is None:
+        matrix = get_interaction_matrix()
+    with matrix._lock:
+        matrix._reset()
+        if os.path.exists(matrix.delta_path):
+            open(matrix.delta_path, 'w').close()
+        for batch in _search_event_batches(0):
+            matrix._apply(batch)
+        # The old snapshot and delta log are being replaced, not merged.
+        matrix.save(replay=False)
+    return matrix
+
+
+def _search_event_batches(after_id, size=5000):
+    from .models import InteractionEvent
+
+    rows = (
+        InteractionEvent.objects
+        .filter(kind=InteractionEvent.SEARCH, id__gt=after_id)
+        .order_by('id')
+        .values_list('id', 'user_id', 'item_id', 'timestamp')
+    )
+    batch = []
+    for event_id, user_id, item_id, timestamp in rows.iterator(chunk_size=size):
+        batch.append((event_id, user_id, item_id, timestamp.timestamp()))
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def catch_up_interactions(matrix=None, save=True):
+    """
+    Apply search events newer than the snapshot that never reached the
+    delta log (backfills, events written while the store was unavailable).
+    They go through the delta log like any other event, so other processes
+    see them before the next compaction.
+    """
+    if matrix is None:
+        matrix = get_interaction_matrix()
+    applied = 0
+    for batch in _search_event_batches(matrix.watermark):
+        matrix.append(batch, compact=False)
+        applied += len(batch)
+    if save and applied:
+        matrix.save()
+    return applied
+
+
+_interaction_matrix = None
+_interaction_matrix_lock = threading.Lock()
+
+
+def load_events(user_id=None):
+    """
+    ``(user_ids, item_ids, weights, timestamps)`` of every interaction event
+    (or only ``user_id``'s), with timestamps in epoch seconds.
+    """
+    from .models import InteractionEvent
+
+    queryset = InteractionEvent.objects.all()
+    if user_id is not None:
+        queryset = queryset.filter(user_id=user_id)
+    rows = list(queryset.values_list('user_id', 'item_id', 'weight', 'timestamp'))
+    return (
+        np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows)),
+        np.fromiter((r[1] for r in rows), dtype=np.int64, count=len(rows)),
+        np.fromiter((r[2] for r in rows), dtype=np.float32, count=len(rows)),
+        np.fromiter((r[3].timestamp() for r in rows), dtype=np.float64, count=len(rows)),
+    )
+
+
+def get_interaction_matrix():
+    global _interaction_matrix
+    with _interaction_matrix_lock:
+        if _interaction_matrix is None:
+            _interaction_matrix = InteractionMatrix(rec_setting('STORE_DIR'))
+            if _interaction_matrix._base_stamp is None:
+                # Nothing built yet; normally done by build_interaction_matrix.
+                catch_up_interactions(_interaction_matrix)
+        else:
+            _interaction_matrix.refresh()
+        return _interaction_matrix
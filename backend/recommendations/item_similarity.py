@@ -0,0 +1,128 @@
+"""
+Item-item collaborative filtering.
+
+An offline job turns the interaction matrix into a neighbour table holding,
+for every item, its ``top_n`` most similar items by cosine similarity of
+their (binarised) user columns. Serving a user merges the neighbour lists of
+their recent items, weighted by how recently they touched each one.
+"""
+import logging
+import os
+import threading
+
+import numpy as np
+
+from .collaborative import binarize, time_decay, top_cosine_neighbours
+from .conf import rec_setting
+from .embeddings import file_stamp
+
+logger = logging.getLogger(__name__)
+
+
+class ItemNeighbourTable:
+    """
+    ``neighbours[r]`` holds table rows (``-1`` padded) of the items most
+    similar to ``item_ids[r]``, best first, with cosine scores in ``scores[r]``.
+    """
+
+    def __init__(self, item_ids, neighbours, scores):
+        self.item_ids = np.asarray(item_ids, dtype=np.int64)
+        self.neighbours = np.asarray(neighbours, dtype=np.int32)
+        self.scores = np.asarray(scores, dtype=np.float32)
+        self.row_of = {int(item_id): row for row, item_id in enumerate(self.item_ids)}
+
+    def __len__(self):
+        return len(self.item_ids)
+
+    @classmethod
+    def build(cls, counts, item_ids, top_n=20, chunk_size=1024):
+        neighbours, scores = top_cosine_neighbours(binarize(counts.tocsr()), top_n, chunk_size)
+        return cls(item_ids, neighbours, scores)
+
+    def save(self, path):
+        tmp_path = f'{path}.tmp.npz'
+        np.savez(tmp_path, item_ids=self.item_ids, neighbours=self.neighbours, scores=self.scores)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['item_ids'], data['neighbours'], data['scores'])
+
+    def score(self, history_item_ids, history_weights, exclude_item_ids=(), k=None):
+        """
+        Merge the neighbour lists of ``history_item_ids`` into
+        ``(item_ids, scores)``, best first, leaving out ``exclude_item_ids``.
+        """
+        pairs = [(self.row_of[int(i)], w) for i, w in zip(history_item_ids, history_weights) if int(i) in self.row_of]
+        if not pairs:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        rows = np.array([p[0] for p in pairs])
+        weights = np.array([p[1] for p in pairs], dtype=np.float64)
+
+        neighbour_rows = self.neighbours[rows]
+        contributions = self.scores[rows] * weights[:, None]
+        valid = neighbour_rows >= 0
+        neighbour_rows, contributions = neighbour_rows[valid], contributions[valid]
+
+        candidate_rows, inverse = np.unique(neighbour_rows, return_inverse=True)
+        candidate_scores = np.bincount(inverse, weights=contributions)
+
+        exclude_rows = [self.row_of[int(i)] for i in exclude_item_ids if int(i) in self.row_of]
+        keep = ~np.isin(candidate_rows, exclude_rows)
+        candidate_rows, candidate_scores = candidate_rows[keep], candidate_scores[keep]
+
+        order = np.argsort(-candidate_scores, kind='stable')
+        if k is not None:
+            order = order[:k]
+        return self.item_ids[candidate_rows[order]], candidate_scores[order]
+
+
+def user_history(last_seen, user_row, now_ts, limit):
+    """
+    Return ``(seen_cols, recent_cols, recent_weights)``: every item column
+    the user touched, plus the ``limit`` most recent ones with their decay
+    weights.
+    """
+    row = last_seen[user_row]
+    cols, seen = row.indices, row.data
+    if len(cols) > limit:
+        recent = np.argpartition(-seen, limit - 1)[:limit]
+        return cols, cols[recent], time_decay(seen[recent], now_ts)
+    return cols, cols, time_decay(seen, now_ts)
+
+
+def neighbour_table_path():
+    return os.path.join(rec_setting('STORE_DIR'), 'item_neighbours.npz')
+
+
+def build_neighbour_table(matrix=None, top_n=None):
+    from .interactions import get_interaction_matrix
+
+    if matrix is None:
+        matrix = get_interaction_matrix()
+    counts, _, _, item_ids, _ = matrix.labelled_snapshot()
+    table = ItemNeighbourTable.build(counts, item_ids, top_n=top_n or rec_setting('ITEM_NEIGHBOURS'))
+    os.makedirs(rec_setting('STORE_DIR'), exist_ok=True)
+    table.save(neighbour_table_path())
+    return table
+
+
+_table = None
+_table_stamp = None
+_table_lock = threading.Lock()
+
+
+def get_neighbour_table():
+    """The last built neighbour table, reloaded when the job rewrites it."""
+    global _table, _table_stamp
+    path = neighbour_table_path()
+    with _table_lock:
+        if not os.path.exists(path):
+            return None
+        stamp = file_stamp(path)
+        if _table is None or stamp != _table_stamp:
+            _table = ItemNeighbourTable.load(path)
+            _table_stamp = stamp
+            logger.info(f"Loaded item neighbour table for {len(_table)} items.")
+        return _table
@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recommendations.events import KIND_NAMES, backfill
+from recommendations.interactions import get_interaction_matrix, rebuild_interaction_matrix
+from recommendations.models import InteractionEvent
+
+
+class Command(BaseCommand):
+    help = 'Writes interaction events for searches, saves, bookings and reviews missing from the event log'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kinds', default=None,
+                            help=f'Comma-separated event kinds to backfill ({", ".join(KIND_NAMES.values())}).')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Rows written per bulk insert.')
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Empty the log first (picking up changed EVENT_WEIGHTS) and rebuild the '
+                                 'interaction matrix afterwards.')
+
+    def handle(self, *args, **options):
+        kinds = None
+        if options['kinds']:
+            codes = {name: kind for kind, name in KIND_NAMES.items()}
+            names = [name.strip() for name in options['kinds'].split(',') if name.strip()]
+            unknown = [name for name in names if name not in codes]
+            if unknown:
+                raise CommandError(f'Unknown event kinds: {", ".join(unknown)}')
+            kinds = {codes[name] for name in names}
+
+        started = time.perf_counter()
+        if options['rebuild']:
+            events = InteractionEvent.objects.all()
+            if kinds:
+                events = events.filter(kind__in=kinds)
+            events.delete()
+        before = InteractionEvent.objects.count()
+        read = backfill(kinds, batch_size=options['batch_size'])
+        written = InteractionEvent.objects.count() - before
+        if options['rebuild']:
+            rebuild_interaction_matrix(get_interaction_matrix())
+        elapsed = time.perf_counter() - started
+
+        summary = ', '.join(f'{count} {name}' for name, count in read.items())
+        self.stdout.write(self.style.SUCCESS(
+            f'Read {summary} rows in {elapsed:.1f}s; wrote {written} new events'
+        ))
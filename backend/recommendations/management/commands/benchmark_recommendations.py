@@ -0,0 +1,119 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recommendations.ann import backend_params
+from recommendations.benchmark import SCALES, Benchmark, compare, generate
+from recommendations.conf import rec_setting
+
+
+class Command(BaseCommand):
+    help = ('Benchmarks the recommenders on synthetic data: per-stage time and peak memory, '
+            'plus recall@k and coverage on held-out interactions')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=sorted(SCALES), default='small',
+                            help='Dataset preset; --users/--items/--interactions override it.')
+        parser.add_argument('--users', type=int, default=None)
+        parser.add_argument('--items', type=int, default=None)
+        parser.add_argument('--interactions', type=int, default=None)
+        parser.add_argument('--dim', type=int, default=64, help='Item vector dimension.')
+        parser.add_argument('--eval-users', type=int, default=200, help='Users with a held-out item to evaluate.')
+        parser.add_argument('--k', type=int, default=10)
+        parser.add_argument('--backend', default=None, help='ANN backend (defaults to ANN_BACKEND).')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--no-memory', action='store_true',
+                            help='Skip tracemalloc peak tracking, which slows down Python-heavy stages.')
+        parser.add_argument('--output', default=None, help='Write the JSON report to this path.')
+        parser.add_argument('--compare', default=None, metavar='BASELINE',
+                            help='Fail if this run regresses against an earlier --output report.')
+
+    def handle(self, *args, **options):
+        size = dict(SCALES[options['scale']])
+        for key in ('users', 'items', 'interactions'):
+            if options[key]:
+                size[key] = options[key]
+
+        self.stdout.write(
+            f'Generating {size["users"]} users, {size["items"]} items, {size["interactions"]} interactions...'
+        )
+        started = time.perf_counter()
+        data = generate(size['users'], size['items'], size['interactions'], dim=options['dim'], seed=options['seed'])
+        self.stdout.write(f'Generated in {time.perf_counter() - started:.1f}s')
+
+        backend = options['backend'] or rec_setting('ANN_BACKEND')
+        benchmark = Benchmark(
+            data,
+            k=options['k'],
+            n_eval_users=options['eval_users'],
+            backend=backend,
+            ann_params=backend_params(backend),
+            candidates=rec_setting('CONTENT_CANDIDATES'),
+            neighbours=rec_setting('COLLABORATIVE_NEIGHBOURS'),
+            item_neighbours=rec_setting('ITEM_NEIGHBOURS'),
+            history_length=rec_setting('ITEM_HISTORY_LENGTH'),
+            content_weights=rec_setting('CONTENT_WEIGHTS'),
+            als_params={
+                'factors': rec_setting('ALS_FACTORS'),
+                'iterations': rec_setting('ALS_ITERATIONS'),
+                'regularization': rec_setting('ALS_REGULARIZATION'),
+                'alpha': rec_setting('ALS_ALPHA'),
+            },
+            codec_params={
+                'method': rec_setting('EMBEDDING_CODEC'),
+                'dim': rec_setting('EMBEDDING_CODEC_DIM'),
+                'dtype': rec_setting('EMBEDDING_CODEC_DTYPE'),
+            },
+            trace_memory=not options['no_memory'],
+            seed=options['seed'],
+        )
+        report = benchmark.run()
+        self._print(report)
+
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                json.dump(report, fh, indent=2)
+            self.stdout.write(f'Report written to {options["output"]}')
+
+        if options['compare']:
+            try:
+                with open(options['compare']) as fh:
+                    baseline = json.load(fh)
+            except (OSError, ValueError) as e:
+                raise CommandError(f'Could not read baseline report: {e}')
+            if baseline.get('dataset') != report['dataset'] or baseline.get('params') != report['params']:
+                raise CommandError('The baseline report was recorded with a different dataset or parameters.')
+            regressions = compare(report, baseline)
+            if regressions:
+                for line in regressions:
+                    self.stderr.write(f'  {line}')
+                raise CommandError(f'{len(regressions)} regression(s) against {options["compare"]}.')
+            self.stdout.write(self.style.SUCCESS('No regressions against the baseline.'))
+
+    def _print(self, report):
+        dataset = report['dataset']
+        self.stdout.write(
+            f'\n{dataset["users"]} users, {dataset["items"]} items, {dataset["interactions"]} interactions, '
+            f'{dataset["eval_users"]} evaluated, k={report["params"]["k"]}, backend={report["params"]["backend"]}'
+        )
+        self.stdout.write(f'\n{"stage":<24}{"seconds":>10}{"p50 ms":>10}{"p95 ms":>10}{"peak MB":>10}')
+        for name, stage in report['stages'].items():
+            self.stdout.write(
+                f'{name:<24}{stage["seconds"]:>10.3f}'
+                f'{_fmt(stage.get("p50_ms")):>10}{_fmt(stage.get("p95_ms")):>10}{_fmt(stage["peak_mb"]):>10}'
+            )
+        self.stdout.write(f'\n{"recommender":<24}{"recall@k":>10}{"coverage":>10}')
+        for name, quality in report['quality'].items():
+            self.stdout.write(f'{name:<24}{quality["recall_at_k"]:>10.4f}{quality["coverage"]:>10.4f}')
+        compression = report['compression']
+        codec = report['params']['codec']
+        self.stdout.write(
+            f'\n{codec["method"]} {codec["dtype"]} codec: {compression["float32_bytes_per_vector"]} -> '
+            f'{compression["bytes_per_vector"]} bytes per vector, '
+            f'recall@k vs float32 {compression["recall_vs_float32"]:.4f}'
+        )
+
+
+def _fmt(value):
+    return '-' if value is None else f'{value:.2f}'
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recommendations.interactions import (
+    catch_up_interactions,
+    get_interaction_matrix,
+    rebuild_interaction_matrix,
+)
+
+
+class Command(BaseCommand):
+    help = 'Applies search events missing from the interaction matrix, or rebuilds it from scratch'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Discard the stored matrix and rebuild it from the event log.')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        matrix = get_interaction_matrix()
+        if options['rebuild']:
+            rebuild_interaction_matrix(matrix)
+            applied = matrix.counts.nnz
+        else:
+            applied = catch_up_interactions(matrix)
+            matrix.save()
+        elapsed = time.perf_counter() - started
+
+        users, items = matrix.shape
+        self.stdout.write(self.style.SUCCESS(
+            f'Applied {applied} interactions in {elapsed:.1f}s; matrix is {users} users x {items} items '
+            f'with {matrix.counts.nnz} non-zeros'
+        ))
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recommendations.embeddings import get_item_store, sync_item_embeddings
+
+
+class Command(BaseCommand):
+    help = 'Encodes items missing from the persistent item embedding store and drops rows for deleted items'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Discard the store and re-encode every item.')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        written = sync_item_embeddings(rebuild=options['rebuild'])
+        store = get_item_store()
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Encoded {written} items in {elapsed:.1f}s; store now holds {len(store)} vectors'
+        ))
@@ -0,0 +1,79 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from recommendations.collaborative import user_knn_scores
+from recommendations.conf import rec_setting
+from recommendations.interactions import get_interaction_matrix
+from recommendations.item_similarity import build_neighbour_table, user_history
+
+
+class Command(BaseCommand):
+    help = 'Builds the item-item neighbour table used by item-based collaborative filtering'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-n', type=int, default=None,
+                            help='Neighbours kept per item (defaults to ITEM_NEIGHBOURS).')
+        parser.add_argument('--benchmark', type=int, default=0, metavar='USERS',
+                            help='After building, time item-item serving against user-kNN for this many users.')
+
+    def handle(self, *args, **options):
+        matrix = get_interaction_matrix()
+        counts, last_seen = matrix.snapshot()
+        if counts.nnz == 0:
+            raise CommandError('The interaction matrix is empty; run build_interaction_matrix first.')
+
+        started = time.perf_counter()
+        table = build_neighbour_table(matrix, top_n=options['top_n'])
+        build_seconds = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Built neighbour table for {len(table)} items in {build_seconds:.2f}s'
+        ))
+
+        if options['benchmark']:
+            self._benchmark(matrix, counts, last_seen, table, options['benchmark'])
+
+    def _benchmark(self, matrix, counts, last_seen, table, sample_size):
+        now_ts = timezone.now().timestamp()
+        rng = np.random.default_rng(0)
+        user_rows = rng.choice(counts.shape[0], size=min(sample_size, counts.shape[0]), replace=False)
+
+        # On-the-fly user-kNN (used until build_user_neighbours has run):
+        # every request pays for the similarity pass over all users.
+        started = time.perf_counter()
+        for user_row in user_rows:
+            user_knn_scores(counts, last_seen, user_row, rec_setting('COLLABORATIVE_NEIGHBOURS'), now_ts)
+        user_knn_ms = (time.perf_counter() - started) / len(user_rows) * 1000
+
+        started = time.perf_counter()
+        for user_row in user_rows:
+            seen_cols, recent_cols, weights = user_history(last_seen, user_row, now_ts,
+                                                           rec_setting('ITEM_HISTORY_LENGTH'))
+            table.score([matrix.item_ids[c] for c in recent_cols], weights,
+                        exclude_item_ids=[matrix.item_ids[c] for c in seen_cols], k=50)
+        item_item_ms = (time.perf_counter() - started) / len(user_rows) * 1000
+
+        self.stdout.write(f'{len(user_rows)} users, {counts.shape[0]} x {counts.shape[1]} matrix, {counts.nnz} non-zeros')
+        legacy_ms = self._legacy_user_knn_ms(counts, user_rows)
+        if legacy_ms is not None:
+            self.stdout.write(f'legacy dense NearestNeighbors fit+query: {legacy_ms:.3f} ms/user')
+        self.stdout.write(f'user-kNN serve:  {user_knn_ms:.3f} ms/user')
+        self.stdout.write(f'item-item serve: {item_item_ms:.3f} ms/user')
+
+    def _legacy_user_knn_ms(self, counts, user_rows, limit=20):
+        """Per-request cost of the old path: densify, fit NearestNeighbors, query one row."""
+        try:
+            from sklearn.neighbors import NearestNeighbors
+        except ImportError:
+            return None
+        binary = (counts > 0).astype(np.int64)
+        n_neighbours = min(rec_setting('COLLABORATIVE_NEIGHBOURS'), counts.shape[0] - 1) + 1
+        user_rows = user_rows[:limit]
+        started = time.perf_counter()
+        for user_row in user_rows:
+            dense = binary.toarray()
+            model = NearestNeighbors(metric='cosine').fit(dense)
+            model.kneighbors([dense[user_row]], n_neighbors=n_neighbours)
+        return (time.perf_counter() - started) / len(user_rows) * 1000
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recommendations.interactions import get_interaction_matrix
+from recommendations.user_neighbours import fit_user_neighbours, get_user_neighbour_model, refit_due
+
+
+class Command(BaseCommand):
+    help = 'Fits the persisted user-kNN model used by user-based collaborative filtering'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-n', type=int, default=None,
+                            help='Neighbours kept per user (defaults to USER_NEIGHBOURS).')
+        parser.add_argument('--if-due', action='store_true',
+                            help='Only refit when the model is older than USER_KNN_REFIT_SECONDS or '
+                                 'USER_KNN_REFIT_INTERACTIONS new interactions arrived (for cron).')
+
+    def handle(self, *args, **options):
+        matrix = get_interaction_matrix()
+        if matrix.counts.nnz == 0:
+            raise CommandError('The interaction matrix is empty; run build_interaction_matrix first.')
+
+        reason = refit_due(get_user_neighbour_model(), matrix)
+        if options['if_due'] and reason is None:
+            self.stdout.write('User neighbour model is up to date.')
+            return
+
+        started = time.perf_counter()
+        model = fit_user_neighbours(matrix, top_n=options['top_n'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Fitted user neighbour model for {len(model)} users in {elapsed:.2f}s'
+            + (f' ({reason})' if options['if_due'] else '')
+        ))
@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recommendations.embeddings import get_item_store
+from recommendations.models import UserProfileVector
+from recommendations.profiles import build_profile
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Builds user profile vectors from interests and interaction history (missing ones, or all with --rebuild)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', default=None,
+                            help='Comma-separated user ids to build instead of every active user.')
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Rebuild existing profiles too, replaying their full history.')
+
+    def handle(self, *args, **options):
+        store = get_item_store()
+        if not len(store):
+            raise CommandError('The item embedding store is empty; run build_item_embeddings first.')
+
+        users = User.objects.filter(is_active=True)
+        if options['users']:
+            try:
+                ids = [int(user_id) for user_id in options['users'].split(',') if user_id.strip()]
+            except ValueError:
+                raise CommandError('--users must be a comma-separated list of ids.')
+            users = users.filter(id__in=ids)
+        if not options['rebuild']:
+            users = users.exclude(id__in=UserProfileVector.objects.filter(dim=store.dim).values('user_id'))
+
+        started = time.perf_counter()
+        built = skipped = 0
+        for user in users.iterator():
+            if build_profile(user, store) is None:
+                skipped += 1
+            else:
+                built += 1
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Built {built} profile vectors in {elapsed:.1f}s; {skipped} users had no interests or history'
+        ))
@@ -0,0 +1,50 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from recommendations.ann import ExactIndex, build_index, recall_at_k
+from recommendations.conf import rec_setting
+from recommendations.embeddings import get_item_store
+
+
+class Command(BaseCommand):
+    help = 'Measures recall@k and query latency of the configured ANN backend against exact search'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backend', default=None, help='ANN backend to check (defaults to ANN_BACKEND).')
+        parser.add_argument('--k', type=int, default=10)
+        parser.add_argument('--queries', type=int, default=200, help='Item vectors sampled as queries.')
+
+    def handle(self, *args, **options):
+        store = get_item_store()
+        if not len(store):
+            raise CommandError('The item embedding store is empty; run build_item_embeddings first.')
+
+        ids = list(store.ids)
+        vectors = np.asarray(store.vectors())
+        backend = options['backend'] or rec_setting('ANN_BACKEND')
+
+        started = time.perf_counter()
+        index = build_index(ids, vectors, backend=backend)
+        build_seconds = time.perf_counter() - started
+
+        exact = ExactIndex(vectors.shape[1])
+        exact.add(ids, vectors)
+
+        rng = np.random.default_rng(0)
+        queries = vectors[rng.choice(len(ids), size=min(options['queries'], len(ids)), replace=False)]
+
+        timings = {}
+        for name, candidate in (('exact', exact), (backend, index)):
+            started = time.perf_counter()
+            for query in queries:
+                candidate.search(query, options['k'])
+            timings[name] = (time.perf_counter() - started) / len(queries) * 1000
+
+        recall = recall_at_k(index, exact, queries, k=options['k'])
+        self.stdout.write(f'{len(ids)} vectors, {len(queries)} queries, k={options["k"]}')
+        self.stdout.write(f'{backend} build: {build_seconds:.2f}s')
+        for name, ms in timings.items():
+            self.stdout.write(f'{name} query: {ms:.3f} ms')
+        self.stdout.write(self.style.SUCCESS(f'recall@{options["k"]}: {recall:.4f}'))
@@ -0,0 +1,52 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from recommendations.ann import ExactIndex, recall_at_k
+from recommendations.compression import CompressedVectors, fit_codec
+from recommendations.embeddings import get_item_store
+
+
+class Command(BaseCommand):
+    help = ('Fits the item vector codec (EMBEDDING_CODEC settings) and reports its size and '
+            'recall@k against full-precision search')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--k', type=int, default=10)
+        parser.add_argument('--queries', type=int, default=200, help='Item vectors sampled as queries.')
+
+    def handle(self, *args, **options):
+        store = get_item_store()
+        if not len(store):
+            raise CommandError('The item embedding store is empty; run build_item_embeddings first.')
+
+        started = time.perf_counter()
+        codec = fit_codec(store)
+        ids = list(store.ids)
+        vectors = np.asarray(store.vectors())
+        compressed = CompressedVectors(codec)
+        compressed.add(ids, vectors)
+        build_seconds = time.perf_counter() - started
+
+        exact = ExactIndex(vectors.shape[1])
+        exact.add(ids, vectors)
+        rng = np.random.default_rng(0)
+        queries = vectors[rng.choice(len(ids), size=min(options['queries'], len(ids)), replace=False)]
+
+        timings = {}
+        for name, candidate in (('float32', exact), ('compressed', compressed)):
+            started = time.perf_counter()
+            for query in queries:
+                candidate.search(query, options['k'])
+            timings[name] = (time.perf_counter() - started) / len(queries) * 1000
+
+        full_bytes = vectors.shape[1] * 4
+        self.stdout.write(f'{len(ids)} vectors, {codec.method} {store.dim}-d -> {codec.dim}-d {codec.dtype} '
+                          f'in {build_seconds:.2f}s')
+        self.stdout.write(f'{full_bytes} -> {codec.bytes_per_vector()} bytes per vector '
+                          f'({full_bytes / codec.bytes_per_vector():.1f}x)')
+        for name, ms in timings.items():
+            self.stdout.write(f'{name} scan: {ms:.3f} ms')
+        recall = recall_at_k(compressed, exact, queries, k=options['k'])
+        self.stdout.write(self.style.SUCCESS(f'recall@{options["k"]} vs float32: {recall:.4f}'))
@@ -0,0 +1,133 @@
+import multiprocessing
+import os
+import re
+import time
+from datetime import datetime, time as dt_time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from items.models import SearchHistory
+from recommendations.precompute import Checkpoint, compute_chunk, init_worker, warm_up
+from recommendations.services import bulk_store_recommendations
+from users.models import User
+
+
+def parse_since(value):
+    """Accept an ISO date/datetime or a relative age such as ``12h`` or ``7d``."""
+    match = re.fullmatch(r'(\d+)([hd])', value)
+    if match:
+        amount, unit = int(match.group(1)), match.group(2)
+        return timezone.now() - timedelta(**{'hours' if unit == 'h' else 'days': amount})
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise CommandError(f"Could not parse --since value '{value}'.")
+        parsed = datetime.combine(day, dt_time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+class Command(BaseCommand):
+    help = 'Precomputes hybrid recommendations for active users in parallel worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', default=None,
+                            help='Comma-separated user ids to compute instead of every active user.')
+        parser.add_argument('--since', default=None,
+                            help='Only users who searched since this ISO date/datetime or age (e.g. 24h, 7d).')
+        parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 2) - 1),
+                            help='Worker processes; 1 computes in this process.')
+        parser.add_argument('--chunk-size', type=int, default=25, help='Users handed to a worker per task.')
+        parser.add_argument('--batch-size', type=int, default=500, help='Results written per bulk write.')
+        parser.add_argument('--resume', action='store_true',
+                            help='Skip users completed by the last interrupted run.')
+
+    def handle(self, *args, **options):
+        user_ids = self._select_users(options)
+        checkpoint = Checkpoint()
+        if options['resume']:
+            checkpoint.load()
+            user_ids = [user_id for user_id in user_ids if user_id not in checkpoint.done]
+            self.stdout.write(f'Resuming: {len(checkpoint.done)} users already done.')
+        else:
+            checkpoint.clear()
+
+        total = len(user_ids)
+        if not total:
+            self.stdout.write(self.style.SUCCESS('No users to precompute.'))
+            return
+        self.stdout.write(f'Precomputing recommendations for {total} users with {options["workers"]} workers...')
+
+        chunk_size = options['chunk_size']
+        chunks = [user_ids[i:i + chunk_size] for i in range(0, total, chunk_size)]
+        started = time.perf_counter()
+        pending = []
+        stats = {'done': 0, 'failed': 0, 'updated': 0, 'created': 0}
+
+        def flush():
+            updated, created = bulk_store_recommendations(pending, batch_size=options['batch_size'])
+            stats['updated'] += updated
+            stats['created'] += created
+            checkpoint.mark([user_id for user_id, _, _ in pending])
+            pending.clear()
+
+        for chunk_results in self._run(chunks, options['workers']):
+            for user_id, data, search_history, error in chunk_results:
+                if error is not None:
+                    stats['failed'] += 1
+                    self.stderr.write(f'User {user_id} failed: {error}')
+                    continue
+                pending.append((user_id, data, search_history))
+            stats['done'] += len(chunk_results)
+            if len(pending) >= options['batch_size']:
+                flush()
+            self._report_progress(stats['done'], total, started)
+
+        if pending:
+            flush()
+        checkpoint.clear()
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Done in {elapsed:.1f}s: {stats["updated"]} updated, {stats["created"]} created, '
+            f'{stats["failed"]} failed'
+        ))
+
+    def _select_users(self, options):
+        users = User.objects.filter(is_active=True)
+        if options['users']:
+            try:
+                ids = [int(user_id) for user_id in options['users'].split(',') if user_id.strip()]
+            except ValueError:
+                raise CommandError('--users must be a comma-separated list of ids.')
+            users = users.filter(id__in=ids)
+        if options['since']:
+            since = parse_since(options['since'])
+            users = users.filter(id__in=SearchHistory.objects.filter(timestamp__gte=since).values('user_id'))
+        return list(users.order_by('id').values_list('id', flat=True))
+
+    def _run(self, chunks, workers):
+        if workers <= 1:
+            warm_up()
+            for chunk in chunks:
+                yield compute_chunk(chunk)
+            return
+
+        # Load the shared data in the parent first so forked workers inherit
+        # it (the embedding store is a memory map, so pages are shared too).
+        # The encoder is loaded by each worker in init_worker.
+        warm_up(encoder=False)
+        connections.close_all()
+        with multiprocessing.Pool(processes=workers, initializer=init_worker) as pool:
+            yield from pool.imap_unordered(compute_chunk, chunks)
+
+    def _report_progress(self, done, total, started):
+        elapsed = time.perf_counter() - started
+        rate = done / elapsed if elapsed else 0
+        eta = (total - done) / rate if rate else 0
+        self.stdout.write(f'  {done}/{total} users ({done / total:.0%}), {rate:.1f} users/s, ETA {eta:.0f}s')
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recommendations.als import train_als_model
+
+
+class Command(BaseCommand):
+    help = 'Trains the implicit ALS factors from searches, saves and bookings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--factors', type=int, default=None, help='Latent factors (defaults to ALS_FACTORS).')
+        parser.add_argument('--iterations', type=int, default=None,
+                            help='Alternating sweeps (defaults to ALS_ITERATIONS).')
+        parser.add_argument('--regularization', type=float, default=None,
+                            help='L2 regularisation (defaults to ALS_REGULARIZATION).')
+        parser.add_argument('--alpha', type=float, default=None,
+                            help='Confidence scaling (defaults to ALS_ALPHA).')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        model = train_als_model(
+            factors=options['factors'],
+            iterations=options['iterations'],
+            regularization=options['regularization'],
+            alpha=options['alpha'],
+        )
+        if model is None:
+            raise CommandError('No searches, saves or bookings to train on.')
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Trained {model.factors} factors for {len(model.user_ids)} users x {len(model.item_ids)} items '
+            f'({model.seen.nnz} user-item pairs) in {elapsed:.1f}s'
+        ))
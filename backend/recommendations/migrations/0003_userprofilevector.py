@@ -0,0 +1,29 @@
+# Generated by Django 5.1.6 on 2026-10-17 21:28
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recommendations', '0002_recommendation_cached_search_history'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserProfileVector',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('interests_text', models.TextField(blank=True, default='')),
+                ('interests_vector', models.BinaryField(blank=True, null=True)),
+                ('vector', models.BinaryField()),
+                ('weight', models.FloatField(default=0)),
+                ('dim', models.PositiveIntegerField()),
+                ('updated_at', models.DateTimeField()),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='profile_vector', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
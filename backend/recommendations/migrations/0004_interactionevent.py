@@ -0,0 +1,48 @@
+# Generated by Django 5.1.6 on 2026-10-17 21:41
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def create_timestamp_brin(apps, schema_editor):
+    # BRIN suits an append-only table whose rows arrive in time order.
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS interaction_time_brin '
+            'ON recommendations_interactionevent USING brin ("timestamp")'
+        )
+
+
+def drop_timestamp_brin(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS interaction_time_brin')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0016_saveditem'),
+        ('recommendations', '0003_userprofilevector'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InteractionEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.PositiveSmallIntegerField(choices=[(1, 'search'), (2, 'save'), (3, 'booking'), (4, 'review')])),
+                ('weight', models.FloatField()),
+                ('timestamp', models.DateTimeField()),
+                ('source_id', models.BigIntegerField()),
+                ('item', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='interaction_events', to='items.item')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='interaction_events', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'timestamp'], name='interaction_user_time'), models.Index(fields=['item', 'timestamp'], name='interaction_item_time')],
+                'constraints': [models.UniqueConstraint(fields=('kind', 'source_id'), name='interaction_unique_source')],
+            },
+        ),
+        migrations.RunPython(create_timestamp_brin, drop_timestamp_brin),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from items.models import Item
 from users.models import User
 class Recommendation(models.Model):
     user = models.ForeignKey(User, related_name='recommendations', on_delete=models.CASCADE)
@@ -10,3 +11,63 @@ class Recommendation(models.Model):
 
     def __str__(self):
         return f"Recommendation for {self.user.username}"
+
+
+class UserProfileVector(models.Model):
+    """
+    A user's content profile: ``vector`` is a time-decayed running mean of
+    the embeddings of items they searched, saved, booked or reviewed, with
+    ``weight`` its total weight as of ``updated_at``. The interests
+    embedding is kept apart and mixed in when the profile is read. Vectors
+    are stored as raw float32 bytes.
+    """
+    user = models.OneToOneField(User, related_name='profile_vector', on_delete=models.CASCADE)
+    interests_text = models.TextField(blank=True, default='')
+    interests_vector = models.BinaryField(null=True, blank=True)
+    vector = models.BinaryField()
+    weight = models.FloatField(default=0)
+    dim = models.PositiveIntegerField()
+    updated_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Profile vector for {self.user.username}"
+
+
+class InteractionEvent(models.Model):
+    """
+    Append-only log of the interactions the recommenders learn from: one
+    narrow row per item search, save, booking or review, weighted by kind
+    (EVENT_WEIGHTS, scaled by the rating for reviews) when it is written.
+    ``source_id`` is the primary key of the row the event was derived from,
+    which makes backfills idempotent.
+
+    Rows are only ever inserted. ``timestamp`` is the time partition key:
+    per-user and per-item scans use the composite indexes, and on
+    PostgreSQL a BRIN index keeps time-range scans and pruning cheap.
+    """
+    SEARCH, SAVE, BOOKING, REVIEW = 1, 2, 3, 4
+    KIND_CHOICES = [
+        (SEARCH, 'search'),
+        (SAVE, 'save'),
+        (BOOKING, 'booking'),
+        (REVIEW, 'review'),
+    ]
+
+    user = models.ForeignKey(User, related_name='interaction_events', on_delete=models.CASCADE, db_index=False)
+    item = models.ForeignKey(Item, related_name='interaction_events', on_delete=models.CASCADE, db_index=False)
+    kind = models.PositiveSmallIntegerField(choices=KIND_CHOICES)
+    weight = models.FloatField()
+    timestamp = models.DateTimeField()
+    source_id = models.BigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'timestamp'], name='interaction_user_time'),
+            models.Index(fields=['item', 'timestamp'], name='interaction_item_time'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'source_id'], name='interaction_unique_source'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} of item {self.item_id} by user {self.user_id}"
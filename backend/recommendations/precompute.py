@@ -0,0 +1,109 @@
+"""
+Worker-side helpers for the precompute_recommendations command.
+
+They live at module level so process pools using the ``spawn`` start
+method (Windows, macOS) can import them.
+"""
+import io
+import json
+import os
+import time
+from contextlib import redirect_stdout
+
+from .conf import rec_setting
+
+
+def warm_up(encoder=True):
+    """
+    Load everything a recommendation run touches once per process: the
+    encoder, the item embedding store and its ANN index (or compressed
+    vectors), the item grid, the availability bitmaps, the interaction
+    matrix, the user and item neighbour tables and the ALS factors.
+
+    Pass ``encoder=False`` before forking workers: torch's thread pools do
+    not survive a fork, so each worker loads its own encoder.
+    """
+    from .als import get_als_model
+    from .ann import get_item_index
+    from .compression import get_compressed_items
+    from .availability import get_availability
+    from .embeddings import get_encoder, get_item_store
+    from .geo import get_item_grid
+    from .interactions import get_interaction_matrix
+    from .item_similarity import get_neighbour_table
+    from .user_neighbours import get_user_neighbour_model
+
+    if encoder:
+        get_encoder()
+    store = get_item_store()
+    if len(store):
+        if rec_setting('CONTENT_SCORER') == 'compressed':
+            get_compressed_items(store)
+        else:
+            get_item_index(store)
+    get_item_grid()
+    get_availability()
+    get_interaction_matrix()
+    get_user_neighbour_model()
+    get_neighbour_table()
+    get_als_model()
+
+
+def init_worker():
+    import django
+    from django.apps import apps
+
+    if not apps.ready:
+        django.setup()
+    from django.db import connections
+
+    # Connections inherited through fork must not be shared with the parent.
+    connections.close_all()
+    warm_up()
+
+
+def compute_chunk(user_ids):
+    """Return ``(user_id, records, search_history, error)`` for each user."""
+    from .services import generate_recommendations, search_history_snapshot
+
+    results = []
+    for user_id in user_ids:
+        try:
+            search_history = search_history_snapshot(user_id)
+            # The recommenders print progress per user; keep the worker
+            # output down to the command's own progress lines.
+            with redirect_stdout(io.StringIO()):
+                data = generate_recommendations(user_id)
+            results.append((user_id, data, search_history, None))
+        except Exception as e:
+            results.append((user_id, None, None, str(e)))
+    return results
+
+
+class Checkpoint:
+    """Users completed by an interrupted run, so ``--resume`` can skip them."""
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(rec_setting('STORE_DIR'), 'precompute_checkpoint.json')
+        self.started_at = time.time()
+        self.done = set()
+
+    def load(self):
+        if os.path.exists(self.path):
+            with open(self.path) as fh:
+                data = json.load(fh)
+            self.started_at = data['started_at']
+            self.done = set(data['done'])
+        return self
+
+    def mark(self, user_ids):
+        self.done.update(user_ids)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as fh:
+            json.dump({'started_at': self.started_at, 'done': sorted(self.done)}, fh)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,184 @@
+"""
+Per-user content profile vectors.
+
+A profile is an exponentially time-decayed running mean of the stored
+embeddings of the items a user searched, saved, booked or reviewed,
+updated incrementally as events arrive, plus an embedding of the user's
+interests (encoded once and cached on the row until the interests change)
+that is kept apart and added with the fixed PROFILE_INTEREST_WEIGHT when
+the profile is read. A rebuild and an incrementally maintained profile
+therefore agree, and serving one needs no transformer inference, only a
+row read.
+"""
+import logging
+from datetime import datetime, timezone as dt_timezone
+
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+
+from utils.encode_batcher import encode
+from utils.model_registry import ModelLoadError
+
+from .conf import rec_setting
+from .embeddings import get_item_store, normalize_rows
+from .interactions import load_events
+from .models import UserProfileVector
+
+logger = logging.getLogger(__name__)
+
+
+def decay(elapsed_seconds):
+    """Weight left after ``elapsed_seconds`` given PROFILE_HALF_LIFE_DAYS."""
+    half_life = rec_setting('PROFILE_HALF_LIFE_DAYS') * 86400
+    return 0.5 ** (np.maximum(elapsed_seconds, 0) / half_life)
+
+
+def interests_text(interests):
+    return ' '.join(interests or []).strip()
+
+
+def encode_interests(text):
+    """Normalised embedding of ``text``, or None without text or encoder."""
+    if not text:
+        return None
+    try:
+        return normalize_rows(encode('recommendation_encoder', [text]))[0]
+    except ModelLoadError:
+        return None
+
+
+def _to_bytes(vector):
+    return np.asarray(vector, dtype=np.float32).tobytes()
+
+
+def _from_bytes(data):
+    return np.frombuffer(bytes(data), dtype=np.float32)
+
+
+def accumulate(vector, weight, updated_ts, new_vector, new_weight, new_ts):
+    """
+    Fold ``new_vector`` into a decayed running mean. Returns
+    ``(vector, weight, updated_ts)``; an event older than ``updated_ts`` is
+    decayed itself instead of decaying the existing mean.
+    """
+    if new_ts >= updated_ts:
+        weight = weight * decay(new_ts - updated_ts)
+        updated_ts = new_ts
+    else:
+        new_weight = new_weight * decay(updated_ts - new_ts)
+    total = weight + new_weight
+    if total <= 0:
+        return vector, weight, updated_ts
+    return (weight * vector + new_weight * new_vector) / total, total, updated_ts
+
+
+def build_profile(user, store=None):
+    """
+    (Re)build ``user``'s profile from their interests and full event
+    history. Reuses the cached interests embedding when the interests are
+    unchanged. Returns the saved profile, or None when there is no signal.
+    """
+    if store is None:
+        store = get_item_store()
+    existing = UserProfileVector.objects.filter(user=user).first()
+    text = interests_text(user.interests)
+    interests_vector = None
+    if existing is not None and existing.interests_text == text and existing.interests_vector is not None:
+        interests_vector = _from_bytes(existing.interests_vector)
+        if len(interests_vector) != store.dim:
+            interests_vector = None
+    if interests_vector is None:
+        interests_vector = encode_interests(text)
+
+    now_ts = timezone.now().timestamp()
+    _, item_ids, event_weights, timestamps = load_events(user_id=user.pk)
+    found_ids, item_vectors = store.get(item_ids.tolist())
+    if found_ids:
+        found = np.isin(item_ids, found_ids)
+        # store.get returns each id once; expand back to one row per event.
+        rows = {item_id: row for row, item_id in enumerate(found_ids)}
+        vectors = item_vectors[[rows[item_id] for item_id in item_ids[found].tolist()]]
+        weights = (event_weights[found] * decay(now_ts - timestamps[found])).astype(np.float64)
+        total = weights.sum()
+        mean = (weights[:, None] * vectors).sum(axis=0) / total if total > 0 else vectors.mean(axis=0)
+    elif interests_vector is not None:
+        total, mean = 0.0, np.zeros(len(interests_vector))
+    else:
+        return None
+
+    profile, _ = UserProfileVector.objects.update_or_create(
+        user=user,
+        defaults={
+            'interests_text': text,
+            'interests_vector': None if interests_vector is None else _to_bytes(interests_vector),
+            'vector': _to_bytes(mean),
+            'weight': float(total),
+            'dim': len(mean),
+            'updated_at': timezone.now(),
+        },
+    )
+    return profile
+
+
+def record_event(user_id, item_id, event_weight, when):
+    """
+    Fold one interaction event into the user's profile. Builds the
+    profile from scratch when there is none yet (or the embedding dimension
+    changed), which already includes this event.
+    """
+    from users.models import User
+
+    store = get_item_store()
+    found_ids, item_vectors = store.get([item_id])
+    if not found_ids:
+        return None
+    with transaction.atomic():
+        profile = UserProfileVector.objects.select_for_update().filter(user_id=user_id).first()
+        if profile is None or profile.dim != store.dim:
+            return build_profile(User.objects.get(pk=user_id), store)
+        vector, weight, updated_ts = accumulate(
+            _from_bytes(profile.vector).astype(np.float64), profile.weight, profile.updated_at.timestamp(),
+            item_vectors[0], event_weight, when.timestamp(),
+        )
+        profile.vector = _to_bytes(vector)
+        profile.weight = float(weight)
+        profile.updated_at = datetime.fromtimestamp(updated_ts, tz=dt_timezone.utc)
+        profile.save(update_fields=['vector', 'weight', 'updated_at'])
+    return profile
+
+
+def get_profile_vector(user_id):
+    """
+    The user's normalised profile vector, building the profile on first
+    use. Returns None when the user has neither interests nor history.
+    Raises User.DoesNotExist for unknown users.
+    """
+    from users.models import User
+
+    store = get_item_store()
+    profile = UserProfileVector.objects.filter(user_id=user_id).first()
+    if profile is None or profile.dim != store.dim:
+        profile = build_profile(User.objects.get(pk=user_id), store)
+    if profile is None:
+        return None
+    return profile_vector(profile)
+
+
+def profile_vector(profile, now_ts=None):
+    """
+    Normalised mix of ``profile``'s event mean, decayed to ``now_ts``, and
+    its interests embedding at PROFILE_INTEREST_WEIGHT. None when neither
+    carries any weight.
+    """
+    now_ts = timezone.now().timestamp() if now_ts is None else now_ts
+    weight = profile.weight * decay(now_ts - profile.updated_at.timestamp())
+    mixed = weight * _from_bytes(profile.vector).astype(np.float64)
+    total = weight
+    if profile.interests_vector is not None:
+        interest_weight = rec_setting('PROFILE_INTEREST_WEIGHT')
+        mixed = mixed + interest_weight * _from_bytes(profile.interests_vector)
+        total += interest_weight
+    if total <= 0:
+        return None
+    return normalize_rows(mixed / total)[0]
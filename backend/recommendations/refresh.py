@@ -0,0 +1,83 @@
+"""
+Background refresh of cached recommendations.
+
+A small thread pool recomputes recommendations off the request path.
+Requests for a user whose refresh is already queued or running share that
+refresh, and new work is turned away once the queue is full, so a burst of
+stale reads can't pile up unbounded ML work.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import close_old_connections
+
+from .conf import rec_setting
+
+logger = logging.getLogger(__name__)
+
+
+class RefreshQueue:
+
+    def __init__(self, workers, max_pending):
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='rec-refresh')
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def pending(self):
+        with self._lock:
+            return len(self._inflight)
+
+    def is_refreshing(self, user_id):
+        with self._lock:
+            return user_id in self._inflight
+
+    def submit(self, user_id):
+        """
+        Queue a refresh for ``user_id``. Returns the future for the refresh
+        (an existing one if the user is already queued), or None when the
+        queue is full.
+        """
+        with self._lock:
+            future = self._inflight.get(user_id)
+            if future is not None:
+                return future
+            if len(self._inflight) >= self.max_pending:
+                logger.warning(f"Recommendation refresh queue full; dropping refresh for user {user_id}.")
+                return None
+            future = self._executor.submit(self._refresh, user_id)
+            self._inflight[user_id] = future
+        future.add_done_callback(lambda _: self._finish(user_id))
+        return future
+
+    def _finish(self, user_id):
+        with self._lock:
+            self._inflight.pop(user_id, None)
+
+    def _refresh(self, user_id):
+        from .services import generate_recommendations, search_history_snapshot, store_recommendations
+
+        close_old_connections()
+        try:
+            search_history = search_history_snapshot(user_id)
+            data = generate_recommendations(user_id)
+            store_recommendations(user_id, data, search_history)
+            return data
+        except Exception as e:
+            logger.error(f"Background recommendation refresh failed for user {user_id}: {e}")
+            raise
+        finally:
+            close_old_connections()
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_refresh_queue():
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = RefreshQueue(rec_setting('REFRESH_WORKERS'), rec_setting('REFRESH_QUEUE_SIZE'))
+        return _queue
@@ -0,0 +1,85 @@
+"""
+Lightweight recommendation results.
+
+The recommenders hand back short lists (at most a handful of rows) of
+``RecommendedItem`` records, and the hybrid blend merges them with plain
+dicts keyed by item id, so the serving path does not need pandas.
+"""
+from django.conf import settings
+
+# Score given to an item that only one of the blended recommenders returned.
+MISSING_SCORE = 0.4
+
+
+class RecommendedItem:
+    __slots__ = ('id', 'title', 'category', 'description', 'price', 'image', 'raw_score', 'final_score')
+
+    def __init__(self, id, title='', category='', description='', price=0, image='',
+                 final_score=None, raw_score=None):
+        self.id = id
+        self.title = title
+        self.category = category
+        self.description = description
+        self.price = price
+        self.image = image
+        self.final_score = final_score
+        self.raw_score = raw_score
+
+    @classmethod
+    def from_values(cls, item, final_score, raw_score=None):
+        """Build from an ``Item.objects.values(...)`` row."""
+        return cls(
+            id=item['id'],
+            title=item['title'] or "",
+            category=item['category'] or "",
+            description=item['description'] or "",
+            price=item['price'] or 0,
+            image=f"{settings.MEDIA_URL}{item['image']}" if item.get('image') else "",
+            final_score=final_score,
+            raw_score=raw_score,
+        )
+
+    def with_score(self, final_score):
+        """A copy carrying ``final_score`` and no raw score."""
+        return RecommendedItem(self.id, self.title, self.category, self.description, self.price, self.image,
+                               final_score=final_score)
+
+    def as_dict(self):
+        row = {
+            'id': self.id,
+            'title': self.title,
+            'category': self.category,
+            'description': self.description,
+            'price': self.price,
+            'image': self.image,
+        }
+        if self.raw_score is not None:
+            row['raw_score'] = self.raw_score
+        row['final_score'] = self.final_score
+        return row
+
+    def __repr__(self):
+        return f'RecommendedItem(id={self.id!r}, final_score={self.final_score!r})'
+
+
+def blend(content, collaborative, limit=5, content_weight=0.5, missing_score=MISSING_SCORE):
+    """
+    Merge two result lists on item id: each item scores
+    ``content_weight * content + (1 - content_weight) * collaborative``,
+    with ``missing_score`` standing in for the side that did not return it.
+    Details come from the content result when both have the item. Ties keep
+    ascending id order.
+    """
+    content_by_id = {item.id: item for item in content}
+    collaborative_by_id = {item.id: item for item in collaborative}
+    blended = []
+    for item_id in sorted(content_by_id.keys() | collaborative_by_id.keys()):
+        content_item = content_by_id.get(item_id)
+        collaborative_item = collaborative_by_id.get(item_id)
+        score = (
+            content_weight * (content_item.final_score if content_item else missing_score)
+            + (1 - content_weight) * (collaborative_item.final_score if collaborative_item else missing_score)
+        )
+        blended.append((content_item or collaborative_item).with_score(score))
+    blended.sort(key=lambda item: item.final_score, reverse=True)
+    return blended[:limit]
@@ -0,0 +1,147 @@
+"""
+Vectorised scoring stage.
+
+Each feature is a NumPy array aligned with an array of candidate item ids;
+``combine`` takes a weighted sum of them. Nothing here loops over items in
+Python.
+"""
+import numpy as np
+
+DAY_SECONDS = 86400
+
+
+def align(candidate_ids, ids, values, fill=0.0):
+    """
+    Values for ``candidate_ids`` looked up from the parallel ``ids`` /
+    ``values`` arrays, with ``fill`` where an id is absent.
+    """
+    candidate_ids = np.asarray(candidate_ids, dtype=np.int64)
+    ids = np.asarray(ids, dtype=np.int64)
+    values = np.asarray(values, dtype=np.float64)
+    aligned = np.full(len(candidate_ids), fill, dtype=np.float64)
+    if not len(ids) or not len(candidate_ids):
+        return aligned
+    order = np.argsort(ids, kind='stable')
+    sorted_ids = ids[order]
+    positions = np.clip(np.searchsorted(sorted_ids, candidate_ids), 0, len(sorted_ids) - 1)
+    found = sorted_ids[positions] == candidate_ids
+    aligned[found] = values[order][positions[found]]
+    return aligned
+
+
+def top_k(scores, k):
+    """Indices of the ``k`` highest scores, best first."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    if k < len(scores):
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+
+class TopK:
+    """
+    Running top ``k`` over ``(ids, scores)`` batches. Memory stays at
+    ``k`` plus one batch no matter how many batches are pushed.
+    """
+
+    def __init__(self, k):
+        self.k = k
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.scores = np.zeros(0)
+
+    def push(self, ids, scores):
+        ids = np.concatenate([self.ids, np.asarray(ids, dtype=np.int64)])
+        scores = np.concatenate([self.scores, np.asarray(scores, dtype=np.float64)])
+        keep = top_k(scores, self.k)
+        self.ids, self.scores = ids[keep], scores[keep]
+
+    def result(self):
+        """``(ids, scores)``, best first."""
+        return self.ids, self.scores
+
+
+def stream_top_k(ids, vectors, score_chunk, k, chunk_size=8192):
+    """
+    Score ``vectors`` (e.g. a memory-mapped store) ``chunk_size`` rows at a
+    time with ``score_chunk(chunk_ids, chunk_vectors)`` and return the best
+    ``k`` as ``(ids, scores)``. Only one chunk is resident at once.
+    """
+    best = TopK(k)
+    for start in range(0, len(ids), chunk_size):
+        chunk_ids = np.asarray(ids[start:start + chunk_size], dtype=np.int64)
+        chunk_vectors = np.asarray(vectors[start:start + len(chunk_ids)])
+        best.push(chunk_ids, score_chunk(chunk_ids, chunk_vectors))
+    return best.result()
+
+
+def last_interactions(user_id):
+    """
+    ``(item_ids, epoch_seconds)`` of the user's latest search per item,
+    fetched with one aggregated query over the event log.
+    """
+    from django.db.models import Max
+    from .models import InteractionEvent
+
+    rows = list(
+        InteractionEvent.objects
+        .filter(user_id=user_id, kind=InteractionEvent.SEARCH)
+        .values('item_id')
+        .annotate(last_seen=Max('timestamp'))
+        .values_list('item_id', 'last_seen')
+    )
+    if not rows:
+        return np.zeros(0, dtype=np.int64), np.zeros(0)
+    item_ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+    last_seen = np.fromiter((r[1].timestamp() for r in rows), dtype=np.float64, count=len(rows))
+    return item_ids, last_seen
+
+
+def recency(last_seen, now_ts, horizon_days=30):
+    """Linear decay from 1 (just now) to 0 at ``horizon_days``; 0 where never seen."""
+    last_seen = np.asarray(last_seen, dtype=np.float64)
+    scores = np.maximum(0.0, 1 - (now_ts - last_seen) / (horizon_days * DAY_SECONDS))
+    scores[np.isnan(last_seen)] = 0.0
+    return scores
+
+
+def time_decay(last_seen, now_ts, horizon_days=90, floor=0.1):
+    """Linear decay on whole days over ``horizon_days``, floored at ``floor``."""
+    days_old = (now_ts - np.asarray(last_seen, dtype=np.float64)) // DAY_SECONDS
+    return np.maximum(floor, 1 - (days_old / horizon_days))
+
+
+def popularity_boost(interaction_counts, weight=0.1):
+    """Multiplier that grows with the log of an item's interaction count."""
+    return 1 + weight * np.log(np.asarray(interaction_counts, dtype=np.float64) + 1)
+
+
+def squash(raw_scores, low=0.4, high=0.9, steepness=5):
+    """
+    Min-max normalise then sigmoid into ``[low, high]``, the band used when
+    blending collaborative scores; a constant input maps to the midpoint.
+    """
+    raw_scores = np.asarray(raw_scores, dtype=np.float64)
+    if not len(raw_scores):
+        return raw_scores
+    score_range = raw_scores.max() - raw_scores.min()
+    if score_range <= 0:
+        return np.full(len(raw_scores), (low + high) / 2)
+    normalized = (raw_scores - raw_scores.min()) / score_range
+    return low + (high - low) / (1 + np.exp(-steepness * (normalized - 0.5)))
+
+
+def combine(features, weights):
+    """Weighted sum of aligned feature arrays; features without a weight are ignored."""
+    total = None
+    for name, weight in weights.items():
+        if name not in features or not weight:
+            continue
+        contribution = weight * np.nan_to_num(np.asarray(features[name], dtype=np.float64))
+        total = contribution if total is None else total + contribution
+    if total is None:
+        length = len(next(iter(features.values()))) if features else 0
+        return np.zeros(length)
+    return total
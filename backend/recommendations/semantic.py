@@ -0,0 +1,156 @@
+"""
+Semantic item search.
+
+A query is embedded with the recommendation encoder (through its
+micro-batcher, and at most once per process while it stays in the LRU
+query cache), then matched against the persisted item embeddings with the
+ANN index the content recommender uses, so "bike" finds "bicycle". The
+vector scores can be blended with the keyword rank from items/search.py.
+
+Each search gets SEMANTIC_BUDGET_MS: an encode that has not finished by
+then is abandoned (its result still fills the cache) and the keyword
+ranking is served instead, and blending is skipped once the budget is
+spent.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from utils.encode_batcher import encode, get_batcher
+from utils.model_registry import ModelLoadError, model_setting
+
+from .ann import get_item_index
+from .conf import rec_setting
+from .embeddings import get_item_store, normalize_rows
+from .instrumentation import stage
+
+logger = logging.getLogger(__name__)
+
+ENCODER = 'recommendation_encoder'
+
+
+class QueryEmbeddingCache:
+    """Least-recently-used map of normalised query text to its embedding."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._vectors = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            vector = self._vectors.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._vectors.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def put(self, key, vector):
+        with self._lock:
+            self._vectors[key] = vector
+            self._vectors.move_to_end(key)
+            while len(self._vectors) > self.maxsize:
+                self._vectors.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._vectors), 'maxsize': self.maxsize, 'hits': self.hits, 'misses': self.misses}
+
+
+_query_cache = None
+_query_cache_lock = threading.Lock()
+
+
+def get_query_cache():
+    global _query_cache
+    with _query_cache_lock:
+        if _query_cache is None:
+            _query_cache = QueryEmbeddingCache(rec_setting('SEMANTIC_QUERY_CACHE_SIZE'))
+        return _query_cache
+
+
+def embed_query(query, timeout=None):
+    """
+    Normalised embedding of ``query``. Raises
+    ``concurrent.futures.TimeoutError`` when the batched encode takes longer
+    than ``timeout`` seconds, and ModelLoadError without an encoder.
+    """
+    key = ' '.join(query.lower().split())
+    cache = get_query_cache()
+    vector = cache.get(key)
+    if vector is not None:
+        return vector
+    if not model_setting('ENCODE_BATCH_WAIT_MS'):
+        # Unbatched encodes run inline and cannot be abandoned.
+        vector = normalize_rows(encode(ENCODER, [key]))[0]
+        cache.put(key, vector)
+        return vector
+
+    def fill_cache(future):
+        if future.exception() is None:
+            cache.put(key, normalize_rows(future.result())[0])
+
+    future = get_batcher(ENCODER).submit([key])
+    future.add_done_callback(fill_cache)
+    return normalize_rows(future.result(timeout))[0]
+
+
+def keyword_scores(query, limit):
+    """``{item_id: rank}`` of the ``limit`` best keyword matches, ranks scaled to at most 1."""
+    from items.search import search_items
+
+    rows = list(search_items(query).values_list('id', 'rank')[:limit])
+    best = max((rank for _, rank in rows), default=0) or 1
+    return {item_id: rank / best for item_id, rank in rows}
+
+
+def semantic_search(query, limit, blend=True):
+    """
+    ``([(item_id, score), ...], semantic)``: up to ``limit`` items for
+    ``query``, best first. ``semantic`` is False when the budget or a
+    missing encoder or item store forced the keyword ranking instead.
+    """
+    started = time.perf_counter()
+    budget = rec_setting('SEMANTIC_BUDGET_MS') / 1000
+
+    def remaining():
+        return budget - (time.perf_counter() - started)
+
+    store = get_item_store()
+    try:
+        if not len(store):
+            raise LookupError('the item embedding store is empty')
+        with stage('semantic.encode'):
+            vector = embed_query(query, timeout=max(remaining(), 0.001))
+    except (FutureTimeoutError, ModelLoadError, LookupError) as e:
+        logger.warning(f"Semantic search fell back to keywords: {str(e) or 'the encode exceeded the budget'}")
+        with stage('semantic.keyword') as s:
+            ranked = sorted(keyword_scores(query, limit).items(), key=lambda pair: (-pair[1], -pair[0]))
+            s.rows = len(ranked)
+        return ranked, False
+
+    with stage('semantic.retrieve') as s:
+        ids, scores = get_item_index(store).search(vector, limit)
+        scores = dict(zip(ids.tolist(), scores.tolist()))
+        s.rows = len(scores)
+
+    weight = rec_setting('SEMANTIC_KEYWORD_WEIGHT')
+    if blend and weight > 0 and remaining() > 0:
+        with stage('semantic.blend') as s:
+            keyword = keyword_scores(query, limit)
+            # Keyword matches outside the nearest items still need a vector score.
+            found, vectors = store.get([item_id for item_id in keyword if item_id not in scores])
+            scores.update(zip(found, (vectors @ vector).tolist()))
+            scores.update((item_id, 0.0) for item_id in keyword if item_id not in scores)
+            scores = {item_id: (1 - weight) * score + weight * keyword.get(item_id, 0.0)
+                      for item_id, score in scores.items()}
+            s.rows = len(keyword)
+
+    ranked = sorted(scores.items(), key=lambda pair: (-pair[1], -pair[0]))[:limit]
+    return ranked, True
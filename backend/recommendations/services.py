@@ -0,0 +1,101 @@
+import numpy as np
+from django.utils import timezone
+
+from items.models import SearchHistory
+
+from .availability import get_availability
+from .conf import rec_setting
+from .hybrid import hybrid_recommendation_system
+from .instrumentation import stage
+from .models import Recommendation
+
+ALGORITHM_NAME = 'Hybrid'
+
+
+def search_history_snapshot(user_id):
+    """
+    Snapshot of the user's latest 50 search queries that a cached
+    recommendation is keyed on.
+    """
+    current_search_queries = SearchHistory.objects.filter(user_id=user_id) \
+                                                .order_by('-timestamp') \
+                                                .values_list('search_query', flat=True)[:50]
+    return sorted(list(set(current_search_queries)))
+
+
+def generate_recommendations(user_id, near=None):
+    """Run the hybrid recommender and return JSON-ready records."""
+    recommended = hybrid_recommendation_system(user_id, near)
+    with stage('hybrid.records'):
+        return [item.as_dict() for item in recommended]
+
+
+def drop_unavailable(user_id, records):
+    """
+    Leave out cached records whose items have been booked solid (or
+    became the user's own) since the records were generated.
+    """
+    if not records:
+        return records
+    with stage('view.availability'):
+        excluded = get_availability().excluded(
+            user_id, rec_setting('AVAILABILITY_WINDOW_DAYS'), timezone.localdate())
+        if not len(excluded):
+            return records
+        dropped = np.isin([record['id'] for record in records], excluded)
+        return [record for record, drop in zip(records, dropped) if not drop]
+
+
+def store_recommendations(user_id, data, search_history):
+    with stage('view.store'):
+        Recommendation.objects.update_or_create(
+            user_id=user_id,
+            defaults={
+                'recommended_items': data,
+                'algorithm_used': ALGORITHM_NAME,
+                'cached_search_history': search_history,
+                'created_at': timezone.now()
+            }
+        )
+
+
+def bulk_store_recommendations(results, batch_size=500):
+    """
+    Write ``(user_id, data, search_history)`` results with one bulk_update
+    and one bulk_create instead of a query pair per user.
+    """
+    if not results:
+        return 0, 0
+    now = timezone.now()
+    user_ids = [user_id for user_id, _, _ in results]
+    existing = {}
+    for recommendation in Recommendation.objects.filter(user_id__in=user_ids).order_by('created_at'):
+        existing[recommendation.user_id] = recommendation
+
+    to_update = []
+    to_create = []
+    for user_id, data, search_history in results:
+        recommendation = existing.get(user_id)
+        if recommendation is None:
+            to_create.append(Recommendation(
+                user_id=user_id,
+                recommended_items=data,
+                algorithm_used=ALGORITHM_NAME,
+                cached_search_history=search_history,
+            ))
+        else:
+            recommendation.recommended_items = data
+            recommendation.algorithm_used = ALGORITHM_NAME
+            recommendation.cached_search_history = search_history
+            recommendation.created_at = now
+            to_update.append(recommendation)
+
+    if to_update:
+        Recommendation.objects.bulk_update(
+            to_update,
+            ['recommended_items', 'algorithm_used', 'cached_search_history', 'created_at'],
+            batch_size=batch_size,
+        )
+    if to_create:
+        Recommendation.objects.bulk_create(to_create, batch_size=batch_size)
+    return len(to_update), len(to_create)
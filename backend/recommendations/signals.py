@@ -0,0 +1,212 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from bookings.models import Booking
+from items.models import Item, SavedItem, SearchHistory
+from reviews.models import Review
+from users.models import User
+from .autocomplete import record_search_query, remove_item_completions, update_item_completions
+from .embeddings import embed_items, get_item_store, item_text
+from .availability import forget_item, refresh_item
+from .events import KIND_NAMES, event_for
+from .geo import update_item_location
+from .interactions import get_interaction_matrix
+from .models import InteractionEvent
+from .profiles import build_profile, interests_text, record_event
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(pre_save, sender=Item)
+def store_previous_item_text(sender, instance, **kwargs):
+    """
+    Remember the text the item was embedded from, so post_save can tell
+    whether the embedding needs refreshing.
+    """
+    instance._previous_embedding_text = None
+    if not instance.pk:
+        return
+    try:
+        previous = Item.objects.filter(pk=instance.pk).values('title', 'category', 'description').first()
+        if previous:
+            instance._previous_embedding_text = item_text(
+                previous['title'], previous['category'], previous['description']
+            )
+    except Exception as e:
+        logger.error(f"Error reading previous item text for item {instance.pk}: {str(e)}")
+
+
+@receiver(post_save, sender=Item)
+def update_item_embedding(sender, instance, created, **kwargs):
+    """
+    Re-encode an item only when its title, category or description changed.
+    """
+    try:
+        current_text = item_text(instance.title, instance.category, instance.description)
+        previous_text = getattr(instance, '_previous_embedding_text', None)
+        store = get_item_store()
+        if not created and current_text == previous_text and instance.pk in store:
+            return
+        embed_items([{
+            'id': instance.pk,
+            'title': instance.title,
+            'category': instance.category,
+            'description': instance.description,
+        }], store=store)
+    except Exception as e:
+        logger.error(f"Error updating embedding for item {instance.pk}: {str(e)}")
+
+
+@receiver(post_save, sender=Item)
+def update_item_grid(sender, instance, **kwargs):
+    try:
+        update_item_location(instance.pk, instance.latitude, instance.longitude)
+    except Exception as e:
+        logger.error(f"Error updating grid cell for item {instance.pk}: {str(e)}")
+
+
+@receiver(post_delete, sender=Item)
+def remove_item_from_grid(sender, instance, **kwargs):
+    try:
+        update_item_location(instance.pk, None, None)
+    except Exception as e:
+        logger.error(f"Error removing item {instance.pk} from the grid: {str(e)}")
+
+
+@receiver(post_save, sender=Item)
+def update_item_autocomplete(sender, instance, **kwargs):
+    try:
+        update_item_completions(instance.pk, instance.title, instance.category, instance.sub_category)
+    except Exception as e:
+        logger.error(f"Error updating completions for item {instance.pk}: {str(e)}")
+
+
+@receiver(post_delete, sender=Item)
+def remove_item_autocomplete(sender, instance, **kwargs):
+    try:
+        remove_item_completions(instance.pk)
+    except Exception as e:
+        logger.error(f"Error removing completions for item {instance.pk}: {str(e)}")
+
+
+@receiver(post_save, sender=Item)
+def update_item_availability(sender, instance, created, **kwargs):
+    """Add new items (and owner changes) to the availability bitmaps."""
+    try:
+        refresh_item(instance.pk)
+    except Exception as e:
+        logger.error(f"Error updating availability for item {instance.pk}: {str(e)}")
+
+
+@receiver(post_delete, sender=Item)
+def remove_item_availability(sender, instance, **kwargs):
+    try:
+        forget_item(instance.pk)
+    except Exception as e:
+        logger.error(f"Error removing item {instance.pk} from the availability bitmaps: {str(e)}")
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+def update_booking_availability(sender, instance, **kwargs):
+    """Recompute the booked item's days after a booking is made, changed or cancelled."""
+    try:
+        refresh_item(instance.item_id)
+    except Exception as e:
+        logger.error(f"Error updating availability for item {instance.item_id}: {str(e)}")
+
+
+@receiver(post_delete, sender=Item)
+def remove_item_embedding(sender, instance, **kwargs):
+    try:
+        get_item_store().remove([instance.pk])
+    except Exception as e:
+        logger.error(f"Error removing embedding for item {instance.pk}: {str(e)}")
+
+
+def _record_interaction(kind, source):
+    """
+    Write the event log row for a new search, save, booking or review, then
+    feed it to the collaborative filtering matrix (searches only) and the
+    user's profile vector.
+    """
+    try:
+        event = event_for(kind, source)
+        event.save()
+    except Exception as e:
+        logger.error(f"Error logging {KIND_NAMES[kind]} event {source.pk}: {str(e)}")
+        return
+    if kind == InteractionEvent.SEARCH:
+        try:
+            get_interaction_matrix().append([
+                (event.pk, event.user_id, event.item_id, event.timestamp.timestamp())
+            ])
+        except Exception as e:
+            logger.error(f"Error recording interaction for event {event.pk}: {str(e)}")
+    try:
+        record_event(event.user_id, event.item_id, event.weight, event.timestamp)
+    except Exception as e:
+        logger.error(f"Error updating profile vector for user {event.user_id}: {str(e)}")
+
+
+@receiver(post_save, sender=SearchHistory)
+def log_search_event(sender, instance, created, **kwargs):
+    if created and instance.item_id:
+        _record_interaction(InteractionEvent.SEARCH, instance)
+
+
+@receiver(post_save, sender=SearchHistory)
+def count_search_query(sender, instance, created, **kwargs):
+    """Count the query towards the search box completions."""
+    if not created:
+        return
+    try:
+        record_search_query(instance.search_query)
+    except Exception as e:
+        logger.error(f"Error counting search query {instance.pk}: {str(e)}")
+
+
+@receiver(post_save, sender=SavedItem)
+def log_save_event(sender, instance, created, **kwargs):
+    if created:
+        _record_interaction(InteractionEvent.SAVE, instance)
+
+
+@receiver(post_save, sender=Booking)
+def log_booking_event(sender, instance, created, **kwargs):
+    if created:
+        _record_interaction(InteractionEvent.BOOKING, instance)
+
+
+@receiver(post_save, sender=Review)
+def log_review_event(sender, instance, created, **kwargs):
+    if created:
+        _record_interaction(InteractionEvent.REVIEW, instance)
+
+
+@receiver(pre_save, sender=User)
+def store_previous_interests(sender, instance, update_fields=None, **kwargs):
+    instance._previous_interests_text = None
+    if not instance.pk or (update_fields is not None and 'interests' not in update_fields):
+        return
+    try:
+        previous = User.objects.filter(pk=instance.pk).values_list('interests', flat=True).first()
+        instance._previous_interests_text = interests_text(previous)
+    except Exception as e:
+        logger.error(f"Error reading previous interests for user {instance.pk}: {str(e)}")
+
+
+@receiver(post_save, sender=User)
+def update_profile_on_interests(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Re-seed the profile when the interests change. New users get theirs
+    built lazily on their first recommendation or interaction.
+    """
+    if created or (update_fields is not None and 'interests' not in update_fields):
+        return
+    if interests_text(instance.interests) == getattr(instance, '_previous_interests_text', None):
+        return
+    try:
+        build_profile(instance)
+    except Exception as e:
+        logger.error(f"Error rebuilding profile vector for user {instance.pk}: {str(e)}")
@@ -1,3 +1,601 @@
-from django.test import TestCase
+import datetime
+import io
+import os
+import shutil
+import tempfile
+import threading
+from contextlib import redirect_stdout
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from scipy import sparse
+
+from . import autocomplete
+from .als import ALSModel
+from . import ann, availability, hybrid
+from .ann import BACKENDS, ExactIndex, IVFIndex, get_item_index, recall_at_k
+from .autocomplete import CompletionIndex, phrase_keys
+from .availability import AvailabilityBitmaps, day_mask
+from .candidates import CandidateFilter
+from .compression import Codec, CompressedVectors
+from . import embeddings
+from .embeddings import VectorStore, normalize_rows
+from .geo import GridIndex, haversine_km
+from .instrumentation import collect
+from .interactions import InteractionMatrix
+from .item_similarity import ItemNeighbourTable, build_neighbour_table
+from .models import UserProfileVector
+from .profiles import accumulate, decay, profile_vector
+from .user_neighbours import fit_user_neighbours
+
+
+class StoreDirMixin:
+    """Gives each test its own scratch directory for stores and models."""
+
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+
+def random_vectors(count, dim=16, seed=0):
+    return normalize_rows(np.random.default_rng(seed).standard_normal((count, dim)))
+
+
+def dense(matrix):
+    counts, last_seen = matrix.snapshot()
+    users, items = len(matrix.user_ids), len(matrix.item_ids)
+    counts = counts.toarray() if counts.shape == (users, items) else None
+    by_pair = {}
+    if counts is not None:
+        for row, col in zip(*np.nonzero(counts)):
+            by_pair[(matrix.user_ids[row], matrix.item_ids[col])] = (counts[row, col], last_seen[row, col])
+    return by_pair
+
+
+class VectorStoreTests(StoreDirMixin, SimpleTestCase):
+
+    def test_remove_moves_the_last_row_into_the_gap(self):
+        store = VectorStore(self.directory, 'items')
+        vectors = random_vectors(6)
+        store.upsert([10, 11, 12, 13, 14, 15], vectors)
+        store.remove([11, 99, 15])
+        self.assertEqual(store.ids, [10, 14, 12, 13])
+        for item_id in (10, 12, 13, 14):
+            found, found_vectors = store.get([item_id])
+            np.testing.assert_allclose(found_vectors[0], vectors[item_id - 10], atol=1e-6)
+        reloaded = VectorStore(self.directory, 'items')
+        self.assertEqual(reloaded.ids, store.ids)
+        np.testing.assert_array_equal(reloaded.vectors(), store.vectors())
+
+    def test_grows_past_initial_capacity(self):
+        store = VectorStore(self.directory, 'items')
+        count = embeddings.INITIAL_CAPACITY + 5
+        vectors = random_vectors(count)
+        store.upsert(list(range(count)), vectors)
+        np.testing.assert_allclose(VectorStore(self.directory, 'items').vectors(), vectors, atol=1e-6)
+
+    def test_journal_lists_changes_from_other_processes(self):
+        writer = VectorStore(self.directory, 'items')
+        writer.upsert([1, 2, 3], random_vectors(3))
+        reader = VectorStore(self.directory, 'items')
+        version = reader.version
+        writer.upsert([2, 4], random_vectors(2, seed=1))
+        writer.remove([1])
+        self.assertTrue(reader.refresh())
+        self.assertEqual(reader.changes_since(version), {1, 2, 4})
+        self.assertEqual(sorted(reader.ids), [2, 3, 4])
+        self.assertEqual(reader.changes_since(reader.version), set())
+
+    def test_journal_too_short_asks_for_a_reload(self):
+        store = VectorStore(self.directory, 'items')
+        store.upsert([1], random_vectors(1))
+        version = store.version
+        with mock.patch.object(embeddings, 'JOURNAL_LENGTH', 2):
+            store.upsert([2, 3, 4], random_vectors(3))
+        # The cut split version 2, so a reader at version 1 would miss id 2.
+        self.assertIsNone(store.changes_since(version))
+        store.upsert([5], random_vectors(1))
+        self.assertEqual(store.changes_since(version + 1), {5})
+
+
+    def test_small_writes_append_to_the_delta_log(self):
+        writer = VectorStore(self.directory, 'items')
+        writer.upsert([1, 2, 3], random_vectors(3))
+        reader = VectorStore(self.directory, 'items')
+        stamp = embeddings.file_stamp(writer.index_path)
+        vectors = random_vectors(2, seed=1)
+        writer.upsert([2, 4], vectors)
+        writer.remove([1])
+        self.assertEqual(embeddings.file_stamp(writer.index_path), stamp)
+        self.assertTrue(reader.refresh())
+        self.assertEqual(reader.ids, writer.ids)
+        self.assertEqual(reader.version, writer.version)
+        np.testing.assert_allclose(reader.get([2, 4])[1], vectors, atol=1e-6)
+        self.assertEqual(VectorStore(self.directory, 'items').ids, writer.ids)
+
+        with mock.patch.object(embeddings, 'JOURNAL_LENGTH', 3):
+            writer.upsert([5, 6], random_vectors(2, seed=2))
+        self.assertNotEqual(embeddings.file_stamp(writer.index_path), stamp)
+        self.assertEqual(os.path.getsize(writer.delta_path), 0)
+        self.assertTrue(reader.refresh())
+        self.assertEqual(reader.ids, writer.ids)
+        self.assertEqual(reader.changes_since(reader.version - 1), {5, 6})
+
+
+@override_settings(RECOMMENDATIONS={'INTERACTION_MERGE_EVENTS': 3, 'INTERACTION_MERGE_SECONDS': 0})
+class InteractionMatrixTests(StoreDirMixin, SimpleTestCase):
+
+    def test_append_buffers_until_merge(self):
+        matrix = InteractionMatrix(self.directory)
+        with self.settings(RECOMMENDATIONS={'INTERACTION_MERGE_EVENTS': 3, 'INTERACTION_MERGE_SECONDS': 3600}):
+            matrix.append([(1, 10, 100, 5.0), (2, 10, 100, 7.0)])
+            self.assertEqual(matrix.snapshot()[0].nnz, 0)
+            self.assertEqual(matrix.interaction_count, 2)
+            matrix.append([(3, 11, 101, 1.0)])
+        self.assertEqual(dense(matrix), {(10, 100): (2, 7.0), (11, 101): (1, 1.0)})
+
+    def test_replayed_by_other_processes(self):
+        writer, reader = InteractionMatrix(self.directory), InteractionMatrix(self.directory)
+        writer.append([(1, 10, 100, 5.0), (2, 11, 100, 6.0)])
+        reader.refresh()
+        self.assertEqual(dense(reader), dense(writer))
+
+    def test_save_keeps_other_processes_events(self):
+        first, second = InteractionMatrix(self.directory), InteractionMatrix(self.directory)
+        first.append([(1, 10, 100, 5.0)])
+        second.append([(2, 11, 101, 6.0)])
+        first.save()
+        self.assertEqual(first.watermark, 2)
+        reloaded = InteractionMatrix(self.directory)
+        self.assertEqual(dense(reloaded), {(10, 100): (1, 5.0), (11, 101): (1, 6.0)})
+
+    def test_append_after_another_process_compacts(self):
+        first, second = InteractionMatrix(self.directory), InteractionMatrix(self.directory)
+        first.append([(1, 10, 100, 5.0)])
+        second.append([(2, 11, 101, 6.0)])
+        second.save()
+        second.append([(3, 12, 102, 7.0)])
+        first.append([(4, 10, 100, 8.0)])
+        expected = {(10, 100): (2, 8.0), (11, 101): (1, 6.0), (12, 102): (1, 7.0)}
+        self.assertEqual(dense(first), expected)
+        self.assertEqual(dense(InteractionMatrix(self.directory)), expected)
+
+    def test_snapshot_is_not_resized_by_later_merges(self):
+        matrix = InteractionMatrix(self.directory)
+        matrix.append([(1, 10, 100, 5.0), (2, 11, 101, 6.0), (3, 11, 100, 7.0)])
+        counts, last_seen = matrix.snapshot()
+        matrix.append([(4, 12, 102, 8.0), (5, 13, 103, 9.0), (6, 13, 100, 9.0)])
+        self.assertEqual(counts.shape, (2, 2))
+        self.assertEqual(last_seen.shape, (2, 2))
+        self.assertEqual(matrix.snapshot()[0].shape, (4, 4))
+
+    def test_labelled_snapshot_includes_pending_events(self):
+        matrix = InteractionMatrix(self.directory)
+        with self.settings(RECOMMENDATIONS={'INTERACTION_MERGE_EVENTS': 100, 'INTERACTION_MERGE_SECONDS': 3600}):
+            matrix.append([(1, 10, 100, 5.0), (2, 11, 101, 6.0), (3, 10, 101, 7.0)])
+            counts, _, user_ids, item_ids, interaction_count = matrix.labelled_snapshot()
+        self.assertEqual(counts.shape, (len(user_ids), len(item_ids)))
+        self.assertEqual(interaction_count, counts.sum())
+        self.assertEqual(counts[user_ids.index(10), item_ids.index(101)], 1)
+
+    def test_fit_user_neighbours(self):
+        matrix = InteractionMatrix(self.directory)
+        matrix.append([(1, 10, 100, 5.0), (2, 11, 100, 6.0), (3, 11, 101, 7.0), (4, 12, 102, 8.0)])
+        with self.settings(RECOMMENDATIONS={'STORE_DIR': self.directory}):
+            model = fit_user_neighbours(matrix, top_n=2)
+        self.assertEqual(model.interaction_count, 4)
+        self.assertEqual(list(model.neighbours_of(10, 2)[0]), [11])
+        self.assertEqual(len(model.neighbours_of(12, 2)[0]), 0)
+
+    def test_compacts_past_threshold(self):
+        matrix = InteractionMatrix(self.directory)
+        with self.settings(RECOMMENDATIONS={'INTERACTION_COMPACT_THRESHOLD': 2}):
+            matrix.append([(1, 10, 100, 5.0), (2, 11, 100, 6.0)])
+        self.assertEqual(os.path.getsize(matrix.delta_path), 0)
+        self.assertEqual(matrix.watermark, 2)
+        self.assertEqual(dense(InteractionMatrix(self.directory)), dense(matrix))
+
+
+class ANNIndexTests(SimpleTestCase):
+
+    def assertSameResults(self, index, reference, queries, k=10):
+        for query in queries:
+            found, _ = index.search(query, k)
+            expected, _ = reference.search(query, k)
+            self.assertEqual(list(found), list(expected))
+
+    def test_ivf_scanning_every_cell_matches_exact(self):
+        vectors = random_vectors(400)
+        ivf, exact = IVFIndex(16, nlist=8, nprobe=8, min_train_size=100), ExactIndex(16)
+        for index in (ivf, exact):
+            index.add(list(range(400)), vectors)
+            index.remove([3, 150, 399])
+            index.add([7, 500], random_vectors(2, seed=1))
+        self.assertIsNotNone(ivf.centroids)
+        self.assertEqual(len(ivf), len(exact))
+        self.assertSameResults(ivf, exact, random_vectors(20, seed=2))
+
+    def test_updated_vector_is_moved_to_its_new_cell(self):
+        ivf = IVFIndex(16, nlist=8, nprobe=1, min_train_size=100)
+        ivf.add(list(range(400)), random_vectors(400))
+        for target in ivf.centroids:
+            ivf.add([0], target.reshape(1, -1))
+            found, _ = ivf.search(target, 1)
+            self.assertEqual(list(found), [0])
+        position = ivf._positions[0]
+        self.assertEqual(ivf._assign[position], ivf._nearest_cells(ivf._vectors[position:position + 1])[0])
+
+    def test_every_backend_builds_under_the_default_params(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        store = VectorStore(directory, 'items')
+        vectors = random_vectors(300)
+        store.upsert(list(range(300)), vectors)
+        for backend in BACKENDS:
+            with self.subTest(backend=backend), self.settings(RECOMMENDATIONS={'ANN_BACKEND': backend}), \
+                    mock.patch.object(ann, '_item_index_cache', ann.ItemIndexCache()):
+                try:
+                    index = get_item_index(store)
+                except ImportError:
+                    self.skipTest(f'{backend} backend is not installed')
+                self.assertIsInstance(index, BACKENDS[backend])
+                self.assertEqual(list(index.search(vectors[7], 1)[0]), [7])
+
+    def test_repeated_id_in_one_batch_keeps_the_last_vector(self):
+        index = ExactIndex(16)
+        first, second = random_vectors(2)
+        index.add([1, 1], np.stack([first, second]))
+        self.assertEqual(len(index), 1)
+        found, scores = index.search(second, 5)
+        self.assertEqual(list(found), [1])
+        self.assertAlmostEqual(float(scores[0]), 1.0, places=5)
+
+
+def random_counts(users, items, density=0.15, seed=0):
+    rng = np.random.default_rng(seed)
+    counts = rng.integers(1, 4, (users, items)) * (rng.random((users, items)) < density)
+    return sparse.csr_matrix(counts.astype(np.float32))
+
+
+class ItemNeighbourTableTests(SimpleTestCase):
+
+    def setUp(self):
+        self.counts = random_counts(60, 25)
+        self.item_ids = list(range(100, 125))
+        self.table = ItemNeighbourTable.build(self.counts, self.item_ids, top_n=5, chunk_size=7)
+        binary = (self.counts.toarray() > 0).astype(np.float64)
+        norms = np.maximum(np.linalg.norm(binary, axis=0), 1)
+        self.similarity = binary.T @ binary / np.outer(norms, norms)
+        np.fill_diagonal(self.similarity, 0)
+
+    def test_neighbours_match_brute_force_cosine(self):
+        for row in range(len(self.item_ids)):
+            neighbours, scores = self.table.neighbours[row], self.table.scores[row]
+            valid = neighbours >= 0
+            expected = np.sort(self.similarity[row][self.similarity[row] > 0])[::-1][:5]
+            np.testing.assert_allclose(scores[valid], expected, rtol=1e-5)
+            np.testing.assert_allclose(self.similarity[row, neighbours[valid]], scores[valid], rtol=1e-5)
+
+    def test_score_merges_the_history_neighbour_lists(self):
+        history, weights = [100, 103, 999], [1.0, 0.5, 2.0]
+        ids, scores = self.table.score(history, weights, exclude_item_ids=[100, 103])
+        expected = {}
+        for item_id, weight in zip(history[:2], weights[:2]):
+            row = item_id - 100
+            for neighbour, score in zip(self.table.neighbours[row], self.table.scores[row]):
+                if neighbour >= 0 and self.item_ids[neighbour] not in (100, 103):
+                    expected[self.item_ids[neighbour]] = expected.get(self.item_ids[neighbour], 0) + weight * score
+        self.assertEqual(sorted(ids.tolist()), sorted(expected))
+        for item_id, score in zip(ids.tolist(), scores):
+            self.assertAlmostEqual(score, expected[item_id], places=5)
+        self.assertTrue(np.all(np.diff(scores) <= 0))
+
+    def test_build_reads_the_given_matrix_with_its_pending_events(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        matrix = InteractionMatrix(directory)
+        with self.settings(RECOMMENDATIONS={'STORE_DIR': directory, 'INTERACTION_MERGE_SECONDS': 3600}):
+            self.assertEqual(len(build_neighbour_table(matrix)), 0)
+            matrix.append([(1, 10, 100, 5.0), (2, 10, 101, 6.0), (3, 11, 101, 7.0)])
+            table = build_neighbour_table(matrix)
+        self.assertEqual(table.item_ids.tolist(), [100, 101])
+        self.assertEqual(table.item_ids[table.neighbours[0, 0]], 101)
+
+
+class ALSFoldInTests(SimpleTestCase):
+
+    def setUp(self):
+        counts = random_counts(80, 40, density=0.2).tocoo()
+        self.events = counts.row + 1, counts.col + 500, counts.data
+        self.model = ALSModel.train(*self.events, factors=8, regularization=0.05, alpha=10.0, iterations=10)
+
+    def test_solves_the_user_normal_equations(self):
+        item_ids, weights = [500, 507, 507, 520], [1.0, 2.0, 1.0, 3.0]
+        vector, seen_cols = self.model.fold_in(item_ids + [9999], weights + [5.0])
+        self.assertEqual(sorted(seen_cols.tolist()), [0, 7, 20])
+        factors = np.asarray(self.model.item_factors, dtype=np.float64)
+        confidence = np.ones(len(factors))
+        confidence[[0, 7, 20]] = 1 + 10.0 * np.array([1.0, 3.0, 3.0])
+        preference = np.zeros(len(factors))
+        preference[[0, 7, 20]] = 1
+        lhs = factors.T @ (confidence[:, None] * factors) + 0.05 * np.eye(8)
+        np.testing.assert_allclose(vector, np.linalg.solve(lhs, factors.T @ (confidence * preference)), rtol=1e-4)
+
+    def test_agrees_with_the_trained_user_vector(self):
+        user_ids, item_ids, weights = self.events
+        user = user_ids[0]
+        trained, trained_cols = self.model.user_vector(user)
+        mine = user_ids == user
+        folded, folded_cols = self.model.fold_in(item_ids[mine].tolist(), weights[mine].tolist())
+        self.assertEqual(sorted(folded_cols.tolist()), sorted(trained_cols.tolist()))
+        cosine = folded @ trained / np.linalg.norm(folded) / np.linalg.norm(trained)
+        self.assertGreater(cosine, 0.95)
+
+    def test_unknown_items_only(self):
+        self.assertIsNone(self.model.fold_in([9999], [1.0]))
+
+
+class CompressedVectorsTests(SimpleTestCase):
+
+    def setUp(self):
+        # Embeddings concentrate near a low-dimensional subspace; so does this sample.
+        rng = np.random.default_rng(0)
+        basis = rng.standard_normal((24, 64))
+        self.vectors = normalize_rows(rng.standard_normal((1000, 24)) @ basis
+                                      + 0.05 * rng.standard_normal((1000, 64)))
+        self.queries = normalize_rows(rng.standard_normal((30, 24)) @ basis)
+        self.exact = ExactIndex(64)
+        self.exact.add(list(range(1000)), self.vectors)
+
+    def test_recall_against_exact_search(self):
+        for method, dtype, minimum in [('pca', 'int8', 0.9), ('pca', 'float16', 0.9), ('random', 'int8', 0.3)]:
+            compressed = CompressedVectors(Codec.fit(self.vectors, 32, method=method, dtype=dtype))
+            compressed.add(list(range(1000)), self.vectors)
+            self.assertGreaterEqual(recall_at_k(compressed, self.exact, self.queries), minimum, (method, dtype))
+
+    def test_updates_and_removals_match_exact_search(self):
+        compressed = CompressedVectors(Codec.fit(self.vectors, 32))
+        compressed.add(list(range(1000)), self.vectors)
+        for index in (compressed, self.exact):
+            index.remove(list(range(0, 1000, 3)))
+            index.add([1, 1, 2000], self.vectors[[5, 1, 7]])
+        self.assertEqual(len(compressed), len(self.exact))
+        self.assertEqual(sorted(compressed.ids.tolist()), sorted(self.exact._ids[:len(self.exact)].tolist()))
+        self.assertGreaterEqual(recall_at_k(compressed, self.exact, self.queries), 0.9)
+
+
+class ProfileAccumulateTests(SimpleTestCase):
+
+    def test_incremental_mean_matches_a_rebuild(self):
+        vectors = random_vectors(6)
+        weights = np.array([1.0, 3.0, 5.0, 1.0, 4.0, 3.0])
+        # Out of order on purpose: late events are decayed themselves.
+        timestamps = np.array([0.0, 5, 2, 40, 30, 60]) * 86400
+        now = 90 * 86400
+
+        vector, weight, updated = np.zeros(16), 0.0, 0.0
+        for event in range(len(vectors)):
+            vector, weight, updated = accumulate(vector, weight, updated, vectors[event], weights[event],
+                                                 timestamps[event])
+        decayed = weights * decay(now - timestamps)
+        expected = (decayed[:, None] * vectors).sum(axis=0) / decayed.sum()
+
+        np.testing.assert_allclose(vector, expected, atol=1e-9)
+        self.assertAlmostEqual(weight * decay(now - updated), decayed.sum())
+
+    def test_interests_are_not_decayed(self):
+        interests, events = random_vectors(2)
+        profile = UserProfileVector(
+            interests_vector=interests.astype(np.float32).tobytes(), vector=events.astype(np.float32).tobytes(),
+            weight=2.0, dim=16, updated_at=datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc),
+        )
+        updated = profile.updated_at.timestamp()
+        with self.settings(RECOMMENDATIONS={'PROFILE_HALF_LIFE_DAYS': 30, 'PROFILE_INTEREST_WEIGHT': 2.0}):
+            fresh = profile_vector(profile, now_ts=updated)
+            stale = profile_vector(profile, now_ts=updated + 300 * 86400)
+        np.testing.assert_allclose(fresh, normalize_rows(interests + events)[0], atol=1e-6)
+        self.assertGreater(float(stale @ interests), 0.999)
+
+
+class CompletionIndexTests(SimpleTestCase):
+
+    def brute_force(self, index, prefix):
+        matches = [phrase for phrase in index.weights if any(key.startswith(prefix) for key in phrase_keys(phrase))]
+        return sorted(matches, key=lambda phrase: (-index.weights[phrase], phrase))[:index.limit]
+
+    def test_matches_brute_force_through_updates(self):
+        index = CompletionIndex(limit=3)
+        words = ['tent', 'tennis', 'camera', 'canoe', 'red', 'blue']
+        for item_id in range(30):
+            title = f'{words[item_id % 6]} {words[item_id * 7 % 6]} {item_id}'
+            index.set_item(item_id, title, words[item_id % 4], 'gear')
+        index.finish(max_length=1)
+        # Every range is longer than this, so the top phrases are cached and patched.
+        with mock.patch.object(autocomplete, 'SCAN_LIMIT', 2):
+            prefixes = ['t', 'te', 'ten', 'c', 'ca', 'red ', 'g', 'gear', '1']
+            for prefix in prefixes:
+                index.complete(prefix)
+            index.set_item(3, 'canoe paddle', 'boats', 'gear')
+            index.remove_item(4)
+            index.record_query('tent pegs', 5)
+            index.set_item(40, 'tennis racket', 'tennis', 'gear')
+            for prefix in prefixes:
+                self.assertEqual(index.complete(prefix), self.brute_force(index, prefix), prefix)
+
+    def test_rebuild_replays_item_updates_but_not_query_counts(self):
+        def build():
+            index = CompletionIndex()
+            index.set_item(1, 'red tent', 'camping', 'tents')
+            # Searches made while the rebuild runs may already be in its counts.
+            index.record_query('tent', 5)
+            autocomplete.record_search_query('tent')
+            autocomplete.update_item_completions(1, 'red tent', 'camping', 'tents')
+            autocomplete.update_item_completions(2, 'blue bike', 'cycling', 'bikes')
+            index.finish()
+            return index
+
+        with mock.patch.object(autocomplete, '_index', None), \
+                mock.patch.object(autocomplete, '_index_built_at', 0.0), \
+                mock.patch.object(autocomplete, '_pending', []), \
+                mock.patch.object(autocomplete, '_rebuild_thread', threading.current_thread()), \
+                mock.patch.object(autocomplete, 'build_completion_index', build):
+            autocomplete._rebuild()
+            index = autocomplete._index
+        self.assertEqual(index.query_counts['tent'], 5)
+        self.assertEqual(index.item_phrases[1], ('red tent', 'camping', 'tents'))
+        self.assertEqual(index.complete('bl'), ['blue bike'])
+        self.assertEqual(index.weights['red tent'], 1.0)
+
+
+class GridIndexTests(SimpleTestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.latitudes = 31.5 + rng.uniform(-1, 1, 500)
+        self.longitudes = 74.3 + rng.uniform(-1, 1, 500)
+        self.grid = GridIndex(cell_km=5.0)
+        for item_id in range(500):
+            self.grid.add(item_id, self.latitudes[item_id], self.longitudes[item_id])
+        for item_id in range(0, 500, 7):
+            self.grid.remove(item_id)
+        self.grid.add(1, 31.5, 74.3)
+        self.latitudes[1], self.longitudes[1] = 31.5, 74.3
+        self.kept = np.array([item_id for item_id in range(500) if item_id % 7])
+
+    def brute_force(self, latitude, longitude):
+        distances = haversine_km(latitude, longitude, self.latitudes[self.kept], self.longitudes[self.kept])
+        order = np.argsort(distances, kind='stable')
+        return self.kept[order], distances[order]
+
+    def test_within_matches_brute_force(self):
+        for latitude, longitude, radius in [(31.5, 74.3, 3), (31.5, 74.3, 40), (32.4, 75.2, 25), (31.0, 73.0, 500)]:
+            ids, distances = self.grid.within(latitude, longitude, radius)
+            expected, expected_distances = self.brute_force(latitude, longitude)
+            keep = expected_distances <= radius
+            self.assertEqual(sorted(ids.tolist()), sorted(expected[keep].tolist()))
+            self.assertTrue(np.all(np.diff(distances) >= 0))
+
+    def test_nearest_matches_brute_force(self):
+        for latitude, longitude in [(31.5, 74.3), (32.6, 73.1)]:
+            ids, distances = self.grid.nearest(latitude, longitude, 10, max_radius_km=300)
+            _, expected_distances = self.brute_force(latitude, longitude)
+            np.testing.assert_allclose(distances, expected_distances[:10])
+        ids, _ = self.grid.nearest(31.5, 74.3, 10, max_radius_km=0.5)
+        self.assertEqual(ids.tolist(), [1])
+
+
+class AvailabilityTests(SimpleTestCase):
+
+    def setUp(self):
+        self.origin = datetime.date(2026, 3, 1)
+        self.bitmaps = AvailabilityBitmaps(self.origin, 100, [30, 10, 20], [1, 2, 1])
+
+    def day(self, offset):
+        return self.origin + datetime.timedelta(days=offset)
+
+    def test_day_mask_spans_words(self):
+        mask = day_mask(60, 70, 2)
+        bits = [(int(mask[day // 64]) >> (day % 64)) & 1 for day in range(128)]
+        self.assertEqual([day for day, bit in enumerate(bits) if bit], list(range(60, 71)))
+
+    def test_unavailable_only_when_the_whole_window_is_booked(self):
+        self.bitmaps.mark(10, self.day(-3), self.day(6))
+        self.bitmaps.mark(20, self.day(0), self.day(2))
+        self.bitmaps.mark(20, self.day(4), self.day(120))
+        self.assertEqual(self.bitmaps.item_ids[self.bitmaps.unavailable(7)].tolist(), [10])
+        self.assertEqual(self.bitmaps.item_ids[self.bitmaps.unavailable(8)].tolist(), [])
+
+    def test_excluded_adds_the_users_own_items(self):
+        self.bitmaps.mark(10, self.day(0), self.day(10))
+        self.assertEqual(self.bitmaps.excluded(1, 7).tolist(), [10, 20, 30])
+        self.assertEqual(self.bitmaps.excluded(2, 7).tolist(), [10])
+
+    def test_set_and_remove_items(self):
+        self.bitmaps.set_item(15, 3, [(self.day(0), self.day(3)), (self.day(4), self.day(8))])
+        self.bitmaps.set_item(10, 2, [(self.day(0), self.day(1))])
+        self.assertEqual(self.bitmaps.item_ids.tolist(), [10, 15, 20, 30])
+        self.assertEqual(self.bitmaps.excluded(None, 7).tolist(), [15])
+        self.bitmaps.set_item(15, 3, [])
+        self.bitmaps.remove_item(30)
+        self.bitmaps.remove_item(99)
+        self.assertEqual(self.bitmaps.item_ids.tolist(), [10, 15, 20])
+        self.assertEqual(self.bitmaps.excluded(3, 7).tolist(), [15])
+
+    def test_window_starts_today_on_bitmaps_built_earlier(self):
+        self.bitmaps.mark(10, self.day(0), self.day(6))
+        self.bitmaps.mark(20, self.day(2), self.day(8))
+        self.assertEqual(self.bitmaps.excluded(None, 7).tolist(), [10])
+        self.assertEqual(self.bitmaps.excluded(None, 7, today=self.day(2)).tolist(), [20])
+        self.assertEqual(self.bitmaps.excluded(None, 7, today=self.day(200)).tolist(), [])
+
+    def test_rebuild_replays_items_changed_while_it_ran(self):
+        def build():
+            bitmaps = AvailabilityBitmaps(self.origin, 100, [10, 20], [1, 1])
+            availability.refresh_item(20)
+            availability.refresh_item(30)
+            availability.forget_item(10)
+            return bitmaps
+
+        def refresh_row(bitmaps, item_id):
+            if item_id == 10:
+                bitmaps.remove_item(item_id)
+            else:
+                bitmaps.set_item(item_id, 2, [(self.day(0), self.day(10))])
+
+        with mock.patch.object(availability, '_bitmaps', self.bitmaps), \
+                mock.patch.object(availability, '_pending', []), \
+                mock.patch.object(availability, '_rebuild_thread', threading.current_thread()), \
+                mock.patch.object(availability, 'build_availability', build), \
+                mock.patch.object(availability, '_refresh_row', refresh_row):
+            availability._rebuild()
+            rebuilt = availability._bitmaps
+        self.assertIsNot(rebuilt, self.bitmaps)
+        self.assertEqual(rebuilt.item_ids.tolist(), [20, 30])
+        self.assertEqual(rebuilt.excluded(None, 7).tolist(), [20, 30])
+
+
+class CandidateFilterTests(SimpleTestCase):
+
+    def test_allowed_minus_excluded(self):
+        candidates = CandidateFilter(allowed=[5, 3, 9], excluded=[9, 1])
+        self.assertEqual(candidates.allowed.tolist(), [3, 5])
+        self.assertEqual(candidates.mask([1, 3, 5, 9, 11]).tolist(), [False, True, True, False, False])
+        self.assertTrue(CandidateFilter(allowed=[9], excluded=[9]).empty)
+
+    def test_excluded_only(self):
+        candidates = CandidateFilter(excluded=[4, 2, 4])
+        self.assertFalse(candidates.empty)
+        self.assertEqual(candidates.mask([1, 2, 3, 4]).tolist(), [True, False, True, False])
+        self.assertTrue(CandidateFilter().mask([1, 2]).all())
+
+
+class InstrumentationTests(TestCase):
+
+    def test_debug_trace_includes_rendering_for_staff_only(self):
+        from users.models import User
+
+        client = APIClient()
+        url = reverse('get_recommendations')
+        params = {'lat': 'north', 'lng': '74', 'debug': '1'}
+        client.force_authenticate(User.objects.create_user(username='user', email='user@example.com'))
+        self.assertNotIn('debug', client.get(url, params).json())
+        client.force_authenticate(User.objects.create_user(username='staff', email='staff@example.com',
+                                                           is_staff=True))
+        response = client.get(url, params)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('view.render', [row['stage'] for row in response.json()['debug']['stages']])
+
+    def test_user_knn_fallback_has_its_own_stage(self):
+        with mock.patch.object(hybrid, 'get_neighbour_table', return_value=None), \
+                mock.patch.object(hybrid, 'get_als_model', return_value=None), \
+                mock.patch.object(hybrid, '_user_knn_recommendations', return_value=[]) as user_knn:
+            for engine in (hybrid.item_based_collaborative_filtering, hybrid.als_collaborative_filtering):
+                with collect(memory=False) as trace, redirect_stdout(io.StringIO()):
+                    engine(1)
+                self.assertEqual([record.name for record in trace.stages],
+                                 ['collaborative', 'collaborative.user_knn_fallback'])
+        self.assertEqual(user_knn.call_count, 2)
@@ -1,6 +1,7 @@
 from django.urls import path
-from .views import get_recommendations
+from .views import get_recommendations, recommendation_metrics
 
 urlpatterns = [
     path('getrecommendation/', get_recommendations, name='get_recommendations'),
+    path('metrics/', recommendation_metrics, name='recommendation_metrics'),
 ]
@@ -0,0 +1,209 @@
+"""
+Persisted user-kNN model.
+
+A fit turns the interaction matrix into a table of every user's ``top_n``
+most similar users (cosine similarity of their binarised rows), plus the
+item -> users index it was fitted on. Workers load the model once and
+reload it when a refit rewrites it, so a request only reads its user's
+neighbour row. Users who arrived after the fit are folded in: their items
+are looked up in the fitted index, which costs one pass over those items'
+users rather than a fit.
+
+The model is refitted in the background once it is older than
+USER_KNN_REFIT_SECONDS or the matrix has gained USER_KNN_REFIT_INTERACTIONS
+interactions since the fit (``build_user_neighbours --if-due`` runs the
+same check from cron).
+"""
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+from django.db import close_old_connections
+from scipy import sparse
+
+from .collaborative import binarize, top_cosine_neighbours
+from .conf import rec_setting
+from .embeddings import FileLock, file_stamp
+
+logger = logging.getLogger(__name__)
+
+
+class UserNeighbourModel:
+    """
+    ``neighbours[r]`` holds model rows (``-1`` padded) of the users most
+    similar to ``user_ids[r]``, best first, with cosine scores in
+    ``scores[r]``. ``item_users`` maps each fitted item column to the model
+    rows that interacted with it, for folding in new users.
+    """
+
+    def __init__(self, user_ids, item_ids, neighbours, scores, item_users, fitted_at, interaction_count):
+        self.user_ids = np.asarray(user_ids, dtype=np.int64)
+        self.item_ids = np.asarray(item_ids, dtype=np.int64)
+        self.neighbours = np.asarray(neighbours, dtype=np.int32)
+        self.scores = np.asarray(scores, dtype=np.float32)
+        self.item_users = item_users.tocsr()
+        self.fitted_at = float(fitted_at)
+        self.interaction_count = int(interaction_count)
+        self.row_of = {int(user_id): row for row, user_id in enumerate(self.user_ids)}
+        self.col_of = {int(item_id): col for col, item_id in enumerate(self.item_ids)}
+        items_per_user = np.bincount(self.item_users.indices, minlength=len(self.user_ids))
+        self.inverse_norms = 1 / np.sqrt(np.maximum(items_per_user, 1))
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    @classmethod
+    def fit(cls, counts, user_ids, item_ids, top_n=20, chunk_size=1024, interaction_count=None):
+        binary = binarize(counts.tocsr())
+        neighbours, scores = top_cosine_neighbours(binary.T, top_n, chunk_size)
+        item_users = sparse.csr_matrix(binary.T.astype(np.int8))
+        if interaction_count is None:
+            interaction_count = int(counts.sum())
+        return cls(user_ids, item_ids, neighbours, scores, item_users, time.time(), interaction_count)
+
+    def neighbours_of(self, user_id, k):
+        """``(user_ids, similarities)`` of a fitted user's ``k`` nearest users, or None if not fitted."""
+        row = self.row_of.get(int(user_id))
+        if row is None:
+            return None
+        rows, sims = self.neighbours[row, :k], self.scores[row, :k]
+        valid = rows >= 0
+        return self.user_ids[rows[valid]], sims[valid]
+
+    def fold_in(self, item_ids, k):
+        """
+        ``(user_ids, similarities)`` of the ``k`` fitted users nearest to a
+        user who interacted with ``item_ids``; items unknown to the fit are
+        ignored.
+        """
+        cols = [self.col_of[int(i)] for i in set(item_ids) if int(i) in self.col_of]
+        empty = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        if not cols:
+            return empty
+        rows = np.concatenate([self.item_users.indices[self.item_users.indptr[c]:self.item_users.indptr[c + 1]]
+                               for c in cols])
+        candidate_rows, co_counts = np.unique(rows, return_counts=True)
+        # The user's norm includes items the fit has never seen.
+        sims = (co_counts * self.inverse_norms[candidate_rows] / np.sqrt(len(set(item_ids)))).astype(np.float32)
+        if len(candidate_rows) > k:
+            best = np.argpartition(-sims, k - 1)[:k]
+            candidate_rows, sims = candidate_rows[best], sims[best]
+        order = np.argsort(-sims, kind='stable')
+        return self.user_ids[candidate_rows[order]], sims[order]
+
+    def save(self, path):
+        tmp_path = f'{path}.tmp.npz'
+        np.savez(tmp_path, user_ids=self.user_ids, item_ids=self.item_ids, neighbours=self.neighbours,
+                 scores=self.scores, item_users_indptr=self.item_users.indptr,
+                 item_users_indices=self.item_users.indices,
+                 meta=np.array([self.fitted_at, self.interaction_count], dtype=np.float64))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            indices = data['item_users_indices']
+            item_users = sparse.csr_matrix(
+                (np.ones(len(indices), dtype=np.int8), indices, data['item_users_indptr']),
+                shape=(len(data['item_ids']), len(data['user_ids'])),
+            )
+            fitted_at, interaction_count = data['meta']
+            return cls(data['user_ids'], data['item_ids'], data['neighbours'], data['scores'], item_users,
+                       fitted_at, interaction_count)
+
+
+def user_neighbours_path():
+    return os.path.join(rec_setting('STORE_DIR'), 'user_neighbours.npz')
+
+
+def fit_user_neighbours(matrix=None, top_n=None):
+    """Fit on the current interaction matrix and save to STORE_DIR."""
+    from .interactions import get_interaction_matrix
+
+    if matrix is None:
+        matrix = get_interaction_matrix()
+    counts, _, user_ids, item_ids, interaction_count = matrix.labelled_snapshot()
+    model = UserNeighbourModel.fit(counts, user_ids, item_ids, top_n=top_n or rec_setting('USER_NEIGHBOURS'),
+                                   interaction_count=interaction_count)
+    os.makedirs(rec_setting('STORE_DIR'), exist_ok=True)
+    model.save(user_neighbours_path())
+    return model
+
+
+def refit_due(model, matrix):
+    """Why ``model`` should be refitted against ``matrix``, or None when it is fresh enough."""
+    if model is None:
+        return 'no model'
+    age = time.time() - model.fitted_at
+    if age >= rec_setting('USER_KNN_REFIT_SECONDS'):
+        return f'model is {age:.0f}s old'
+    new = matrix.interaction_count - model.interaction_count
+    if new >= rec_setting('USER_KNN_REFIT_INTERACTIONS'):
+        return f'{new} new interactions'
+    return None
+
+
+_model = None
+_model_stamp = None
+_model_lock = threading.Lock()
+_refit_thread = None
+
+
+def get_user_neighbour_model():
+    """The last fitted model, reloaded when a refit rewrites it."""
+    global _model, _model_stamp
+    path = user_neighbours_path()
+    with _model_lock:
+        if not os.path.exists(path):
+            return None
+        stamp = file_stamp(path)
+        if _model is None or stamp != _model_stamp:
+            _model = UserNeighbourModel.load(path)
+            _model_stamp = stamp
+            logger.info(f"Loaded user neighbour model for {len(_model)} users.")
+        return _model
+
+
+def refit_if_due(matrix=None):
+    """
+    Refit when due, unless another process is already refitting. Returns
+    the new model, or None when nothing was done.
+    """
+    from .interactions import get_interaction_matrix
+
+    if matrix is None:
+        matrix = get_interaction_matrix()
+    with FileLock(f'{user_neighbours_path()}.lock', blocking=False) as lock:
+        if not lock.acquired:
+            return None
+        # Another process may have refitted while we were deciding to.
+        reason = refit_due(get_user_neighbour_model(), matrix)
+        if reason is None:
+            return None
+        started = time.perf_counter()
+        model = fit_user_neighbours(matrix)
+        logger.info(f"Refitted user neighbour model ({reason}) for {len(model)} users "
+                    f"in {time.perf_counter() - started:.2f}s.")
+        return model
+
+
+def _refit():
+    try:
+        refit_if_due()
+    except Exception as e:
+        logger.error(f"User neighbour refit failed: {e}")
+    finally:
+        close_old_connections()
+
+
+def schedule_refit():
+    """Start a background refit in this process unless one is running."""
+    global _refit_thread
+    with _model_lock:
+        if _refit_thread is not None and _refit_thread.is_alive():
+            return False
+        _refit_thread = threading.Thread(target=_refit, name='user-knn-refit', daemon=True)
+        _refit_thread.start()
+        return True
@@ -1,69 +1,131 @@
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
-from recommendations.hybrid import hybrid_recommendation_system
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from django.utils import timezone
-from .models import Recommendation 
-from items.models import SearchHistory 
+from utils.encode_batcher import batcher_stats
+from utils.model_registry import registry
+from .conf import rec_setting
+from .geo import parse_near
+from .instrumentation import histograms, instrument_view, stage
+from .models import Recommendation
+from .refresh import get_refresh_queue
+from .semantic import get_query_cache
+from .services import drop_unavailable, generate_recommendations, search_history_snapshot, store_recommendations
 
+
+def _freshness(status, generated_at, refresh_queued=False):
+    return {
+        'status': status,
+        'generated_at': generated_at.isoformat() if generated_at else None,
+        'age_seconds': round((timezone.now() - generated_at).total_seconds(), 1) if generated_at else 0,
+        'refresh_queued': refresh_queued,
+    }
+
+
+def _respond(request, payload, status=None):
+    """
+    ``payload`` as a Response. When staff pass ``?debug=1`` the per-stage
+    trace, rendering included, is added under 'debug' by instrument_view.
+    """
+    response = Response(payload, status=status)
+    response.attach_trace = bool(request.query_params.get('debug')) and request.user.is_staff
+    return response
+
+
+@instrument_view
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_recommendations(request):
     user_id = request.user.id
 
     try:
-        current_search_queries = SearchHistory.objects.filter(user=request.user) \
-                                                    .order_by('-timestamp') \
-                                                    .values_list('search_query', flat=True)[:50] 
-        current_search_history = sorted(list(set(current_search_queries))) 
+        near = parse_near(request.query_params)
+    except ValueError as e:
+        return _respond(request, {'success': False, 'error': f'Invalid location: {e}'}, status=400)
+
+    try:
+        if near is not None:
+            # Location-specific results are not cached; the cache holds the
+            # user's unrestricted recommendations.
+            data = generate_recommendations(user_id, near)
+            return _respond(request, {
+                'success': True,
+                'recommendations': data,
+                'message': f'Recommendations within {near[2]:g} km generated.',
+                'freshness': _freshness('fresh', timezone.now()),
+            })
+
+        with stage('view.search_history'):
+            current_search_history = search_history_snapshot(user_id)
 
 
         latest_recommendation = None
         try:
-            latest_recommendation = Recommendation.objects.filter(user_id=user_id).latest('created_at')
+            with stage('view.cache_lookup'):
+                latest_recommendation = Recommendation.objects.filter(user_id=user_id).latest('created_at')
 
             if latest_recommendation.cached_search_history == current_search_history:
                 print(f"Returning cached recommendations for user {user_id} (search history matched).")
-                return Response({
+                return _respond(request, {
+                    'success': True,
+                    'recommendations': drop_unavailable(user_id, latest_recommendation.recommended_items),
+                    'message': 'Recommendations retrieved from cache based on search history.',
+                    'freshness': _freshness('fresh', latest_recommendation.created_at,
+                                            get_refresh_queue().is_refreshing(user_id)),
+                })
+            elif rec_setting('SERVE_MODE') == 'stale_while_revalidate':
+                refresh_queued = get_refresh_queue().submit(user_id) is not None
+                print(f"Cached recommendations for user {user_id} are stale (search history changed). Serving them while refreshing in the background.")
+                return _respond(request, {
                     'success': True,
-                    'recommendations': latest_recommendation.recommended_items,
-                    'message': 'Recommendations retrieved from cache based on search history.'
+                    'recommendations': drop_unavailable(user_id, latest_recommendation.recommended_items),
+                    'message': 'Recommendations retrieved from cache; a refresh is in progress.',
+                    'freshness': _freshness('stale', latest_recommendation.created_at, refresh_queued),
                 })
             else:
                 print(f"Cached recommendations for user {user_id} are stale (search history changed). Generating new ones.")
 
         except Recommendation.DoesNotExist:
             print(f"No previous recommendation found for user {user_id}. Generating new ones.")
-            pass 
+            pass
         except Exception as e:
             print(f"Error during cache lookup/comparison for user {user_id}: {e}. Generating new recommendations.")
-            pass 
+            pass
 
 
         print(f"Generating new recommendations for user {user_id}...")
-        recommendations_df = hybrid_recommendation_system(user_id)
+        data = generate_recommendations(user_id)
 
-        if recommendations_df.empty:
-            message = 'No recommendations available for this user.'
-            data = [] 
+        if not data:
             print(f"No recommendations generated for user {user_id}. Storing empty set.")
         else:
-            data = recommendations_df.to_dict('records')
             print(f"Recommendations generated for user {user_id}.")
 
-        Recommendation.objects.update_or_create(
-            user_id=user_id,
-            defaults={
-                'recommended_items': data,
-                'algorithm_used': 'Hybrid',
-                'cached_search_history': current_search_history, 
-                'created_at': timezone.now() 
-            }
-        )
+        store_recommendations(user_id, data, current_search_history)
         print(f"New recommendations and search history snapshot cached for user {user_id}.")
 
-        return Response({'success': True, 'recommendations': data, 'message': 'New recommendations generated.'})
+        return _respond(request, {
+            'success': True,
+            'recommendations': data,
+            'message': 'New recommendations generated.',
+            'freshness': _freshness('fresh', timezone.now()),
+        })
 
     except Exception as e:
         print(f"An unexpected error occurred in get_recommendations view: {e}")
-        return Response({'success': False, 'error': str(e)}, status=500)
\ No newline at end of file
+        return _respond(request, {'success': False, 'error': str(e)}, status=500)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def recommendation_metrics(request):
+    """
+    Histograms of every recommender stage recorded by this worker process,
+    plus encoder batching, query embedding cache and model load figures.
+    """
+    return Response({
+        'stages': histograms(),
+        'encode_batchers': batcher_stats(),
+        'semantic_query_cache': get_query_cache().stats(),
+        'models': registry.stats(),
+    })
@@ -1,9 +1,7 @@
-from transformers import pipeline
 from django.db.models import Avg
+from utils.model_registry import get_model
 from .models import Review
 
-sentiment_pipeline = pipeline("sentiment-analysis")
-
 def calculate_overall_score(item_id):
     past_reviews = Review.objects.filter(item_id=item_id)
 
@@ -13,6 +11,8 @@ def calculate_overall_score(item_id):
     total_score = 0
     total_reviews = past_reviews.count()
 
+    sentiment_pipeline = get_model('review_sentiment')
+
     for review in past_reviews:
         sentiment_result = sentiment_pipeline(review.review)[0]["label"]
 
@@ -0,0 +1,172 @@
+"""
+Micro-batching for sentence-encoder calls.
+
+Request threads that each need a handful of texts encoded hand them to a
+per-model batcher instead of calling ``encode()`` themselves. A worker
+thread collects requests for up to ``ENCODE_BATCH_WAIT_MS`` or until
+``ENCODE_BATCH_SIZE`` texts are waiting, runs a single batched ``encode``
+and resolves each caller's future with its own rows. Bulk jobs that
+already batch (e.g. building the item embedding store) should keep
+calling the model directly.
+
+    from utils.encode_batcher import encode
+
+    vectors = encode('dispute_encoder', [text1, text2])   # (2, dim) float32
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+
+from .model_registry import get_model, model_setting
+
+logger = logging.getLogger(__name__)
+
+# Recent batches kept for the size/wait percentiles in stats().
+STATS_WINDOW = 1000
+
+
+class _Request:
+    __slots__ = ('texts', 'future', 'enqueued')
+
+    def __init__(self, texts):
+        self.texts = texts
+        self.future = Future()
+        self.enqueued = time.perf_counter()
+
+
+class EncodeBatcher:
+
+    def __init__(self, encode_batch, max_batch_size=32, max_wait_ms=5):
+        """``encode_batch(texts)`` must return one row per text."""
+        self.encode_batch = encode_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._thread = None
+        self._batches = 0
+        self._texts = 0
+        self._batch_sizes = deque(maxlen=STATS_WINDOW)
+        self._waits_ms = deque(maxlen=STATS_WINDOW)
+
+    def _ensure_worker(self):
+        # A forked worker process inherits the object but not the thread.
+        with self._lock:
+            if self._pid != os.getpid() or self._thread is None or not self._thread.is_alive():
+                self._pid = os.getpid()
+                self._queue = queue.Queue()
+                self._thread = threading.Thread(target=self._run, name='encode-batcher', daemon=True)
+                self._thread.start()
+            return self._queue
+
+    def submit(self, texts):
+        """Queue ``texts`` for encoding; the future resolves to a (len(texts), dim) array."""
+        request = _Request(list(texts))
+        if not request.texts:
+            request.future.set_result(np.zeros((0, 0), dtype=np.float32))
+            return request.future
+        self._ensure_worker().put(request)
+        return request.future
+
+    def encode(self, texts, timeout=None):
+        return self.submit(texts).result(timeout)
+
+    def _collect(self, work_queue):
+        batch = [work_queue.get()]
+        size = len(batch[0].texts)
+        deadline = batch[0].enqueued + self.max_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                request = work_queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(request)
+            size += len(request.texts)
+        return batch
+
+    def _run(self):
+        work_queue = self._queue
+        while True:
+            batch = self._collect(work_queue)
+            started = time.perf_counter()
+            texts = [text for request in batch for text in request.texts]
+            try:
+                vectors = np.asarray(self.encode_batch(texts), dtype=np.float32)
+            except Exception as e:
+                logger.error(f"Batched encode of {len(texts)} texts failed: {e}")
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+            offset = 0
+            for request in batch:
+                request.future.set_result(vectors[offset:offset + len(request.texts)])
+                offset += len(request.texts)
+            with self._lock:
+                self._batches += 1
+                self._texts += len(texts)
+                self._batch_sizes.append(len(texts))
+                self._waits_ms.extend((started - request.enqueued) * 1000 for request in batch)
+
+    def stats(self):
+        """Batch count, texts encoded, and recent batch size / queue wait distribution."""
+        with self._lock:
+            sizes = np.asarray(self._batch_sizes, dtype=np.float64)
+            waits = np.asarray(self._waits_ms, dtype=np.float64)
+            pending = self._queue.qsize() if self._queue is not None else 0
+            row = {'batches': self._batches, 'texts': self._texts, 'pending': pending}
+        if len(sizes):
+            row.update({
+                'batch_size_mean': float(sizes.mean()),
+                'batch_size_max': int(sizes.max()),
+                'wait_ms_p50': float(np.percentile(waits, 50)),
+                'wait_ms_p95': float(np.percentile(waits, 95)),
+                'wait_ms_max': float(waits.max()),
+            })
+        return row
+
+
+_batchers = {}
+_batchers_lock = threading.Lock()
+
+
+def get_batcher(alias):
+    """The shared batcher for a registry alias."""
+    with _batchers_lock:
+        if alias not in _batchers:
+            def encode_batch(texts, alias=alias):
+                return get_model(alias).encode(texts, batch_size=len(texts), show_progress_bar=False)
+
+            _batchers[alias] = EncodeBatcher(
+                encode_batch,
+                max_batch_size=model_setting('ENCODE_BATCH_SIZE'),
+                max_wait_ms=model_setting('ENCODE_BATCH_WAIT_MS'),
+            )
+        return _batchers[alias]
+
+
+def encode(alias, texts):
+    """
+    Encode ``texts`` with the model registered as ``alias``, batched with
+    concurrent callers. With ENCODE_BATCH_WAIT_MS set to 0 the model is
+    called directly. Raises ModelLoadError if the model can't be loaded.
+    """
+    texts = list(texts)
+    if not model_setting('ENCODE_BATCH_WAIT_MS'):
+        return np.asarray(get_model(alias).encode(texts, show_progress_bar=False), dtype=np.float32)
+    return get_batcher(alias).encode(texts)
+
+
+def batcher_stats():
+    with _batchers_lock:
+        batchers = dict(_batchers)
+    return {alias: batcher.stats() for alias, batcher in batchers.items()}
@@ -0,0 +1,82 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from utils import onnx_encoder
+from utils.model_registry import model_setting
+
+
+class Command(BaseCommand):
+    help = ('Compares the int8 ONNX encoder with the fp32 SentenceTransformer: embedding cosine '
+            'agreement, single-text latency and batch throughput')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', default=None,
+                            help='Model name (defaults to the recommendation encoder).')
+        parser.add_argument('--texts', type=int, default=512, help='Item texts sampled for the comparison.')
+        parser.add_argument('--batch-size', type=int, default=32)
+        parser.add_argument('--threshold', type=float, default=None,
+                            help='Minimum cosine agreement (defaults to ONNX_MIN_AGREEMENT).')
+
+    def handle(self, *args, **options):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError:
+            raise CommandError('sentence-transformers is not installed.')
+
+        model_name = options['model'] or model_setting('SHARED_ENCODER') or model_setting('RECOMMENDATION_ENCODER')
+        threshold = options['threshold'] or model_setting('ONNX_MIN_AGREEMENT')
+        texts = self._texts(options['texts'])
+
+        started = time.perf_counter()
+        try:
+            quantised = onnx_encoder.load(model_name, model_setting('ONNX_CACHE_DIR'), min_agreement=0.0,
+                                          threads=model_setting('ONNX_THREADS'))
+        except ImportError as e:
+            raise CommandError(f'The ONNX backend needs onnxruntime, onnx and torch: {e}')
+        self.stdout.write(f'int8 ONNX encoder ready in {time.perf_counter() - started:.1f}s '
+                          f'(cached under {onnx_encoder.cache_path(model_setting("ONNX_CACHE_DIR"), model_name)})')
+        reference = SentenceTransformer(model_name, device='cpu')
+
+        agreement = onnx_encoder.cosine_rows(
+            reference.encode(texts, batch_size=options['batch_size'], show_progress_bar=False),
+            quantised.encode(texts, batch_size=options['batch_size']),
+        )
+        self.stdout.write(f'{len(texts)} texts, model {model_name}')
+        self.stdout.write(
+            f'cosine agreement: mean {agreement.mean():.4f}, p1 {np.percentile(agreement, 1):.4f}, '
+            f'min {agreement.min():.4f}'
+        )
+
+        self.stdout.write(f'\n{"backend":<12}{"p50 ms":>10}{"p95 ms":>10}{"texts/s":>12}')
+        for name, encoder in (('fp32', reference), ('int8-onnx', quantised)):
+            latencies = []
+            for text in texts[:100]:
+                single = time.perf_counter()
+                encoder.encode([text], show_progress_bar=False)
+                latencies.append((time.perf_counter() - single) * 1000)
+            bulk = time.perf_counter()
+            encoder.encode(texts, batch_size=options['batch_size'], show_progress_bar=False)
+            throughput = len(texts) / (time.perf_counter() - bulk)
+            self.stdout.write(
+                f'{name:<12}{np.percentile(latencies, 50):>10.2f}{np.percentile(latencies, 95):>10.2f}'
+                f'{throughput:>12.1f}'
+            )
+
+        if agreement.min() < threshold:
+            raise CommandError(f'Minimum cosine agreement {agreement.min():.4f} is below {threshold}.')
+        self.stdout.write(self.style.SUCCESS(f'Agreement is above {threshold}.'))
+
+    def _texts(self, limit):
+        from items.models import Item
+        from recommendations.embeddings import item_text
+
+        texts = [
+            item_text(title, category, description)
+            for title, category, description in Item.objects.values_list('title', 'category', 'description')[:limit]
+        ]
+        texts = [text for text in texts if text]
+        if not texts:
+            texts = list(onnx_encoder.PROBE_TEXTS)
+        return texts
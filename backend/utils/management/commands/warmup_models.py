@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from utils.model_registry import registry
+
+
+class Command(BaseCommand):
+    help = 'Loads ML models from the shared registry and reports load time and memory per model'
+
+    def add_arguments(self, parser):
+        parser.add_argument('aliases', nargs='*',
+                            help=f'Models to load (default: all of {", ".join(registry.aliases())}).')
+
+    def handle(self, *args, **options):
+        failed = registry.warmup(options['aliases'] or None)
+
+        for alias, row in registry.stats().items():
+            if not row['loaded'] and not row['error']:
+                continue
+            if row['error']:
+                self.stdout.write(self.style.ERROR(f'{alias:<24} {row["model"]:<28} failed: {row["error"]}'))
+                continue
+            memory = 'n/a' if row['rss_delta_mb'] is None else f'{row["rss_delta_mb"]:.0f} MB'
+            self.stdout.write(f'{alias:<24} {row["model"]:<28} {row["load_seconds"]:>7.2f}s {memory:>10}')
+
+        if failed:
+            self.stdout.write(self.style.WARNING(f'{len(failed)} model(s) failed to load'))
+        else:
+            self.stdout.write(self.style.SUCCESS('All requested models loaded'))
@@ -0,0 +1,243 @@
+"""
+Shared, lazily loaded ML models.
+
+Apps ask the registry for a model by name instead of loading it at import
+time, so management commands, migrations and workers that never touch ML
+don't pay for it. Aliases that resolve to the same underlying model (for
+example recommendations and disputes configured with one shared encoder)
+share a single instance.
+
+Configure through ``settings.ML_MODELS``:
+
+    ML_MODELS = {
+        'SHARED_ENCODER': None,            # one encoder for every alias below
+        'RECOMMENDATION_ENCODER': 'paraphrase-MiniLM-L6-v2',
+        'DISPUTE_ENCODER': 'all-MiniLM-L6-v2',
+        'REVIEW_SENTIMENT': None,          # transformers pipeline model
+        'WARMUP': [],                      # aliases loaded by warmup_from_settings()
+        'ENCODE_BATCH_SIZE': 32,           # texts per micro-batch (see encode_batcher)
+        'ENCODE_BATCH_WAIT_MS': 5,         # how long a batch waits to fill; 0 disables
+        'ENCODER_BACKEND': 'torch',        # or 'onnx-int8' (see onnx_encoder)
+        'ONNX_CACHE_DIR': None,            # default BASE_DIR/model_cache
+        'ONNX_MIN_AGREEMENT': 0.98,        # min fp32 cosine for an int8 export
+        'ONNX_THREADS': None,
+        'LOAD_RETRY_SECONDS': 300,         # how long a failed load is remembered
+    }
+"""
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'SHARED_ENCODER': None,
+    'RECOMMENDATION_ENCODER': 'paraphrase-MiniLM-L6-v2',
+    'DISPUTE_ENCODER': 'all-MiniLM-L6-v2',
+    'REVIEW_SENTIMENT': None,
+    'WARMUP': [],
+    'ENCODE_BATCH_SIZE': 32,
+    'ENCODE_BATCH_WAIT_MS': 5,
+    'ENCODER_BACKEND': 'torch',
+    'ONNX_CACHE_DIR': None,
+    'ONNX_MIN_AGREEMENT': 0.98,
+    'ONNX_THREADS': None,
+    'LOAD_RETRY_SECONDS': 300,
+}
+
+
+def model_setting(name):
+    value = getattr(settings, 'ML_MODELS', {}).get(name, DEFAULTS[name])
+    if name == 'ONNX_CACHE_DIR' and value is None:
+        value = str(settings.BASE_DIR / 'model_cache')
+    return value
+
+
+class ModelLoadError(RuntimeError):
+    pass
+
+
+def _rss_bytes():
+    """Current resident set size, or None where it can't be read cheaply."""
+    try:
+        with open('/proc/self/statm') as fh:
+            return int(fh.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        return None
+
+
+class _Entry:
+    def __init__(self, key, loader):
+        self.key = key
+        self.loader = loader
+        self.instance = None
+        self.loaded = False
+        self.error = None
+        self.failed_at = None
+        self.load_seconds = None
+        self.rss_delta_bytes = None
+        self.lock = threading.Lock()
+
+
+class ModelRegistry:
+
+    def __init__(self):
+        self._aliases = {}
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def register(self, alias, resolve):
+        """
+        Register ``alias``. ``resolve()`` returns ``(key, loader)``; aliases
+        whose keys match share one loaded instance. It is called lazily so
+        settings overrides apply.
+        """
+        self._aliases[alias] = resolve
+
+    def aliases(self):
+        return list(self._aliases)
+
+    def _entry(self, alias):
+        if alias not in self._aliases:
+            raise KeyError(f"Unknown model '{alias}'. Registered: {', '.join(self._aliases)}")
+        key, loader = self._aliases[alias]()
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = _Entry(key, loader)
+            return self._entries[key]
+
+    def get(self, alias):
+        """
+        Return the model, loading it on first use. Raises ModelLoadError on
+        failure; a failed load is not retried for LOAD_RETRY_SECONDS.
+        """
+        entry = self._entry(alias)
+        if entry.loaded:
+            return entry.instance
+        with entry.lock:
+            if not entry.loaded:
+                if (entry.failed_at is not None
+                        and time.monotonic() - entry.failed_at < model_setting('LOAD_RETRY_SECONDS')):
+                    raise ModelLoadError(f"Could not load model '{alias}': {entry.error}")
+                rss_before = _rss_bytes()
+                started = time.perf_counter()
+                try:
+                    entry.instance = entry.loader()
+                    entry.error = None
+                    entry.failed_at = None
+                except Exception as e:
+                    entry.error = str(e)
+                    entry.failed_at = time.monotonic()
+                    logger.error(f"Failed to load model '{alias}' ({entry.key}): {e}")
+                    raise ModelLoadError(f"Could not load model '{alias}': {e}") from e
+                entry.load_seconds = time.perf_counter() - started
+                rss_after = _rss_bytes()
+                if rss_before is not None and rss_after is not None:
+                    entry.rss_delta_bytes = rss_after - rss_before
+                entry.loaded = True
+                logger.info(f"Loaded model '{alias}' ({entry.key}) in {entry.load_seconds:.2f}s.")
+        return entry.instance
+
+    def get_or_none(self, alias):
+        try:
+            return self.get(alias)
+        except ModelLoadError:
+            return None
+
+    def is_loaded(self, alias):
+        return self._entry(alias).loaded
+
+    def warmup(self, aliases=None):
+        """Load ``aliases`` (default: all) now; returns the aliases that failed."""
+        failed = []
+        for alias in aliases or self.aliases():
+            if self.get_or_none(alias) is None:
+                failed.append(alias)
+        return failed
+
+    def stats(self):
+        """Per-alias load status, load time and resident memory added by the load."""
+        rows = {}
+        for alias in self.aliases():
+            entry = self._entry(alias)
+            rows[alias] = {
+                'model': entry.key[1] if isinstance(entry.key, tuple) else entry.key,
+                'loaded': entry.loaded,
+                'implementation': type(entry.instance).__name__ if entry.loaded else None,
+                'load_seconds': entry.load_seconds,
+                'rss_delta_mb': None if entry.rss_delta_bytes is None else entry.rss_delta_bytes / 2 ** 20,
+                'error': entry.error,
+            }
+        return rows
+
+
+registry = ModelRegistry()
+
+
+def _sentence_transformer(setting_name):
+    def resolve():
+        model_name = model_setting('SHARED_ENCODER') or model_setting(setting_name)
+        backend = model_setting('ENCODER_BACKEND')
+
+        def load():
+            if backend == 'onnx-int8':
+                try:
+                    from . import onnx_encoder
+                    return onnx_encoder.load(
+                        model_name, model_setting('ONNX_CACHE_DIR'),
+                        min_agreement=model_setting('ONNX_MIN_AGREEMENT'),
+                        threads=model_setting('ONNX_THREADS'),
+                    )
+                except Exception as e:
+                    logger.warning(f"int8 ONNX backend unavailable for {model_name} ({e}); using SentenceTransformer.")
+            from sentence_transformers import SentenceTransformer
+            return SentenceTransformer(model_name)
+
+        return ('sentence-transformer', model_name, backend), load
+    return resolve
+
+
+def _vader():
+    def load():
+        from nltk.sentiment import SentimentIntensityAnalyzer
+        return SentimentIntensityAnalyzer()
+    return ('vader', 'nltk'), load
+
+
+def _review_sentiment():
+    model_name = model_setting('REVIEW_SENTIMENT')
+
+    def load():
+        from transformers import pipeline
+        if model_name:
+            return pipeline('sentiment-analysis', model=model_name)
+        return pipeline('sentiment-analysis')
+
+    return ('transformers-pipeline', model_name or 'sentiment-analysis'), load
+
+
+registry.register('recommendation_encoder', _sentence_transformer('RECOMMENDATION_ENCODER'))
+registry.register('dispute_encoder', _sentence_transformer('DISPUTE_ENCODER'))
+registry.register('dispute_sentiment', _vader)
+registry.register('review_sentiment', _review_sentiment)
+
+
+def get_model(alias):
+    return registry.get(alias)
+
+
+def warmup_from_settings():
+    """Load the aliases listed in ML_MODELS['WARMUP'], e.g. from wsgi.py."""
+    aliases = model_setting('WARMUP')
+    if aliases:
+        failed = registry.warmup(aliases)
+        if failed:
+            logger.warning(f"Models failed to warm up: {', '.join(failed)}")
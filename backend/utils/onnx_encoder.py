@@ -0,0 +1,206 @@
+"""
+Int8-quantised ONNX Runtime backend for sentence-transformer encoders.
+
+The first load exports the transformer to ONNX, applies dynamic int8
+quantisation and caches the graph, the tokenizer and a small manifest under
+``ML_MODELS['ONNX_CACHE_DIR']``; later loads only open the cached graph.
+Exports whose embeddings drift from the fp32 model (minimum cosine on a
+fixed probe set below ``ONNX_MIN_AGREEMENT``) are rejected so the registry
+falls back to the PyTorch model. Rejected exports stay cached with their
+agreement in the manifest, so later loads fall back without exporting
+again; delete the cache directory to retry.
+
+Needs the optional ``onnxruntime`` and ``onnx`` packages, plus torch and
+transformers (already pulled in by sentence-transformers) for the export.
+"""
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = 'manifest.json'
+GRAPH = 'model.int8.onnx'
+
+# Probe sentences for the export-time agreement check.
+PROBE_TEXTS = [
+    'Mountain bike with 21 speeds, lightly used',
+    'Canon DSLR camera with two lenses and a tripod',
+    'Spacious four person camping tent, waterproof',
+    'The item was returned with a cracked screen and missing charger',
+    'Everything was in the same condition as at checkout',
+    'Power drill set for home renovation projects',
+    'electronics gaming photography',
+    'Looking for a projector for an outdoor movie night',
+]
+
+
+class ExportRejected(RuntimeError):
+    pass
+
+
+def cosine_rows(a, b):
+    """Row-wise cosine similarity of two equally shaped matrices."""
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    norms = np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1)
+    norms[norms == 0] = 1.0
+    return (a * b).sum(axis=1) / norms
+
+
+class OnnxSentenceEncoder:
+    """
+    Drop-in for the ``SentenceTransformer.encode`` calls used in this
+    project: returns a float32 numpy array of mean-pooled (and, when the
+    source model normalises, L2-normalised) embeddings.
+    """
+
+    def __init__(self, directory, threads=None):
+        import onnxruntime
+        from transformers import AutoTokenizer
+
+        with open(os.path.join(directory, MANIFEST)) as fh:
+            self.manifest = json.load(fh)
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(directory, GRAPH), options, providers=['CPUExecutionProvider']
+        )
+        self.input_names = {node.name for node in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(directory)
+        self.max_seq_length = self.manifest['max_seq_length']
+        self.normalize = self.manifest['normalize']
+
+    def get_sentence_embedding_dimension(self):
+        return self.manifest['dim']
+
+    def encode(self, sentences, batch_size=32, show_progress_bar=False, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        outputs = []
+        for start in range(0, len(texts), batch_size):
+            tokens = self.tokenizer(
+                texts[start:start + batch_size], padding=True, truncation=True,
+                max_length=self.max_seq_length, return_tensors='np',
+            )
+            feed = {name: tokens[name].astype(np.int64) for name in self.input_names if name in tokens}
+            hidden = self.session.run(None, feed)[0]
+            mask = tokens['attention_mask'][:, :, None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+            if self.normalize:
+                pooled /= np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+            outputs.append(pooled.astype(np.float32))
+        embeddings = np.concatenate(outputs) if outputs else np.zeros((0, self.manifest['dim']), dtype=np.float32)
+        return embeddings[0] if single else embeddings
+
+
+def cache_path(cache_dir, model_name):
+    return os.path.join(cache_dir, model_name.replace('/', '__'))
+
+
+def export(model_name, directory, min_agreement):
+    """
+    Export ``model_name`` to an int8 ONNX graph in ``directory``. Written to
+    a temporary directory and moved into place, so concurrent exporters
+    can't leave a half-written cache behind.
+    """
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from sentence_transformers import SentenceTransformer
+
+    reference = SentenceTransformer(model_name, device='cpu')
+    transformer = reference[0]
+    normalize = any(type(module).__name__ == 'Normalize' for module in reference)
+    pooling = next((module for module in reference if type(module).__name__ == 'Pooling'), None)
+    parent = os.path.dirname(directory)
+    os.makedirs(parent, exist_ok=True)
+    workdir = tempfile.mkdtemp(dir=parent, prefix='.export-')
+    try:
+        if pooling is not None and not pooling.get_config_dict().get('pooling_mode_mean_tokens', False):
+            # Only the manifest is cached: there is no graph to fall back on.
+            with open(os.path.join(workdir, MANIFEST), 'w') as fh:
+                json.dump({'model': model_name, 'rejected': 'does not use mean pooling'}, fh)
+            workdir = _publish(workdir, directory)
+            raise ExportRejected(f"{model_name} does not use mean pooling; keeping the PyTorch backend.")
+
+        model = transformer.auto_model.eval()
+        tokens = transformer.tokenizer(['export probe'], return_tensors='pt')
+        input_names = [name for name in ('input_ids', 'attention_mask', 'token_type_ids') if name in tokens]
+        dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names}
+        dynamic_axes['last_hidden_state'] = {0: 'batch', 1: 'sequence'}
+        fp32_path = os.path.join(workdir, 'model.fp32.onnx')
+        with torch.no_grad():
+            torch.onnx.export(
+                model, tuple(tokens[name] for name in input_names), fp32_path,
+                input_names=input_names, output_names=['last_hidden_state'],
+                dynamic_axes=dynamic_axes, opset_version=14,
+            )
+        quantize_dynamic(fp32_path, os.path.join(workdir, GRAPH), weight_type=QuantType.QInt8)
+        os.remove(fp32_path)
+        transformer.tokenizer.save_pretrained(workdir)
+
+        manifest = {
+            'model': model_name,
+            'dim': reference.get_sentence_embedding_dimension(),
+            'max_seq_length': transformer.max_seq_length,
+            'normalize': normalize,
+        }
+        with open(os.path.join(workdir, MANIFEST), 'w') as fh:
+            json.dump(manifest, fh)
+
+        agreement = cosine_rows(
+            reference.encode(PROBE_TEXTS, show_progress_bar=False),
+            OnnxSentenceEncoder(workdir).encode(PROBE_TEXTS),
+        )
+        manifest['agreement_min'] = float(agreement.min())
+        manifest['agreement_mean'] = float(agreement.mean())
+        with open(os.path.join(workdir, MANIFEST), 'w') as fh:
+            json.dump(manifest, fh)
+        # Cached even when rejected: the manifest's agreement turns later
+        # loads away without another export.
+        workdir = _publish(workdir, directory)
+        if agreement.min() < min_agreement:
+            raise ExportRejected(
+                f"int8 export of {model_name} agrees with fp32 at cosine {agreement.min():.4f} "
+                f"(< {min_agreement}); keeping the PyTorch backend."
+            )
+        logger.info(f"Exported {model_name} to int8 ONNX (cosine agreement min {manifest['agreement_min']:.4f}).")
+    finally:
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _publish(workdir, directory):
+    """Move ``workdir`` into place as ``directory``; returns what is left to clean up."""
+    try:
+        os.replace(workdir, directory)
+    except OSError:
+        # Another process finished an export first; use theirs.
+        if not os.path.exists(os.path.join(directory, MANIFEST)):
+            raise
+        return workdir
+    return None
+
+
+def load(model_name, cache_dir, min_agreement=0.98, threads=None):
+    """
+    The cached int8 encoder for ``model_name``, exporting it on first use.
+    Raises ExportRejected, without exporting again, when the cached export
+    was rejected or agrees with fp32 below ``min_agreement``.
+    """
+    directory = cache_path(cache_dir, model_name)
+    if not os.path.exists(os.path.join(directory, MANIFEST)):
+        export(model_name, directory, min_agreement)
+    with open(os.path.join(directory, MANIFEST)) as fh:
+        manifest = json.load(fh)
+    if 'rejected' in manifest:
+        raise ExportRejected(f"{model_name} {manifest['rejected']}; keeping the PyTorch backend.")
+    if manifest.get('agreement_min', 1.0) < min_agreement:
+        raise ExportRejected(f"Cached int8 export of {model_name} is below the agreement threshold.")
+    return OnnxSentenceEncoder(directory, threads=threads)
@@ -0,0 +1,57 @@
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from . import onnx_encoder
+from .model_registry import ModelLoadError, ModelRegistry
+
+
+class OnnxCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+
+    def cache(self, manifest):
+        directory = onnx_encoder.cache_path(self.cache_dir, 'org/model')
+        os.makedirs(directory)
+        with open(os.path.join(directory, onnx_encoder.MANIFEST), 'w') as fh:
+            json.dump(manifest, fh)
+
+    def test_rejected_exports_are_not_exported_again(self):
+        for manifest in ({'model': 'org/model', 'agreement_min': 0.9}, {'model': 'org/model', 'rejected': 'no'}):
+            shutil.rmtree(self.cache_dir)
+            self.cache(manifest)
+            with mock.patch.object(onnx_encoder, 'export') as export, \
+                    mock.patch.object(onnx_encoder, 'OnnxSentenceEncoder') as encoder:
+                with self.assertRaises(onnx_encoder.ExportRejected):
+                    onnx_encoder.load('org/model', self.cache_dir, min_agreement=0.98)
+            export.assert_not_called()
+            encoder.assert_not_called()
+
+    def test_a_lower_threshold_accepts_a_cached_export(self):
+        self.cache({'model': 'org/model', 'agreement_min': 0.9})
+        with mock.patch.object(onnx_encoder, 'export') as export, \
+                mock.patch.object(onnx_encoder, 'OnnxSentenceEncoder') as encoder:
+            self.assertIs(onnx_encoder.load('org/model', self.cache_dir, min_agreement=0.5), encoder.return_value)
+        export.assert_not_called()
+
+
+class ModelRegistryTests(SimpleTestCase):
+
+    def test_failed_load_is_not_retried_until_the_interval_passes(self):
+        loader = mock.Mock(side_effect=[OSError('missing weights'), 'model'])
+        registry = ModelRegistry()
+        registry.register('encoder', lambda: ('encoder', loader))
+        with self.settings(ML_MODELS={'LOAD_RETRY_SECONDS': 60}), self.assertLogs('utils.model_registry', 'ERROR'):
+            self.assertIsNone(registry.get_or_none('encoder'))
+            with self.assertRaisesMessage(ModelLoadError, 'missing weights'):
+                registry.get('encoder')
+        self.assertEqual(loader.call_count, 1)
+        with self.settings(ML_MODELS={'LOAD_RETRY_SECONDS': 0}):
+            self.assertEqual(registry.get('encoder'), 'model')
+        self.assertIsNone(registry.stats()['encoder']['error'])